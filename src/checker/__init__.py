@@ -0,0 +1,3 @@
+from checker import pipeline, scheduler, writer
+
+__all__ = ("pipeline", "scheduler", "writer")
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class CheckPipeline:
+    """
+    Runs url checks concurrently, with at most max_concurrency in flight overall
+    and at most max_per_host in flight against any single host
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_per_host: int = 2):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        # checks started by submit that haven't finished
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).hostname or url
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """
+        Waits for a free slot for the given url's host and then a global slot.
+        The host slot is taken first so a busy host doesn't hold global slots
+        """
+        async with self._host_semaphore(url):
+            async with self._global:
+                yield
+
+    def submit(
+        self, url: str, check: Callable[[str], Awaitable[None]]
+    ) -> asyncio.Task[None]:
+        """
+        Starts check for the url in the background within the concurrency
+        limits, so the caller doesn't wait for it. A failing check is logged
+        """
+
+        async def run_one() -> None:
+            try:
+                async with self.slot(url):
+                    await check(url)
+            except Exception as e:
+                logger.error(f"Error checking {url}: {e}")
+
+        task = asyncio.create_task(run_one())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
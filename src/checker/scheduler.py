@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+
+from db.models import User_Stock
+
+logger = logging.getLogger(__name__)
+
+WatchKey = tuple[str, str]
+
+
+def watch_key(user_id: int | str, url: str) -> WatchKey:
+    return str(user_id), url
+
+
+class WatchScheduler:
+    """
+    Keeps every watched User_Stock in a min-heap ordered by when it is next due,
+    last_checked + check_interval, so the checker only ever looks at the
+    earliest item and can sleep exactly until it is due
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, int, WatchKey]] = []
+        self._counter = itertools.count()
+        # currently watched stocks, and the heap entry that is still valid
+        self._stocks: dict[WatchKey, User_Stock] = {}
+        self._entries: dict[WatchKey, int] = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._stocks)
+
+    def schedule(self, stock: User_Stock, due: datetime | None = None) -> None:
+        """
+        Adds or re-arms the given stock. Defaults to being due check_interval
+        seconds after it was last checked
+        """
+        key = watch_key(stock.user_id, stock.stock_url)
+        if due is None:
+            due = stock.last_checked + timedelta(seconds=stock.check_interval)
+        entry = next(self._counter)
+        self._stocks[key] = stock
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (due, entry, key))
+        self._wakeup.set()
+
+    def reschedule(self, stock: User_Stock, now: datetime) -> None:
+        """
+        Re-arms a stock after it has been checked, unless it was removed while
+        the check was running
+        """
+        key = watch_key(stock.user_id, stock.stock_url)
+        if key in self._stocks:
+            self.schedule(stock, now + timedelta(seconds=stock.check_interval))
+
+    def unschedule(self, user_id: int | str, url: str) -> None:
+        key = watch_key(user_id, url)
+        self._stocks.pop(key, None)
+        self._entries.pop(key, None)
+        # stale heap entries are skipped lazily
+        self._wakeup.set()
+
+    def _discard_stale(self) -> None:
+        while self._heap:
+            _, entry, key = self._heap[0]
+            if self._entries.get(key) == entry:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> datetime | None:
+        self._discard_stale()
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now: datetime) -> list[User_Stock]:
+        """
+        Removes and returns every stock that is due at the given time. They stay
+        watched, and are expected to be rescheduled once checked
+        """
+        due: list[User_Stock] = []
+        while (next_due := self.next_due()) is not None and next_due <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            due.append(self._stocks[key])
+        return due
+
+    async def wait_until_due(self) -> None:
+        """
+        Sleeps until the earliest stock is due, waking early to re-evaluate when
+        the set of watched stocks changes
+        """
+        while True:
+            self._wakeup.clear()
+            next_due = self.next_due()
+            timeout = None
+            if next_due is not None:
+                timeout = (next_due - datetime.now()).total_seconds()
+                if timeout <= 0:
+                    return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                return
+
+
+watch_scheduler = WatchScheduler()
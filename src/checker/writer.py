@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import Table, bindparam, update
+from sqlalchemy.orm import Session as OrmSession
+
+from checker.scheduler import WatchKey, watch_key
+from config import CHECK_FLUSH_INTERVAL, CHECK_FLUSH_SIZE
+from db.connect import Session, run_db
+from db.history import append_history, history_row
+from db.models import Product, User_Stock
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = (
+    "name",
+    "stock_status",
+    "price",
+    "price_amount",
+    "price_currency",
+    "last_checked",
+    "fetch_tier",
+    "fetch_time",
+)
+
+
+def _update_rows(
+    session: OrmSession, table: Table, keys: tuple[str, ...], rows: list[dict]
+) -> None:
+    """
+    Executes one UPDATE per row, as a single executemany. Rows deleted since
+    they were recorded are skipped rather than failing the batch
+    """
+    if not rows:
+        return
+    statement = update(table).where(
+        *(table.c[key] == bindparam(f"_{key}") for key in keys)
+    )
+    params = [
+        {(f"_{name}" if name in keys else name): value for name, value in row.items()}
+        for row in rows
+    ]
+    session.execute(statement, params)
+
+
+def _write_rows(
+    products: list[dict[str, Any]],
+    notified: list[dict[str, Any]],
+    history: list[dict[str, Any]],
+) -> None:
+    with Session() as session:
+        try:
+            _update_rows(session, Product.__table__, ("product_id",), products)
+            append_history(session, history)
+            _update_rows(
+                session, User_Stock.__table__, ("user_id", "product_id"), notified
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+class CheckWriter:
+    """
+    Write-behind buffer for the state each check produces. Results are kept in
+    memory, newest per product and per watch, and written in a single
+    transaction every flush_interval seconds or once max_pending are waiting.
+    After each write on_flush, if set, is given the product_ids just written
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = CHECK_FLUSH_INTERVAL,
+        max_pending: int = CHECK_FLUSH_SIZE,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._products: dict[str, dict[str, Any]] = {}
+        self._notified: dict[WatchKey, dict[str, Any]] = {}
+        # the history row for each product's latest state, only appended if it
+        # differs from the one already stored
+        self._history: dict[str, dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self.on_flush: Callable[[list[int]], Awaitable[None]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._products) + len(self._notified)
+
+    async def _added(self) -> None:
+        if len(self) >= self.max_pending:
+            await self.flush()
+
+    async def record_product(self, product: Product) -> None:
+        """
+        Queues the checked state of the given product, flushing straight away
+        if the buffer is full
+        """
+        row = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        row["product_id"] = product.product_id
+        self._products[product.url] = row
+        self._history[product.url] = history_row(product)
+        await self._added()
+
+    async def record_notified(self, stock: User_Stock) -> None:
+        """
+        Queues the state the watch's user was just notified of
+        """
+        key = watch_key(stock.user_id, stock.stock_url)
+        self._notified[key] = {
+            "user_id": stock.user_id,
+            "product_id": stock.product_id,
+            "notified_status": stock.notified_status,
+            "notified_price": stock.notified_price,
+            "notified_amount": stock.notified_amount,
+            "notified_currency": stock.notified_currency,
+        }
+        await self._added()
+
+    def discard(self, user_id: int | str, url: str) -> None:
+        """
+        Drops a pending result, used when the watch is removed before it is
+        written
+        """
+        self._notified.pop(watch_key(user_id, url), None)
+
+    async def flush(self) -> int:
+        """
+        Writes every pending result in one transaction, returning how many were
+        written. On failure they are put back to be retried on the next flush
+        """
+        async with self._lock:
+            if not self:
+                return 0
+            products, self._products = self._products, {}
+            notified, self._notified = self._notified, {}
+            history, self._history = self._history, {}
+            written = len(products) + len(notified)
+            try:
+                await run_db(
+                    _write_rows,
+                    list(products.values()),
+                    list(notified.values()),
+                    list(history.values()),
+                )
+            except Exception as e:
+                logger.error(f"Error writing {written} check results: {e}")
+                # newer results recorded while writing take priority
+                products.update(self._products)
+                notified.update(self._notified)
+                history.update(self._history)
+                self._products, self._notified = products, notified
+                self._history = history
+                return 0
+            logger.info(f"Wrote {written} check results")
+        # outside the lock, so the next flush doesn't wait on the hook
+        product_ids = [row["product_id"] for row in products.values()]
+        if product_ids and self.on_flush is not None:
+            try:
+                await self.on_flush(product_ids)
+            except Exception as e:
+                logger.error(f"Error handling {len(product_ids)} written products: {e}")
+        return written
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """
+        Stops the periodic flush and writes anything still pending
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+check_writer = CheckWriter()
@@ -2,58 +2,74 @@ import asyncio
 import json
 import logging
 import re
-from datetime import datetime
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import List, Optional
+from functools import partial
+from typing import Iterator, List, NamedTuple, Optional
 
 import discord
 from bs4 import BeautifulSoup, Tag
 from discord import app_commands
 from discord.ext import commands
-from playwright.async_api import async_playwright
 from price_parser.parser import Price
 
 import db.utils as db
-from db.connect import Session
-from db.models import User_Stock
+from checker.pipeline import CheckPipeline
+from checker.scheduler import watch_scheduler
+from checker.writer import check_writer
+from config import CHECK_CONCURRENCY, CHECK_CONCURRENCY_PER_HOST
+from db.alerts import TriggeredAlert, add_alert, delete_alerts, trigger_alerts
+from db.connect import Session, run_db
+from db.history import (
+    PriceWindow,
+    append_history,
+    compact_history,
+    delete_history,
+    history_row,
+    last_change,
+    summarise_history,
+)
+from db.models import Product, User_Stock
+from db.subscriptions import (
+    delete_subscriptions,
+    get_subscriptions,
+    subscribe_channel,
+    unsubscribe_channel,
+)
+from db.watchlists import watchlist_cache
+from notify.digest import Notification, digest_queue
+from notify.outbox import outbox
+from notify.users import LazyUser, user_cache
+from scraper.browser import browser_pool
+from scraper.http import StaticPage, http_pool
+from scraper.money import (
+    ISO_TO_SYMBOL,
+    SYMBOL_INFO,
+    SYMBOL_TO_ISO,
+    Money,
+    currency_code,
+)
+from scraper.parser import make_soup
+from scraper.phrases import out_of_stock_phrases
+from scraper.strategies import strategy_cache
+from scraper.tiers import Fetch_Tier, fetch_tiers
+from scraper.validators import PageCache, PageValidators, content_hash
 from utils import check_valid_url
 
 logger = logging.getLogger(__name__)
 
-SYMBOL_INFO = {
-    # Symbols and their positioning
-    "$": "prefix",
-    "£": "prefix",
-    "¥": "prefix",
-    "₹": "prefix",
-    "€": "suffix",
-    "kr": "suffix",
-    "zł": "suffix",
-    "₩": "prefix",
-    "₺": "prefix",
-    "₪": "prefix",
-    "Ft": "suffix",
-    "Kč": "suffix",
-    "₽": "suffix",
-}
-
-ISO_TO_SYMBOL = {
-    # ISO codes to symbols
-    "USD": "$",
-    "AUD": "$",
-    "CAD": "$",
-    "GBP": "£",
-    "JPY": "¥",
-    "INR": "₹",
-    "EUR": "€",
-    "SEK": "kr",
-    "NOK": "kr",
-    "DKK": "kr",
-    "PLN": "zł",
-    "CZK": "Kč",
-    "HUF": "Ft",
-    "RUB": "₽",
-}
+# windows, in days, summarised by /stock history before the all time summary
+HISTORY_WINDOWS = (7, 30, 90)
+HISTORY_COMPACT_INTERVAL = 60 * 60  # seconds
+STRATEGY_SAVE_INTERVAL = 5 * 60  # seconds
+# watchlist items per page, select menus hold at most 25 options
+WATCHLIST_PAGE_SIZE = 10
+MAX_OPTION_LABEL = 100
+# how old someone else's check of a page can be and still be reused by /stock add
+RECENT_SNAPSHOT_AGE = timedelta(minutes=5)
 
 
 class Stock(commands.Cog, name="Stock Watcher"):
@@ -77,68 +93,68 @@ class Stock(commands.Cog, name="Stock Watcher"):
             await interaction.response.send_message(message, ephemeral=True)
             return
 
+        # answered before anything waits on the database, which may be busy
+        # for longer than Discord allows for a first response
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
         # check if user is in db
-        if db.get_user(interaction.user) is None:
+        if await db.get_user(interaction.user) is None:
             logger.info(
                 f"User {interaction.user.id}:{interaction.user.name} isn't in database, adding"
             )
-            db.add_user(interaction.user)
+            await db.add_user(interaction.user)
         else:
             logger.info(
                 f"User {interaction.user.id}:{interaction.user.name} already exists in database"
             )
 
-        await interaction.response.defer(ephemeral=True, thinking=True)
-
-        # check if stock is in db for user
-        if get_stock(interaction.user, url) is None:
-            logger.info(f"Stock {url} not watched for user {interaction.user}, adding")
-
-            if name is None:
-                try:
-                    name = await get_stock_name(url)
-                    if name is None:
-                        await interaction.edit_original_response(
-                            content="Could not get the product name. Please provide a name manually"
-                        )
-                        return
-                except Exception as e:
-                    logger.error(f"Could not get stock name for {url}: {e}")
-                    await interaction.edit_original_response(
-                        content="Could not get the product name. Please provide a name manually."
-                    )
-                    return
+        stock = await get_stock(interaction.user, url)
+        if stock is not None:
+            logger.info(f"Stock {url} already watched for user {interaction.user.id}")
+            await interaction.edit_original_response(
+                content=f"[{stock.stock_name}](<{url}>) is already being watched!"
+            )
+            return
 
+        # the watch is saved straight away, from someone else's recent check of
+        # the page if there is one, or else left pending while it is loaded in
+        # the background
+        logger.info(f"Stock {url} not watched for user {interaction.user}, adding")
+        try:
+            stock = await add_user_watching(
+                interaction.user, url, name, _recent_snapshot(url)
+            )
+        except Exception as e:
+            logger.info(f"Could not add stock to database: {e}")
             await interaction.edit_original_response(
-                content=f"Adding [{name}](<{url}>) to your watchlist!"
+                content=f"There was an error adding your product to the database, please report this error with the URL for the product: [URL](<{url}>)"
             )
-            try:
-                await add_user_watching(interaction.user, url, name)
-            except Exception as e:
-                logger.info(f"Could not add stock to database: {e}")
-                await interaction.edit_original_response(
-                    content=f"There was an error adding your product to the database, please report this error with the URL for the product: [URL](<{url}>)"
-                )
-        else:
-            logger.info(f"Stock {url} already watched for user {interaction.user.id}")
-            stock = get_stock(interaction.user, url)
-            if stock is None:
-                await interaction.edit_original_response(
-                    content="An error occured while retrievng the stock information"
-                )
-                return
+            return
 
+        if stock.stock_status != Stock_Status.UNKNOWN.value:
+            await interaction.edit_original_response(content=_added_message(stock))
+            return
+        try:
             await interaction.edit_original_response(
-                content=f"[{stock.stock_name}](<{url}>) is already being watched!"
+                content=f"Adding [{stock.stock_name}](<{url}>) to your watchlist, fetching its details..."
+            )
+        finally:
+            # the watch is already saved, so it is filled in even if the reply failed
+            task = asyncio.create_task(
+                enrich_watch(interaction, stock, name is not None)
             )
+            _enrichments.add(task)
+            task.add_done_callback(_enrichments.discard)
 
     @stock.command(name="remove", description="Remove a product from your watchlist")
     async def remove_watching(self, interaction: discord.Interaction):
-        watched_stocks = await get_users_watched(interaction.user)
-        if watched_stocks:
+        page = await get_watch_page(interaction.user)
+        if page.stocks:
+            view = RemoveView(interaction.user, page)
             await interaction.response.send_message(
-                "Click a button to delete a stock that you are watching:",
-                view=Remove(watched_stocks),
+                "Pick a product to stop watching:",
+                embed=view.embed(),
+                view=view,
                 ephemeral=True,
             )
         else:
@@ -147,17 +163,196 @@ class Stock(commands.Cog, name="Stock Watcher"):
 
     @stock.command(name="list", description="List all product in your watchlist")
     async def list_watching(self, interaction: discord.Interaction):
-        items = await get_users_watched(interaction.user)
-        if not items:
+        page = await get_watch_page(interaction.user)
+        if not page.stocks:
             await interaction.response.send_message(
                 "You're not watching any items!", ephemeral=True
             )
             return
-        bot_message = "# Watched Items\n"
-        for index, item in enumerate(items):
-            in_stock = "In stock" if item.stock_status == 1 else "Out of stock"
-            bot_message += f"**{index + 1}**: _[{item.stock_name}](<{item.stock_url}>)_: **{in_stock}** **{item.price}**\n"
-        await interaction.response.send_message(bot_message, ephemeral=True)
+        view = WatchlistView(interaction.user, page)
+        await interaction.response.send_message(
+            embed=view.embed(), view=view, ephemeral=True
+        )
+
+    @stock.command(
+        name="history", description="Show the price history of a watched product"
+    )
+    @app_commands.describe(url="The URL of the watched product")
+    async def price_history(self, interaction: discord.Interaction, url: str):
+        stock = await get_stock(interaction.user, url)
+        if stock is None:
+            await interaction.response.send_message(
+                "You're not watching that product!", ephemeral=True
+            )
+            return
+        currency = stock.product.price_currency
+        if currency is None:
+            # not checked since prices were stored as minor units
+            current = Money.parse(stock.price)
+            currency = current.currency if current else None
+        windows = await run_db(
+            summarise_history,
+            stock.product_id,
+            currency,
+            datetime.now(),
+            HISTORY_WINDOWS,
+        )
+        changed = await run_db(last_change, stock.product_id)
+        await interaction.response.send_message(
+            _format_history(stock, currency, windows, changed), ephemeral=True
+        )
+
+    @stock.command(
+        name="alert", description="Get a message when a watched product gets cheaper"
+    )
+    @app_commands.describe(
+        url="The URL of the watched product",
+        target="Message me once the price is at or below this",
+        drop="Message me once the price drops by this percent",
+    )
+    async def price_alert(
+        self,
+        interaction: discord.Interaction,
+        url: str,
+        target: Optional[str] = None,
+        drop: Optional[app_commands.Range[int, 1, 99]] = None,
+    ):
+        if target is None and drop is None:
+            await interaction.response.send_message(
+                "Give a target price, a percent drop, or both", ephemeral=True
+            )
+            return
+        stock = await get_stock(interaction.user, url)
+        if stock is None:
+            await interaction.response.send_message(
+                "You're not watching that product!", ephemeral=True
+            )
+            return
+        product = stock.product
+        current = (
+            Money(product.price_amount, product.price_currency)
+            if product.price_amount is not None
+            else Money.parse(product.price)
+        )
+        if current is None:
+            await interaction.response.send_message(
+                "Couldn't read the product's current price, try again after it is next checked",
+                ephemeral=True,
+            )
+            return
+
+        target_money = None
+        if target is not None:
+            # a bare number is taken to be in the product's currency
+            target_money = Money.parse(target, current.currency)
+            symbol = ISO_TO_SYMBOL.get(current.currency or "")
+            if (
+                target_money is not None
+                and target_money.currency != current.currency
+                and symbol is not None
+                and symbol in target
+            ):
+                # the symbol is shared with the product's currency, e.g. "$" for AUD
+                target_money = Money.parse_in(target, current.currency)
+            if target_money is None or target_money.currency != current.currency:
+                await interaction.response.send_message(
+                    f"Couldn't understand that target price, give it in {current.currency or 'the product currency'}",
+                    ephemeral=True,
+                )
+                return
+
+        await run_db(
+            add_alert,
+            interaction.user.id,
+            stock.product_id,
+            current.currency,
+            target_money.amount if target_money else None,
+            drop,
+            current.amount,
+        )
+        conditions = []
+        if target_money is not None:
+            conditions.append(f"at or below **{target_money.format()}**")
+        if drop is not None:
+            conditions.append(f"down {drop}% from **{current.format()}**")
+        await interaction.response.send_message(
+            f"I'll message you when [{stock.stock_name}](<{url}>) is {' or '.join(conditions)}",
+            ephemeral=True,
+        )
+
+    @stock.command(
+        name="subscribe-channel",
+        description="Announce a watched product's stock changes in a channel",
+    )
+    @app_commands.describe(
+        url="The URL of the watched product",
+        channel="The channel to announce in",
+        role="A role to mention in each announcement",
+    )
+    async def channel_subscribe(
+        self,
+        interaction: discord.Interaction,
+        url: str,
+        channel: discord.TextChannel,
+        role: Optional[discord.Role] = None,
+    ):
+        if interaction.guild is None:
+            await interaction.response.send_message(
+                "Channels can only be subscribed from a server", ephemeral=True
+            )
+            return
+        if not interaction.permissions.manage_channels:
+            await interaction.response.send_message(
+                "You need the Manage Channels permission to do that", ephemeral=True
+            )
+            return
+        if not channel.permissions_for(channel.guild.me).send_messages:
+            await interaction.response.send_message(
+                f"I can't send messages in {channel.mention}", ephemeral=True
+            )
+            return
+        product = await run_db(
+            subscribe_channel,
+            url,
+            interaction.guild.id,
+            channel.id,
+            role.id if role else None,
+        )
+        if product is None:
+            await interaction.response.send_message(
+                "Nobody is watching that product yet, add it with `/stock add` first",
+                ephemeral=True,
+            )
+            return
+        message = f"{channel.mention} will announce when [{product.name}](<{url}>) comes back in stock or sells out"
+        if role is not None:
+            message += f", mentioning {role.mention}"
+        message += (
+            ". Watchers in this server get those announcements there instead of by DM"
+        )
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @stock.command(
+        name="unsubscribe-channel",
+        description="Stop announcing a product's stock changes in a channel",
+    )
+    @app_commands.describe(
+        url="The URL of the watched product",
+        channel="The channel to stop announcing in",
+    )
+    async def channel_unsubscribe(
+        self, interaction: discord.Interaction, url: str, channel: discord.TextChannel
+    ):
+        if interaction.guild is None or not interaction.permissions.manage_channels:
+            await interaction.response.send_message(
+                "You need the Manage Channels permission to do that", ephemeral=True
+            )
+            return
+        if await run_db(unsubscribe_channel, url, channel.id):
+            message = f"{channel.mention} will no longer announce that product"
+        else:
+            message = f"{channel.mention} isn't subscribed to that product!"
+        await interaction.response.send_message(message, ephemeral=True)
 
     @commands.Cog.listener()
     async def on_application_command_error(
@@ -173,188 +368,747 @@ class Stock(commands.Cog, name="Stock Watcher"):
 
 class Stock_Status(Enum):
     """
+    UNKNOWN      = -1
     OUT_OF_STOCK = 0
     IN_STOCK     = 1
     """
 
+    UNKNOWN = -1  # added, but its page hasn't been loaded yet
     OUT_OF_STOCK = 0
     IN_STOCK = 1
 
 
-async def auto_check_stock(bot: commands.Bot, interval: int = 60):
+def _status_text(status: int) -> str:
+    if status == Stock_Status.UNKNOWN.value:
+        return "Checking"
+    return "In stock" if status == Stock_Status.IN_STOCK.value else "Out of stock"
+
+
+@dataclass
+class ProductSnapshot:
+    """
+    Everything extracted from a single load of a product page
+    """
+
+    url: str
+    name: str | None
+    price: str
+    stock_status: int
+    strategy: str  # which price extraction strategy succeeded
+    fetched_at: datetime
+    fetch_time: float  # seconds spent loading the page
+    tier: str = Fetch_Tier.BROWSER.value  # how the page was loaded
+    unchanged: bool = False  # page was the same as the last load, not re-parsed
+    currency: str | None = None  # ISO code of the price, when the page gave one
+
+    @property
+    def money(self) -> Money | None:
+        if self.currency is not None:
+            return Money.parse_in(self.price, self.currency)
+        return Money.parse(self.price)
+
+
+# last snapshot of every url, reused while the page is unchanged
+page_cache: PageCache[ProductSnapshot] = PageCache()
+# the last stock status seen for each product_id, whichever watch it was
+# checked through
+_product_status: dict[int, int] = {}
+# background jobs filling in newly added watches, held so they aren't collected
+_enrichments: set[asyncio.Task[None]] = set()
+
+
+async def auto_check_stock(bot: commands.Bot):
     logger.info("Starting automatic stock checking")
+    pipeline = CheckPipeline(CHECK_CONCURRENCY, CHECK_CONCURRENCY_PER_HOST)
+    await run_db(strategy_cache.load)
+    # price alerts are matched against the stored prices, so they are checked
+    # for whatever each flush of the results just wrote
+    check_writer.on_flush = partial(_trigger_alerts, bot)
+    for stock in await get_all_watched() or []:
+        watch_scheduler.schedule(stock)
+    logger.info(f"Scheduled {len(watch_scheduler)} watched stocks")
+
     while True:
-        # TODO: check for duplicate url's and filter them
-        all_stocks = await get_all_watched()
-        if all_stocks:
-            for stock in all_stocks:
-                # try get user from cache, otherwise fetch directly
-                user = bot.get_user(stock.user_id)
-                if user is None:
-                    user = await bot.fetch_user(stock.user_id)
-
-                logger.info(f"Checking stock {stock.stock_url}")
-
-                time_passed = (datetime.now() - stock.last_checked).total_seconds()
-                if time_passed >= stock.check_interval:
-                    await check_stock(stock, user)
-                else:
-                    logger.info(f"No need to check {stock.stock_url}")
-            logger.info(f"Stocks checked, sleeping for {interval}")
-            await asyncio.sleep(interval)
-        else:
-            logger.info("No stocks in database, sleeping")
-            await asyncio.sleep(interval)
+        await watch_scheduler.wait_until_due()
+        due = watch_scheduler.pop_due(datetime.now())
+        if not due:
+            continue
+        # each url is checked in its own task, so one slow page doesn't hold
+        # back anything that falls due while it loads
+        for url, stocks in _group_by_url(due).items():
+            pipeline.submit(url, partial(_check_due_url, bot, stocks=stocks))
+        logger.info(
+            f"Started checking {len(due)} stocks, {len(pipeline)} urls in flight, "
+            f"{outbox.depth} messages waiting to send"
+        )
+
+
+async def _check_due_url(bot: commands.Bot, url: str, stocks: List[User_Stock]):
+    """
+    Checks a due url for its watchers, then re-arms them as soon as it finishes
+    """
+    try:
+        await _check_url(bot, url, stocks)
+    finally:
+        now = datetime.now()
+        for stock in stocks:
+            watch_scheduler.reschedule(stock, now)
+
+
+async def _trigger_alerts(bot: commands.Bot, product_ids: list[int]):
+    alerts = await run_db(trigger_alerts, product_ids, datetime.now())
+    _send_alerts(bot, alerts)
+
+
+def _send_alerts(bot: commands.Bot, alerts: list[TriggeredAlert]):
+    for alert in alerts:
+        outbox.enqueue(LazyUser(bot, alert.user_id, user_cache), _format_alert(alert))
+
+
+def _format_alert(alert: TriggeredAlert) -> str:
+    message = f"[{alert.name}](<{alert.url}>) is now **{alert.price}**"
+    if alert.target_amount is not None and alert.price_amount <= alert.target_amount:
+        target = Money(alert.target_amount, alert.price_currency).format()
+        return f"{message}, at or below your target of **{target}**!"
+    baseline = Money(alert.baseline_amount or 0, alert.price_currency).format()
+    return f"{message}, down at least {alert.drop_percent}% from **{baseline}**!"
+
+
+async def auto_save_strategies():
+    """
+    Persists newly learned extraction strategies every STRATEGY_SAVE_INTERVAL
+    seconds
+    """
+    while True:
+        await asyncio.sleep(STRATEGY_SAVE_INTERVAL)
+        await run_db(strategy_cache.save)
+
+
+async def auto_compact_history():
+    """
+    Downsamples old price history every HISTORY_COMPACT_INTERVAL seconds
+    """
+    while True:
+        await run_db(compact_history, datetime.now())
+        await asyncio.sleep(HISTORY_COMPACT_INTERVAL)
+
+
+def _format_history(
+    stock: User_Stock,
+    currency: str | None,
+    windows: list[PriceWindow],
+    changed: datetime | None,
+) -> str:
+    in_stock = _status_text(stock.stock_status)
+    message = f"# Price history for [{stock.stock_name}](<{stock.stock_url}>)\n"
+    message += f"Now: **{stock.price}** **{in_stock}**\n"
+    for window in windows:
+        label = "All time" if window.days is None else f"Last {window.days} days"
+        if window.low_amount is None or window.high_amount is None:
+            message += f"{label}: no prices recorded\n"
+            continue
+        low = Money(window.low_amount, currency).format()
+        high = Money(window.high_amount, currency).format()
+        message += f"{label}: lowest **{low}**, highest **{high}**\n"
+    if changed is not None:
+        message += f"Last changed {changed:%Y-%m-%d %H:%M}\n"
+    return message
+
+
+async def _check_url(bot: commands.Bot, url: str, stocks: List[User_Stock]):
+    """
+    Fetches the given url once and checks it for every watcher in stocks
+    """
+    logger.info(f"Checking stock {url} for {len(stocks)} watchers")
+    try:
+        snapshot = await fetch_snapshot(url)
+    except Exception as e:
+        logger.error(f"Error checking stock {url}: {e}")
+        return
+
+    announced: set[int] = set()
+    product = stocks[0].product
+    # every watch may hold its own, possibly stale, copy of the product, so
+    # changes are judged against the one status kept per product
+    previous_status = _product_status.get(product.product_id, product.stock_status)
+    _product_status[product.product_id] = snapshot.stock_status
+    # a pending product has no status yet for this to be a change from
+    if previous_status not in (snapshot.stock_status, Stock_Status.UNKNOWN.value):
+        try:
+            announced = await _announce_status(bot, product, snapshot, stocks)
+        except Exception as e:
+            logger.error(f"Error announcing stock {url}: {e}")
+
+    for stock in stocks:
+        try:
+            # the user is only looked up if there is something to send them
+            user = LazyUser(bot, stock.user_id, user_cache)
+            await check_stock(
+                stock, user, snapshot, status_announced=int(stock.user_id) in announced
+            )
+        except Exception as e:
+            logger.error(f"Error checking stock {url} for {stock.user_id}: {e}")
+
+
+async def _announce_status(
+    bot: commands.Bot,
+    product: Product,
+    snapshot: ProductSnapshot,
+    stocks: List[User_Stock],
+) -> set[int]:
+    """
+    Posts the product's new stock status once to each subscribed channel.
+    Returns the watchers who can view one of those channels, who see the
+    announcement instead of a DM
+    """
+    subscriptions = await run_db(get_subscriptions, product.product_id)
+    status = "In stock" if snapshot.stock_status == 1 else "Out of stock"
+    announced: set[int] = set()
+    for subscription in subscriptions:
+        channel = bot.get_channel(int(subscription.channel_id))
+        if not isinstance(channel, discord.TextChannel):
+            logger.error(f"Subscribed channel {subscription.channel_id} not found")
+            continue
+        mention = f"<@&{subscription.role_id}> " if subscription.role_id else ""
+        outbox.enqueue(
+            channel,
+            f"{mention}[{product.name}](<{product.url}>) is now **{status}**! "
+            f"**{snapshot.price}**",
+        )
+        for stock in stocks:
+            # members are cached by the members intent, so this makes no requests
+            member = channel.guild.get_member(int(stock.user_id))
+            if member is not None and channel.permissions_for(member).view_channel:
+                announced.add(int(stock.user_id))
+    return announced
+
+
+def _group_by_url(stocks: List[User_Stock]) -> dict[str, List[User_Stock]]:
+    """
+    Groups the given User_Stock's by their url, so each product only has to be
+    fetched once for all of its watchers
+    """
+    grouped: dict[str, List[User_Stock]] = {}
+    for stock in stocks:
+        grouped.setdefault(stock.stock_url, []).append(stock)
+    return grouped
 
 
 async def fetch_stock_status(url: str) -> int:
-    soup = await fetch_page_contents(url)
+    snapshot = await fetch_snapshot(url)
+    return snapshot.stock_status
+
+
+# schema.org ItemAvailability and OpenGraph product:availability values
+OUT_OF_STOCK_AVAILABILITY = {"outofstock", "soldout", "discontinued", "oos"}
+IN_STOCK_AVAILABILITY = {
+    "instock",
+    "instoreonly",
+    "limitedavailability",
+    "onlineonly",
+    "preorder",
+    "presale",
+    "backorder",
+    "availablefororder",
+    "pending",
+}
+ADD_TO_CART = re.compile(r"add[\s_-]?to[\s_-]?(?:cart|basket|bag)", re.IGNORECASE)
+
+
+def _extract_stock_status(soup: BeautifulSoup, url: str) -> int:
+    """
+    Finds the stock status of the given parsed page. Structured availability data
+    is used when present, before falling back to searching the visible page text
+    for out of stock phrases. Hidden elements are removed from the soup in the
+    process
+    """
+    structured = _availability_from_structured_data(soup)
+    if structured is not None:
+        status, source = structured
+        logger.info(f"Product {url} availability found in {source}")
+        return status
 
     for hidden_element in soup.select("[style*='display:none'], [hidden]"):
         hidden_element.decompose()
 
-    out_of_stock_strings = ["sold out", "out of stock", "not available"]
-    page_text = soup.get_text().lower()
-    in_stock_bool = True
+    if _has_disabled_add_to_cart(soup):
+        logger.info(f"Product {url} was found out of stock (add to cart disabled)")
+        return Stock_Status.OUT_OF_STOCK.value
 
-    for string in out_of_stock_strings:
-        if string in page_text:
-            in_stock_bool = False
-            break
+    phrase = out_of_stock_phrases.matcher_for(url).search(soup.get_text())
 
-    if in_stock_bool:
+    if phrase is None:
         logger.info(f"Product {url} was found in stock")
         return Stock_Status.IN_STOCK.value
     else:
-        logger.info(f"Product {url} was found out of stock")
+        logger.info(f"Product {url} was found out of stock ({phrase})")
         return Stock_Status.OUT_OF_STOCK.value
 
 
-async def check_stock(stock: User_Stock, user: discord.Member | discord.User):
-    stock_status = await fetch_stock_status(stock.stock_url)
-    price = await get_stock_price(stock.stock_url)
+def _parse_availability(value: object) -> int | None:
+    """
+    Maps an availability value, such as https://schema.org/InStock or "out of
+    stock", to a Stock_Status value, or None if it isn't recognised
+    """
+    if not isinstance(value, str):
+        return None
+    key = re.sub(r"[\s_-]", "", value.rsplit("/", 1)[-1]).lower()
+    if key in OUT_OF_STOCK_AVAILABILITY:
+        return Stock_Status.OUT_OF_STOCK.value
+    if key in IN_STOCK_AVAILABILITY:
+        return Stock_Status.IN_STOCK.value
+    return None
 
-    await update_last_checked(stock)
-    await update_stock_status(stock, stock_status)
 
-    if stock_status != stock.stock_status:
-        in_stock_message = "In stock" if stock_status == 1 else "Out of stock"
-        message = f"{stock.stock_name} is now **{in_stock_message}**!"
-        await user.send(message)
+def _availability_from_structured_data(soup: BeautifulSoup) -> tuple[int, str] | None:
+    """
+    Looks for the product availability in schema.org microdata, OpenGraph meta
+    tags and JSON-LD. Returns the status and where it was found, or None
+    """
+    element = soup.find(attrs={"itemprop": "availability"})
+    if isinstance(element, Tag):
+        value = (
+            element.get("href")
+            or element.get("content")
+            or element.get_text(strip=True)
+        )
+        status = _parse_availability(value)
+        if status is not None:
+            return status, "schema.org"
+
+    og = soup.find("meta", property=["product:availability", "og:availability"])
+    if isinstance(og, Tag):
+        status = _parse_availability(og.get("content"))
+        if status is not None:
+            return status, "opengraph"
+
+    for data in _iter_json_ld(soup):
+        for value in _find_json_values(data, "availability"):
+            status = _parse_availability(value)
+            if status is not None:
+                return status, "json-ld"
 
-    if price != stock.price:
-        message = f"[{stock.stock_name}](<{stock.stock_url}>) price change: {stock.price} -> {price}"
-        await update_stock_price(stock, price)
-        await user.send(message)
+    return None
+
+
+def _has_disabled_add_to_cart(soup: BeautifulSoup) -> bool:
+    for button in soup.find_all(["button", "input"]):
+        if not (button.has_attr("disabled") or button.get("aria-disabled") == "true"):
+            continue
+        label = " ".join(
+            str(part)
+            for part in (
+                button.get_text(strip=True),
+                button.get("value"),
+                button.get("name"),
+                button.get("id"),
+                " ".join(button.get("class") or []),
+            )
+            if part
+        )
+        if ADD_TO_CART.search(label):
+            return True
+    return False
+
+
+async def check_stock(
+    stock: User_Stock,
+    user: discord.Member | discord.User | LazyUser,
+    snapshot: ProductSnapshot | None = None,
+    status_announced: bool = False,
+):
+    """
+    Compares the given User_Stock against a fresh snapshot of its product, and
+    messages the user of any changes. A snapshot already fetched for the same
+    url can be passed in to avoid loading the page again. Stock changes are
+    left out of the message when status_announced, as the user has already
+    seen them in a subscribed channel
+    """
+    if snapshot is None:
+        snapshot = await fetch_snapshot(stock.stock_url)
+    stock_status = snapshot.stock_status
+    price = snapshot.price
+
+    # the in memory product is updated straight away, check_writer persists
+    # it in the next batched flush, once per product however many watch it
+    money = snapshot.money
+    product = stock.product
+    _apply_snapshot(product, snapshot, datetime.now())
+    await check_writer.record_product(product)
+    watchlist_cache.update_product(product)
+
+    previous_status = stock.notified_status
+    previous_price = stock.notified_price
+    # compared as minor units, so "$5.5" and "$5.50" are the same price
+    price_changed = money != _notified_money(stock)
+    if stock_status == previous_status and not price_changed:
+        return
+    stock.notified_status = stock_status
+    if price_changed:
+        stock.notified_price = price
+        stock.notified_amount = money.amount if money else None
+        stock.notified_currency = money.currency if money else None
+    await check_writer.record_notified(stock)
+    watchlist_cache.update_notified(stock)
+    if previous_status is None:
+        # added before its page was first loaded, so there is nothing to compare
+        return
+
+    notification = Notification(stock.stock_name, stock.stock_url)
+    if stock_status != previous_status and not status_announced:
+        notification.status = "In stock" if stock_status == 1 else "Out of stock"
+        # coming back in stock can't wait for the digest
+        notification.urgent = stock_status == Stock_Status.IN_STOCK.value
+    if price_changed:
+        notification.old_price = previous_price
+        notification.new_price = price
+    if notification.status is None and notification.new_price is None:
+        return
+    await digest_queue.notify(user, notification)
+
+
+def _apply_snapshot(product: Product, snapshot: ProductSnapshot, checked: datetime):
+    money = snapshot.money
+    product.last_checked = checked
+    product.stock_status = snapshot.stock_status
+    product.price = snapshot.price
+    product.price_amount = money.amount if money else None
+    product.price_currency = money.currency if money else None
+    product.fetch_tier = snapshot.tier
+    product.fetch_time = snapshot.fetch_time
+
+
+def _notified_money(stock: User_Stock) -> Money | None:
+    if stock.notified_amount is not None:
+        return Money(stock.notified_amount, stock.notified_currency)
+    # notified before prices were stored as minor units
+    return Money.parse(stock.notified_price)
 
 
 async def get_stock_name(url: str) -> str | None:
-    soup = await fetch_page_contents(url)
+    snapshot = await fetch_snapshot(url)
+    return snapshot.name
+
+
+def _extract_stock_name(soup: BeautifulSoup) -> str | None:
     if soup.title is not None:
         if soup.title.string is not None:
             return re.sub(r"\s[—-].*", "", soup.title.string).strip()
     return None
 
 
-async def fetch_page_contents(url: str) -> BeautifulSoup:
-    async with async_playwright() as pw:
-        # headless browser
-        browser = await pw.chromium.launch(headless=True)
-        page = await browser.new_page()
-        # user agent
-        await page.set_extra_http_headers(
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/115.0.0.0 Safari/537.36"
-            }
+async def fetch_snapshot(url: str) -> ProductSnapshot:
+    """
+    Loads the given url once and extracts everything we track about the product.
+    A plain request is tried first, only rendering the page in the browser if
+    that finds no price, or if the domain is known to need it. When the page
+    hasn't changed since the last load, the previous snapshot is reused without
+    parsing it again
+    """
+    cached = page_cache.get(url)
+
+    if not fetch_tiers.needs_browser(url):
+        fetched_at = datetime.now()
+        start = time.perf_counter()
+        validators = cached.validators if cached else PageValidators()
+        page = await fetch_static_contents(
+            url, validators.etag, validators.last_modified
         )
-        try:
-            await page.goto(url, wait_until="networkidle")
-        except Exception as e:
-            logger.error(f"Error navigating to webpage {url}: {e}")
-        html = await page.content()
-        await browser.close()
+        if page is not None:
+            fetch_time = time.perf_counter() - start
+            if page.not_modified and cached is not None:
+                logger.info(f"{url} not modified since last check")
+                return _reuse_snapshot(cached.value, fetched_at, fetch_time)
+
+            digest = content_hash(page.html)
+            if cached is not None and cached.validators.content_hash == digest:
+                logger.info(f"{url} content unchanged since last check")
+                page_cache.put(
+                    url,
+                    PageValidators(page.etag, page.last_modified, digest),
+                    cached.value,
+                )
+                return _reuse_snapshot(cached.value, fetched_at, fetch_time)
+
+            snapshot = await asyncio.to_thread(
+                _build_snapshot, url, page.html, fetched_at, fetch_time, Fetch_Tier.HTTP
+            )
+            if snapshot.strategy != "none":
+                fetch_tiers.record(url, Fetch_Tier.HTTP)
+                page_cache.put(
+                    url,
+                    PageValidators(page.etag, page.last_modified, digest),
+                    snapshot,
+                )
+                return snapshot
+        logger.info(f"No price found in static page {url}, rendering in browser")
+        fetch_tiers.record(url, Fetch_Tier.BROWSER)
+
+    fetched_at = datetime.now()
+    start = time.perf_counter()
+    html = await fetch_page_contents(url)
+    fetch_time = time.perf_counter() - start
+
+    digest = content_hash(html)
+    if cached is not None and cached.validators.content_hash == digest:
+        logger.info(f"{url} content unchanged since last check")
+        return _reuse_snapshot(cached.value, fetched_at, fetch_time)
+
+    snapshot = await asyncio.to_thread(
+        _build_snapshot, url, html, fetched_at, fetch_time, Fetch_Tier.BROWSER
+    )
+    page_cache.put(url, PageValidators(content_hash=digest), snapshot)
+    return snapshot
+
+
+def _reuse_snapshot(
+    snapshot: ProductSnapshot, fetched_at: datetime, fetch_time: float
+) -> ProductSnapshot:
+    return replace(
+        snapshot, fetched_at=fetched_at, fetch_time=fetch_time, unchanged=True
+    )
+
+
+def _build_snapshot(
+    url: str,
+    html: str,
+    fetched_at: datetime,
+    fetch_time: float,
+    tier: Fetch_Tier,
+) -> ProductSnapshot:
+    """
+    Parses the given html and extracts the product from it. This is CPU bound,
+    so it is run in a worker thread to keep the event loop free
+    """
+    soup = make_soup(html)
+    name = _extract_stock_name(soup)
+    price, currency, strategy = _extract_price(soup, url)
+    # status last, it strips hidden elements from the soup
+    stock_status = _extract_stock_status(soup, url)
+
+    return ProductSnapshot(
+        url=url,
+        name=name,
+        price=price,
+        stock_status=stock_status,
+        strategy=strategy,
+        fetched_at=fetched_at,
+        fetch_time=fetch_time,
+        tier=tier.value,
+        currency=currency,
+    )
+
+
+async def fetch_static_contents(
+    url: str, etag: str | None = None, last_modified: str | None = None
+) -> StaticPage | None:
+    """
+    Fetches the given url without rendering it, returns None if it couldn't be
+    loaded
+    """
+    return await http_pool.get(url, etag, last_modified)
 
-    soup = BeautifulSoup(html, "html.parser")
-    # [s.extract() for s in soup(["style", "script", "[document]", "head", "title"])]
 
-    return soup
+async def fetch_page_contents(url: str) -> str:
+    """
+    Renders the given url in the browser and returns the resulting html
+    """
+    return await browser_pool.render(url)
 
 
 async def add_user_watching(
-    user: discord.Member | discord.User, url: str, stock_name: str
-):
-    stock_status = await fetch_stock_status(url)
+    user: discord.Member | discord.User,
+    url: str,
+    stock_name: str | None,
+    snapshot: ProductSnapshot | None = None,
+) -> User_Stock:
+    """
+    Saves the user's watch of url without loading the page. A product someone
+    already watches is shared, and a snapshot brings it up to date. A new
+    product without one is saved as pending, for enrich_watch to fill in
+    """
     date_added = datetime.now()
-    last_checked = datetime.now()
     check_interval = 300
-    price = await get_stock_price(url)
-
-    with Session() as session:
-        db_stock = User_Stock(
-            user_id=user.id,
-            stock_url=url,
-            stock_name=stock_name,
-            stock_status=stock_status,
-            date_added=date_added,
-            last_checked=last_checked,
-            check_interval=check_interval,
-            price=price,
-        )
-        try:
-            session.add(db_stock)
-        except Exception as e:
-            logger.error(f"Error adding stock, rolling back: {e}")
-            session.rollback()
-        finally:
-            session.commit()
+
+    def insert() -> User_Stock:
+        with Session() as session:
+            # products are shared, so a url someone already watches is reused
+            product = session.query(Product).filter(Product.url == url).one_or_none()
+            if product is None:
+                found_name = snapshot.name if snapshot is not None else None
+                product = Product(
+                    url=url,
+                    name=found_name or stock_name or url,
+                    stock_status=Stock_Status.UNKNOWN.value,
+                    price="",
+                    last_checked=date_added,
+                )
+                session.add(product)
+            if snapshot is not None:
+                _apply_snapshot(product, snapshot, snapshot.fetched_at)
+            # the user starts from what is already known of the product
+            known = product.stock_status != Stock_Status.UNKNOWN.value
+            db_stock = User_Stock(
+                user_id=user.id,
+                product=product,
+                # each watcher can call a shared product their own name
+                name=stock_name,
+                date_added=date_added,
+                check_interval=check_interval,
+                notified_status=product.stock_status if known else None,
+                notified_price=product.price if known else None,
+                notified_amount=product.price_amount,
+                notified_currency=product.price_currency,
+            )
+            try:
+                session.add(db_stock)
+                session.flush()
+                if known:
+                    append_history(session, [history_row(product)])
+                session.commit()
+            except Exception as e:
+                logger.error(f"Error adding stock, rolling back: {e}")
+                session.rollback()
+                raise
+            return db_stock
+
+    db_stock = await run_db(insert)
+    watch_scheduler.schedule(db_stock)
+    watchlist_cache.add(db_stock)
+    return db_stock
 
 
-def get_stock(user: discord.Member | discord.User, url: str) -> User_Stock | None:
-    with Session() as session:
-        return (
-            session.query(User_Stock)
-            .filter(User_Stock.user_id == user.id, User_Stock.stock_url == url)
-            .one_or_none()
+def _recent_snapshot(url: str) -> ProductSnapshot | None:
+    """
+    The last snapshot of url, if it was loaded recently enough to reuse
+    """
+    cached = page_cache.get(url)
+    if cached is None or datetime.now() - cached.value.fetched_at > RECENT_SNAPSHOT_AGE:
+        return None
+    return cached.value
+
+
+def _added_message(stock: User_Stock) -> str:
+    message = f"Added [{stock.stock_name}](<{stock.stock_url}>) to your watchlist! "
+    message += f"It's **{_status_text(stock.stock_status)}**"
+    if stock.price:
+        message += f" at **{stock.price}**"
+    return message
+
+
+async def enrich_watch(
+    interaction: discord.Interaction, stock: User_Stock, named: bool
+) -> None:
+    """
+    Loads the page of a watch saved while pending and fills in its product,
+    reporting back by editing the /stock add response, or by DM once that can
+    no longer be edited. A name the user gave is kept on their watch
+    """
+    url = stock.stock_url
+    try:
+        snapshot = await fetch_snapshot(url)
+    except Exception as e:
+        logger.error(f"Could not load newly added stock {url}: {e}")
+        await _report_added(
+            interaction,
+            f"Added <{url}> to your watchlist, but couldn't load it yet. It will be checked again in {stock.check_interval // 60} minutes",
         )
+        return
+
+    product = stock.product
+    _apply_snapshot(product, snapshot, snapshot.fetched_at)
+    if snapshot.name:
+        product.name = snapshot.name
+    money = snapshot.money
+    stock.notified_status = snapshot.stock_status
+    stock.notified_price = snapshot.price
+    stock.notified_amount = money.amount if money else None
+    stock.notified_currency = money.currency if money else None
+    await check_writer.record_product(product)
+    await check_writer.record_notified(stock)
+    watchlist_cache.update_product(product)
+    watchlist_cache.update_notified(stock)
+
+    message = _added_message(stock)
+    if not named and not snapshot.name:
+        message += "\nCouldn't read the product name, so it's shown by its URL"
+    await _report_added(interaction, message)
+
+
+async def _report_added(interaction: discord.Interaction, content: str) -> None:
+    try:
+        await interaction.edit_original_response(content=content)
+    except discord.HTTPException:
+        # the interaction token has expired
+        outbox.enqueue(interaction.user, content)
+
+
+async def get_stock(user: discord.Member | discord.User, url: str) -> User_Stock | None:
+    watchlist = await watchlist_cache.get(user.id)
+    return next((stock for stock in watchlist.values() if stock.stock_url == url), None)
 
 
 async def get_stock_price(url: str) -> str:
     """
     Finds the price of given products url: str and returns it formatted.
     """
-    soup = await fetch_page_contents(url)
+    snapshot = await fetch_snapshot(url)
+    return snapshot.price
+
+
+def _format_price(currency: str | list[str], price: str | list[str]) -> str:
+    if isinstance(currency, list):
+        currency = currency[0]
+    if isinstance(price, list):
+        price = price[0]
+    symbol = ISO_TO_SYMBOL.get(currency, currency)
+    position = SYMBOL_INFO.get(symbol, "prefix")
+    return f"{symbol}{price}" if position == "prefix" else f"{price}{symbol}"
+
+
+# Price strategies take the parsed page and optionally the selector that worked
+# for the domain last time, and return the formatted price with its currency
+# and the selector that found it, or None
+class PriceMatch(NamedTuple):
+    price: str
+    currency: str | None  # ISO code, when the page named one
+    selector: str | None = None
+
+
+PRICE_CLASSES = re.compile(r"price|product-price|amount|product__price", re.IGNORECASE)
+PRICE_REGEX = re.compile(
+    r"(?:[\$\£\¥\₹]\s?\d+[\d.,]*)|(?:\d+[\d.,]*\s?[€]|kr|zł)", re.IGNORECASE
+)
 
-    # helper function to format currency
-    def format_price(currency_code: str | list[str], price: str | list[str]) -> str:
-        if isinstance(currency_code, list):
-            currency_code = currency_code[0]
-        if isinstance(price, list):
-            price = price[0]
-        symbol = ISO_TO_SYMBOL.get(currency_code, currency_code)
-        position = SYMBOL_INFO.get(symbol, "prefix")
-        return f"{symbol}{price}" if position == "prefix" else f"{price}{symbol}"
 
-    # check schema.org meta tags
+def _structured_price(currency: str | list[str], price: str | list[str]) -> PriceMatch:
+    code = currency[0] if isinstance(currency, list) else currency
+    return PriceMatch(_format_price(currency, price), currency_code(code))
+
+
+def _price_from_schema_org(soup: BeautifulSoup, _: str | None) -> PriceMatch | None:
     price_meta = soup.find("meta", itemprop="price")
     currency_meta = soup.find("meta", itemprop="priceCurrency")
     if isinstance(price_meta, Tag) and isinstance(currency_meta, Tag):
         price_val = price_meta.get("content")
         currency_val = currency_meta.get("content")
         if price_val is not None and currency_val is not None:
-            return format_price(currency_val, price_val)
+            return _structured_price(currency_val, price_val)
+    return None
 
-    # check opengraph meta tags
+
+def _price_from_opengraph(soup: BeautifulSoup, _: str | None) -> PriceMatch | None:
     price_og = soup.find("meta", property="product:price:amount")
     currency_og = soup.find("meta", property="product:price:currency")
     if isinstance(price_og, Tag) and isinstance(currency_og, Tag):
         price_val = price_og.get("content")
         currency_val = currency_og.get("content")
         if price_val is not None and currency_val is not None:
-            return format_price(currency_val, price_val)
+            return _structured_price(currency_val, price_val)
+    return None
 
-    # check json-ld data
+
+def _price_from_json_ld(soup: BeautifulSoup, _: str | None) -> PriceMatch | None:
     json_data = _extract_price_from_json_ld(soup)
     if (
         json_data
@@ -365,44 +1119,102 @@ async def get_stock_price(url: str) -> str:
         price_val = json_data.get("price")
         currency_val = json_data.get("currency")
         if isinstance(price_val, (str, list)) and isinstance(currency_val, (str, list)):
-            return format_price(currency_val, price_val)
+            return _structured_price(currency_val, price_val)
+    return None
 
-    # common elements by class name
-    price_classes = re.compile(
-        r"price|product-price|amount|product__price", re.IGNORECASE
-    )
-    price_element = soup.find_all(class_=price_classes)
-    for element in price_element:
-        parsed_price = _parse_price_string(element.get_text(strip=True))
-        if parsed_price:
-            logger.info(f"Found common elements for {url}")
-            return parsed_price
-
-    # fallback to parsing entire page text
-    page_text = soup.get_text()
-    parsed_price = _parse_price_string(page_text)
-    if parsed_price:
-        logger.info(f"Fallback to parse entire page for {url}")
-        return parsed_price
-
-    # regex fallback
-    price_regex = re.compile(
-        r"(?:[\$\£\¥\₹]\s?\d+[\d.,]*)|(?:\d+[\d.,]*\s?[€]|kr|zł)", re.IGNORECASE
+
+def _price_from_class(soup: BeautifulSoup, selector: str | None) -> PriceMatch | None:
+    """
+    Common elements by class name. The selector is the exact class name that
+    held the price, so a known domain can skip straight to it
+    """
+    for element in soup.find_all(class_=selector or PRICE_CLASSES):
+        parsed = _parse_price(element.get_text(strip=True))
+        if parsed:
+            classes = element.get("class") or []
+            matched = selector or next(
+                (name for name in classes if PRICE_CLASSES.search(name)), None
+            )
+            return parsed._replace(selector=matched)
+    return None
+
+
+def _price_from_page_text(soup: BeautifulSoup, _: str | None) -> PriceMatch | None:
+    return _parse_price(soup.get_text())
+
+
+def _price_from_regex(soup: BeautifulSoup, _: str | None) -> PriceMatch | None:
+    for text in soup.find_all(string=PRICE_REGEX):
+        parsed = _parse_price(text.strip())
+        if parsed:
+            return parsed
+    return None
+
+
+# in order of preference, cheapest and most reliable first
+PRICE_STRATEGIES = {
+    "schema.org": _price_from_schema_org,
+    "opengraph": _price_from_opengraph,
+    "json-ld": _price_from_json_ld,
+    "price-class": _price_from_class,
+    "page-text": _price_from_page_text,
+    "regex": _price_from_regex,
+}
+# strategies that only match a marked up price, so are safe to learn for a
+# domain. page-text and regex match almost any price-like text, like a
+# shipping banner, so skipping the cascade for them would hide the real price
+PRECISE_STRATEGIES = ("schema.org", "opengraph", "json-ld")
+
+
+def _is_precise(strategy: str, selector: str | None) -> bool:
+    return strategy in PRECISE_STRATEGIES or (
+        strategy == "price-class" and selector is not None
     )
-    potential_prices = soup.find_all(string=price_regex)
-    for text in potential_prices:
-        parsed_price = _parse_price_string(text.strip())
-        if parsed_price:
-            logger.info(f"Fallback to regex for {url}")
-            return parsed_price
 
-    return "Price not found"
+
+def _extract_price(soup: BeautifulSoup, url: str) -> tuple[str, str | None, str]:
+    """
+    Finds the product price in the given parsed page. Returns the formatted
+    price, the ISO code of its currency if the page named one, and the name of
+    the strategy that found it. The precise strategy that last
+    worked for the url's domain is tried first, falling back to the full cascade
+    """
+    domain = strategy_cache.domain(url)
+    learned = strategy_cache.get(domain)
+    if (
+        learned is not None
+        and learned.strategy in PRICE_STRATEGIES
+        and _is_precise(learned.strategy, learned.selector)
+    ):
+        found = PRICE_STRATEGIES[learned.strategy](soup, learned.selector)
+        if found is not None:
+            return found.price, found.currency, learned.strategy
+        logger.info(f"Learned strategy {learned.strategy} missed for {url}")
+
+    for name, strategy in PRICE_STRATEGIES.items():
+        found = strategy(soup, None)
+        if found is not None:
+            logger.info(f"Found price for {url} with {name}")
+            if _is_precise(name, found.selector):
+                strategy_cache.record(domain, name, found.selector)
+            return found.price, found.currency, name
+
+    return "Price not found", None, "none"
 
 
 def _parse_price_string(text: str) -> str | None:
     """
     Parses the given text:str and finds the product price if it is found, otherwise returns None
     """
+    parsed = _parse_price(text)
+    return parsed.price if parsed else None
+
+
+def _parse_price(text: str) -> PriceMatch | None:
+    """
+    Like _parse_price_string, also keeping the ISO code when the text gives the
+    currency as one rather than as a symbol
+    """
     price = Price.fromstring(text)
     if price and price.amount_float:
         if price.currency:
@@ -413,7 +1225,10 @@ def _parse_price_string(text: str) -> str | None:
 
         symbol = ISO_TO_SYMBOL.get(currency, currency)
         position = SYMBOL_INFO.get(symbol, "prefix")
-        return f"{symbol}{amount}" if position == "prefix" else f"{amount}{symbol}"
+        formatted = f"{symbol}{amount}" if position == "prefix" else f"{amount}{symbol}"
+        # a symbol alone can't tell "$" from AUD, or "kr" from NOK
+        code = None if currency in SYMBOL_TO_ISO else currency_code(currency)
+        return PriceMatch(formatted, code)
 
     return None
 
@@ -442,121 +1257,245 @@ def _extract_price_from_json_ld(soup: BeautifulSoup) -> str | None:
     return None
 
 
-async def get_users_watched(
-    user: discord.Member | discord.User,
-) -> List[User_Stock] | None:
+def _iter_json_ld(soup: BeautifulSoup) -> Iterator[object]:
     """
-    Gets all the given discord.Member's User_Stock's and returns as a list or None
+    Yields the parsed data of every JSON-LD script in the page
     """
-    try:
-        with Session() as session:
-            return session.query(User_Stock).filter(User_Stock.user_id == user.id).all()
-    except Exception as e:
-        logger.error(f"Error getting users watched: {e}")
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            yield json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
 
 
-async def get_all_watched() -> List[User_Stock] | None:
+def _find_json_values(data: object, key: str) -> Iterator[object]:
     """
-    Gets all watched User_Stock for every user and returns as a list or None
+    Yields every value of the given key, searching nested objects and lists
     """
-    with Session() as session:
-        try:
-            return session.query(User_Stock).filter().all()
-        except Exception as e:
-            logger.error(f"Error getting all watched: {e}")
+    if isinstance(data, dict):
+        for name, value in data.items():
+            if name == key:
+                yield value
+            else:
+                yield from _find_json_values(value, key)
+    elif isinstance(data, list):
+        for item in data:
+            yield from _find_json_values(item, key)
 
 
-async def update_last_checked(stock: User_Stock):
-    """
-    Updates the given User_Stock.last_checked with the current datetime.now()
-    """
-    with Session() as session:
-        db_stock = stock
-        db_stock.last_checked = datetime.now()
-        try:
-            session.add(db_stock)
-        except Exception as e:
-            logger.error(f"Error updating last checked, rolling back: {e}")
-            session.rollback()
-        finally:
-            session.commit()
-            logger.info(f"Last checked updated for {stock.stock_url}")
+@dataclass
+class WatchPage:
+    stocks: List[User_Stock]
+    has_previous: bool
+    has_next: bool
 
 
-async def update_stock_status(stock: User_Stock, status: int):
+async def get_watch_page(
+    user: discord.Member | discord.User,
+    after: int | None = None,
+    before: int | None = None,
+    size: int = WATCHLIST_PAGE_SIZE,
+) -> WatchPage:
     """
-    Update the given User_Stock.stock_status with given status argument
+    Gets one page of the user's watchlist, ordered by product and starting
+    after or ending before the given product_id. Pages are cut from the
+    cached watchlist, which is loaded in one query the first time it is needed
     """
-    with Session() as session:
-        db_stock = stock
-        db_stock.stock_status = status
-        try:
-            session.add(db_stock)
-        except Exception as e:
-            logger.error(f"Error updating stock status, rolling back: {e}")
-            session.rollback()
-        finally:
-            session.commit()
-            logger.info(f"Stock status updated for {stock.stock_url}")
+    watchlist = await watchlist_cache.get(user.id)
+    product_ids = sorted(watchlist)
+    stocks = [watchlist[product_id] for product_id in product_ids]
+    if before is not None:
+        end = bisect_left(product_ids, before)
+        start = max(0, end - size)
+    else:
+        start = 0 if after is None else bisect_right(product_ids, after)
+        end = start + size
+    return WatchPage(stocks[start:end], start > 0, end < len(stocks))
 
 
-async def update_stock_price(stock: User_Stock, price: str):
+async def get_all_watched() -> List[User_Stock] | None:
     """
-    Update the given User_Stock.price with given price argument
+    Gets all watched User_Stock for every user and returns as a list or None
     """
-    with Session() as session:
-        db_stock = stock
-        db_stock.price = price
-        try:
-            session.add(db_stock)
-        except Exception as e:
-            logger.error(f"Error updating last checked, rolling back: {e}")
-            session.rollback()
-        finally:
-            session.commit()
-            logger.info(f"Stock price updated for {stock.stock_url}")
+
+    def query():
+        with Session() as session:
+            return session.query(User_Stock).filter().all()
+
+    try:
+        return await run_db(query)
+    except Exception as e:
+        logger.error(f"Error getting all watched: {e}")
 
 
 async def remove_user_watching(user: discord.Member | discord.User, stock: User_Stock):
-    with Session() as session:
-        try:
-            session.delete(stock)
-        except Exception:
-            logger.error(f"Error deleting {user}: {stock}")
-            session.rollback()
-        finally:
-            session.commit()
+    def delete() -> bool:
+        """
+        Returns whether the product was dropped along with the watch
+        """
+        with Session() as session:
+            try:
+                # by query, so the cached watch is untouched if this rolls back
+                session.query(User_Stock).filter(
+                    User_Stock.user_id == stock.user_id,
+                    User_Stock.product_id == stock.product_id,
+                ).delete()
+                delete_alerts(session, stock.product_id, stock.user_id)
+                session.flush()
+                # drop the product once nobody is watching it
+                watchers = (
+                    session.query(User_Stock)
+                    .filter(User_Stock.product_id == stock.product_id)
+                    .count()
+                )
+                if watchers == 0:
+                    delete_history(session, stock.product_id)
+                    delete_alerts(session, stock.product_id)
+                    delete_subscriptions(session, stock.product_id)
+                    session.query(Product).filter(
+                        Product.product_id == stock.product_id
+                    ).delete()
+                session.commit()
+            except Exception as e:
+                logger.error(f"Error deleting stock for {user}, rolling back: {e}")
+                session.rollback()
+                raise
             logger.info(f"Stock deleted for {user}: {stock}")
+        return watchers == 0
 
+    # the watch is only forgotten once it is gone from the db
+    if await run_db(delete):
+        _product_status.pop(stock.product_id, None)
+    check_writer.discard(stock.user_id, stock.stock_url)
+    watchlist_cache.remove(stock.user_id, stock.product_id)
+    watch_scheduler.unschedule(stock.user_id, stock.stock_url)
 
-class RemoveButton(discord.ui.Button["Remove"]):
-    def __init__(self, index: int, stock: User_Stock):
-        super().__init__(
-            style=discord.ButtonStyle.primary, label=f"{index + 1}: {stock.stock_name}"
-        )
-        self.index = index
-        self.stock = stock
-
-    # Called whenever a button is pressed
-    async def callback(self, interaction: discord.Interaction):
-        await remove_user_watching(interaction.user, self.stock)
-        watched_stocks = await get_users_watched(interaction.user)
-        if watched_stocks:
+
+class WatchlistView(discord.ui.View):
+    """
+    Pages through a user's watchlist. The page on show is kept in the view, so
+    redrawing it takes no queries and only moving between pages loads another
+    """
+
+    def __init__(
+        self, user: discord.Member | discord.User, page: WatchPage, page_number: int = 1
+    ):
+        super().__init__()
+        self.user = user
+        self.page = page
+        self.page_number = page_number
+        self._refresh()
+
+    def _refresh(self) -> None:
+        self.previous_page.disabled = not self.page.has_previous
+        self.next_page.disabled = not self.page.has_next
+
+    def embed(self) -> discord.Embed:
+        start = (self.page_number - 1) * WATCHLIST_PAGE_SIZE + 1
+        lines = []
+        for index, item in enumerate(self.page.stocks, start):
+            in_stock = _status_text(item.stock_status)
+            lines.append(
+                f"**{index}**: _[{item.stock_name}](<{item.stock_url}>)_: **{in_stock}** **{item.price}**"
+            )
+        embed = discord.Embed(title="Watched Items", description="\n".join(lines))
+        embed.set_footer(text=f"Page {self.page_number}")
+        return embed
+
+    async def show(
+        self,
+        interaction: discord.Interaction,
+        page: WatchPage,
+        page_number: int,
+        content: str | None = None,
+    ) -> None:
+        if not page.stocks:
+            # the watchlist shrank under the view, so there is nothing to page to
+            self.stop()
             await interaction.response.edit_message(
-                content=f"**{self.stock.stock_name}** has been deleted. Select another or dismiss:",
-                view=Remove(watched_stocks),
+                content="There is nothing more on your watchlist",
+                embed=None,
+                view=None,
             )
+            return
+        self.page, self.page_number = page, page_number
+        self._refresh()
+        kwargs = {} if content is None else {"content": content}
+        await interaction.response.edit_message(embed=self.embed(), view=self, **kwargs)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        first = self.page.stocks[0].product_id if self.page.stocks else None
+        page = await get_watch_page(self.user, before=first)
+        await self.show(interaction, page, max(1, self.page_number - 1))
 
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        last = self.page.stocks[-1].product_id if self.page.stocks else None
+        page = await get_watch_page(self.user, after=last)
+        await self.show(interaction, page, self.page_number + 1)
 
-class Remove(discord.ui.View):
-    def __init__(self, watched: List[User_Stock]):
-        super().__init__()
-        self.watched = watched
 
-        # Format list of watched stocks
-        for index, stock in enumerate(watched):
-            new_button = RemoveButton(index, stock)
-            self.add_item(new_button)
+class RemoveView(WatchlistView):
+    """
+    A watchlist page with a menu of its products to remove. Removing one
+    updates the cached page in place, only loading another once it is empty
+    """
+
+    def _refresh(self) -> None:
+        super()._refresh()
+        start = (self.page_number - 1) * WATCHLIST_PAGE_SIZE + 1
+        self.remove_select.options = [
+            discord.SelectOption(
+                label=f"{index}: {item.stock_name}"[:MAX_OPTION_LABEL],
+                value=str(item.product_id),
+            )
+            for index, item in enumerate(self.page.stocks, start)
+        ]
+
+    @discord.ui.select(placeholder="Pick a product to stop watching")
+    async def remove_select(
+        self, interaction: discord.Interaction, select: discord.ui.Select
+    ):
+        product_id = int(select.values[0])
+        stock = next(
+            (item for item in self.page.stocks if item.product_id == product_id), None
+        )
+        if stock is None:
+            await interaction.response.defer()
+            return
+        try:
+            await remove_user_watching(interaction.user, stock)
+        except Exception as e:
+            logger.info(f"Could not remove stock from database: {e}")
+            await self.show(
+                interaction,
+                self.page,
+                self.page_number,
+                f"There was an error removing **{stock.stock_name}**, please try again",
+            )
+            return
+        self.page.stocks.remove(stock)
+        page, page_number = self.page, self.page_number
+        if not page.stocks and page.has_next:
+            page = await get_watch_page(self.user, after=product_id)
+        elif not page.stocks and page.has_previous:
+            page = await get_watch_page(self.user, before=product_id)
+            page_number -= 1
+        if not page.stocks:
+            self.stop()
+            await interaction.response.edit_message(
+                content=f"**{stock.stock_name}** has been deleted. You have nothing else watched",
+                embed=None,
+                view=None,
+            )
+            return
+        content = f"**{stock.stock_name}** has been deleted. Select another or dismiss:"
+        await self.show(interaction, page, page_number, content)
 
 
 async def setup(bot):
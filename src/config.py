@@ -9,5 +9,27 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 DB_PATH = Path(os.getenv("DB_PATH", "src/db/main.db")).absolute()
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 DB_DIR = f"sqlite:///{DB_PATH}"
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))  # bytes
 MY_USER_ID = int(os.getenv("MY_USER_ID", "0"))
 MY_GUILD_ID = int(os.getenv("MY_GUILD_ID", "0"))
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", "8"))
+CHECK_CONCURRENCY_PER_HOST = int(os.getenv("CHECK_CONCURRENCY_PER_HOST", "2"))
+CHECK_FLUSH_INTERVAL = float(os.getenv("CHECK_FLUSH_INTERVAL", "5"))  # seconds
+CHECK_FLUSH_SIZE = int(os.getenv("CHECK_FLUSH_SIZE", "500"))
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "120"))  # seconds
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))  # seconds
+WATCHLIST_CACHE_SIZE = int(os.getenv("WATCHLIST_CACHE_SIZE", "1000"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "5"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "2"))  # seconds
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "10000"))  # milliseconds
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
+STOCK_PHRASES_PATH = Path(
+    os.getenv("STOCK_PHRASES_PATH", "src/stock_phrases.json")
+).absolute()
+HISTORY_RAW_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "7"))
+HISTORY_HOURLY_DAYS = int(os.getenv("HISTORY_HOURLY_DAYS", "90"))
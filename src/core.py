@@ -11,8 +11,15 @@ import discord
 from discord.ext import commands
 
 import config
-from cogs.stock import auto_check_stock
-from db.connect import try_connect
+from checker.writer import check_writer
+from cogs.stock import auto_check_stock, auto_compact_history, auto_save_strategies
+from notify.digest import digest_queue
+from notify.outbox import outbox
+from db.connect import db_executor, engine, run_db, try_connect
+from migrations.runner import migrate
+from scraper.browser import browser_pool
+from scraper.http import http_pool
+from scraper.strategies import strategy_cache
 
 intents = discord.Intents.default()
 intents.members = True
@@ -58,6 +65,8 @@ logging.getLogger("discord.http").setLevel(logging.WARNING)
 class Cheeky(commands.Bot):
     def __init__(self) -> None:
         super().__init__(intents=intents, command_prefix="!")
+        self.browser_pool = browser_pool
+        self.http_pool = http_pool
 
     async def on_ready(self):
         print(f"{self.user} is ready and online!")
@@ -65,14 +74,34 @@ class Cheeky(commands.Bot):
         await self.load_db()
         # create task for auto checking stock
         self.loop.create_task(auto_check_stock(self))
+        self.loop.create_task(auto_compact_history())
+        self.loop.create_task(auto_save_strategies())
         try:
             await self.tree.sync()
         except Exception as e:
             print(f"Error syncing tree: {e}")
 
-    # async def setup_hook(self):
-    #     print(f"Copying global to {config.MY_GUILD_ID}")
-    #     await self.tree.sync(guild=MY_GUILD)
+    async def setup_hook(self):
+        # start the shared browser and http session once, rather than per fetch
+        await self.http_pool.start()
+        await self.browser_pool.start()
+        check_writer.start()
+        outbox.start()
+        # print(f"Copying global to {config.MY_GUILD_ID}")
+        # await self.tree.sync(guild=MY_GUILD)
+
+    async def close(self) -> None:
+        # write any buffered check results before the db worker goes away,
+        # queueing the price alerts they set off
+        await check_writer.close()
+        await run_db(strategy_cache.save)
+        # send held back notifications while the client is still connected
+        await digest_queue.close()
+        await outbox.close()
+        await self.http_pool.close()
+        await self.browser_pool.close()
+        await super().close()
+        db_executor.shutdown(wait=True)
 
     async def load_cogs(self) -> None:
         """
@@ -95,7 +124,8 @@ class Cheeky(commands.Bot):
         handle_error(cast(BaseException, sys.exc_info()[1]))
 
     async def load_db(self) -> None:
-        try_connect()
+        await run_db(try_connect)
+        await run_db(migrate, engine)
 
     async def on_app_command_error(
         self,
@@ -1,3 +1,11 @@
-from db import connect, models, utils
+from db import alerts, connect, history, models, subscriptions, utils, watchlists
 
-__all__ = ("connect", "models", "utils")
+__all__ = (
+    "alerts",
+    "connect",
+    "history",
+    "models",
+    "subscriptions",
+    "utils",
+    "watchlists",
+)
@@ -0,0 +1,112 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session as OrmSession
+
+from db.connect import Session
+from db.models import Price_Alert
+
+logger = logging.getLogger(__name__)
+
+# Every pending alert of the given products whose price has reached its target
+# or dropped far enough below the price it was set at, under the name its user
+# gave the product. The partial index on pending alerts keeps this to one
+# lookup per product however many are checked
+TRIGGERED_ALERTS = text(
+    """
+    SELECT a.alert_id, a.user_id, a.target_amount, a.drop_percent,
+        a.baseline_amount, p.url, COALESCE(s.name, p.name), p.price,
+        p.price_amount, p.price_currency
+    FROM PRICE_ALERT AS a
+    JOIN PRODUCT AS p ON p.product_id = a.product_id
+    LEFT JOIN USER_STOCK AS s
+        ON s.user_id = a.user_id AND s.product_id = a.product_id
+    WHERE a.triggered IS NULL
+        AND a.product_id IN :product_ids
+        AND p.price_amount IS NOT NULL
+        AND p.price_currency IS a.currency
+        AND (
+            p.price_amount <= a.target_amount
+            OR p.price_amount * 100 <= a.baseline_amount * (100 - a.drop_percent)
+        )
+    """
+).bindparams(bindparam("product_ids", expanding=True))
+
+
+@dataclass(frozen=True)
+class TriggeredAlert:
+    alert_id: int
+    user_id: str
+    target_amount: int | None
+    drop_percent: int | None
+    baseline_amount: int | None
+    url: str
+    name: str
+    price: str
+    price_amount: int
+    price_currency: str | None
+
+
+def add_alert(
+    user_id: int | str,
+    product_id: int,
+    currency: str | None,
+    target_amount: int | None = None,
+    drop_percent: int | None = None,
+    baseline_amount: int | None = None,
+) -> Price_Alert:
+    with Session() as session:
+        alert = Price_Alert(
+            user_id=user_id,
+            product_id=product_id,
+            target_amount=target_amount,
+            drop_percent=drop_percent,
+            baseline_amount=baseline_amount,
+            currency=currency,
+            created=datetime.now(),
+        )
+        try:
+            session.add(alert)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error adding price alert, rolling back: {e}")
+            session.rollback()
+            raise
+        return alert
+
+
+def trigger_alerts(product_ids: list[int], now: datetime) -> list[TriggeredAlert]:
+    """
+    Finds the alerts set off by the latest prices of the given products and
+    marks them triggered, in one transaction so each fires only once
+    """
+    if not product_ids:
+        return []
+    with Session() as session:
+        try:
+            rows = session.execute(TRIGGERED_ALERTS, {"product_ids": product_ids}).all()
+            triggered = [TriggeredAlert(*row) for row in rows]
+            if triggered:
+                session.query(Price_Alert).filter(
+                    Price_Alert.alert_id.in_([alert.alert_id for alert in triggered])
+                ).update({Price_Alert.triggered: now})
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error checking price alerts, rolling back: {e}")
+            session.rollback()
+            return []
+    return triggered
+
+
+def delete_alerts(
+    session: OrmSession, product_id: int, user_id: int | str | None = None
+) -> None:
+    """
+    Deletes the product's alerts, only those of user_id if it is given
+    """
+    query = session.query(Price_Alert).filter(Price_Alert.product_id == product_id)
+    if user_id is not None:
+        query = query.filter(Price_Alert.user_id == user_id)
+    query.delete()
@@ -1,17 +1,52 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import text
 
-from config import DB_DIR
+from config import DB_DIR, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
 
 logger = logging.getLogger(__name__)
 
 engine = create_engine(str(DB_DIR))
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    """
+    WAL lets the checker write while commands read, and with it NORMAL only
+    syncs at checkpoints instead of on every commit
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
 Session = sessionmaker(bind=engine, expire_on_commit=False)
 
+T = TypeVar("T")
+
+# SQLite only allows one writer at a time, a single worker keeps every query
+# serialised and off the event loop
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Runs the blocking database callable on the database worker thread and
+    awaits its result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(fn, *args, **kwargs))
+
 
 def try_connect() -> None:
     try:
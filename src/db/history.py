@@ -0,0 +1,211 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import DateTime, bindparam, func, text
+from sqlalchemy.orm import Session as OrmSession
+
+from config import HISTORY_HOURLY_DAYS, HISTORY_RAW_DAYS
+from db.connect import Session
+from db.models import Price_History, Product
+from scraper.money import Money
+
+logger = logging.getLogger(__name__)
+
+# Only appends when the price, currency or stock status differs from the newest
+# row for the product, so unchanged checks don't grow the table. The newest
+# row is found through the (product_id, recorded) index. Products deleted since
+# the check are skipped
+APPEND_IF_CHANGED = text(
+    """
+    INSERT INTO PRICE_HISTORY
+        (product_id, recorded, amount, low_amount, high_amount, currency, stock_status)
+    SELECT :product_id, :recorded, :amount, :amount, :amount, :currency, :stock_status
+    WHERE EXISTS (SELECT 1 FROM PRODUCT WHERE product_id = :product_id)
+    AND NOT EXISTS (
+        SELECT 1 FROM (
+            SELECT amount, currency, stock_status FROM PRICE_HISTORY
+            WHERE product_id = :product_id
+            ORDER BY recorded DESC LIMIT 1
+        ) AS newest
+        WHERE newest.amount IS :amount
+            AND newest.currency IS :currency
+            AND newest.stock_status = :stock_status
+    )
+    """
+).bindparams(bindparam("recorded", type_=DateTime))
+
+# strftime formats truncating a timestamp to the start of its bucket, and the
+# bucket's length
+HOURLY = ("%Y-%m-%d %H:00:00", timedelta(hours=1))
+DAILY = ("%Y-%m-%d 00:00:00", timedelta(days=1))
+
+
+def history_row(product: Product) -> dict[str, Any]:
+    """
+    The history row describing the product's current state
+    """
+    amount, currency = product.price_amount, product.price_currency
+    if amount is None:
+        # not checked since prices were stored as minor units
+        money = Money.parse(product.price)
+        amount = money.amount if money else None
+        currency = money.currency if money else None
+    return {
+        "product_id": product.product_id,
+        "recorded": product.last_checked,
+        "amount": amount,
+        "currency": currency,
+        "stock_status": product.stock_status,
+    }
+
+
+def append_history(session: OrmSession, rows: list[dict[str, Any]]) -> None:
+    if rows:
+        session.execute(APPEND_IF_CHANGED, rows)
+
+
+def _merge_buckets(
+    session: OrmSession,
+    bucket_size: tuple[str, timedelta],
+    start: datetime | None,
+    end: datetime,
+) -> int:
+    """
+    Merges every bucket between start and end that holds more than one row into
+    a single row at the bucket start, keeping its last price and status and the
+    lowest and highest price seen. Buckets straddling start or end only merge
+    their rows inside the range. Returns the number of rows removed
+    """
+    bucket_format, size = bucket_size
+    bucket = func.strftime(bucket_format, Price_History.recorded)
+    in_range = [Price_History.recorded < end]
+    if start is not None:
+        in_range.append(Price_History.recorded >= start)
+    groups = (
+        session.query(Price_History.product_id, bucket)
+        .filter(*in_range)
+        .group_by(Price_History.product_id, bucket)
+        .having(func.count() > 1)
+        .all()
+    )
+    removed = 0
+    for product_id, bucket_text in groups:
+        bucket_start = datetime.fromisoformat(bucket_text)
+        rows = (
+            session.query(Price_History)
+            .filter(
+                *in_range,
+                Price_History.product_id == product_id,
+                Price_History.recorded >= bucket_start,
+                Price_History.recorded < bucket_start + size,
+            )
+            .order_by(Price_History.recorded)
+            .all()
+        )
+        lows = [row.low_amount for row in rows if row.low_amount is not None]
+        highs = [row.high_amount for row in rows if row.high_amount is not None]
+        last = rows[-1]
+        session.add(
+            Price_History(
+                product_id=product_id,
+                # kept within the range its rows came from
+                recorded=bucket_start if start is None else max(bucket_start, start),
+                amount=last.amount,
+                low_amount=min(lows, default=None),
+                high_amount=max(highs, default=None),
+                currency=last.currency,
+                stock_status=last.stock_status,
+            )
+        )
+        for row in rows:
+            session.delete(row)
+        removed += len(rows) - 1
+    return removed
+
+
+def compact_history(
+    now: datetime,
+    raw_days: int = HISTORY_RAW_DAYS,
+    hourly_days: int = HISTORY_HOURLY_DAYS,
+) -> int:
+    """
+    Keeps history at full resolution for raw_days, hourly until hourly_days
+    and daily beyond that. Returns the number of rows removed
+    """
+    raw_cutoff = now - timedelta(days=raw_days)
+    hourly_cutoff = now - timedelta(days=hourly_days)
+    with Session() as session:
+        try:
+            removed = _merge_buckets(session, HOURLY, hourly_cutoff, raw_cutoff)
+            removed += _merge_buckets(session, DAILY, None, hourly_cutoff)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error compacting price history, rolling back: {e}")
+            session.rollback()
+            return 0
+    logger.info(f"Compacted price history, removed {removed} rows")
+    return removed
+
+
+@dataclass
+class PriceWindow:
+    days: int | None
+    low_amount: int | None
+    high_amount: int | None
+
+
+def summarise_history(
+    product_id: int, currency: str | None, now: datetime, windows: tuple[int, ...]
+) -> list[PriceWindow]:
+    """
+    Lowest and highest price in the current currency over each of the last
+    windows days, then over all time. Rows are only written on change, so the
+    price in effect when each window opened is counted as well
+    """
+    summaries: list[PriceWindow] = []
+    with Session() as session:
+        matching = (
+            Price_History.product_id == product_id,
+            Price_History.currency.is_(currency),
+        )
+        for days in (*windows, None):
+            in_window = [*matching]
+            if days is not None:
+                start = now - timedelta(days=days)
+                in_window.append(Price_History.recorded >= start)
+            low, high = (
+                session.query(
+                    func.min(Price_History.low_amount),
+                    func.max(Price_History.high_amount),
+                )
+                .filter(*in_window)
+                .one()
+            )
+            if days is not None:
+                opening = (
+                    session.query(Price_History.amount)
+                    .filter(*matching, Price_History.recorded < start)
+                    .order_by(Price_History.recorded.desc())
+                    .limit(1)
+                    .scalar()
+                )
+                if opening is not None:
+                    low = opening if low is None else min(low, opening)
+                    high = opening if high is None else max(high, opening)
+            summaries.append(PriceWindow(days, low, high))
+    return summaries
+
+
+def last_change(product_id: int) -> datetime | None:
+    with Session() as session:
+        return (
+            session.query(func.max(Price_History.recorded))
+            .filter(Price_History.product_id == product_id)
+            .scalar()
+        )
+
+
+def delete_history(session: OrmSession, product_id: int) -> None:
+    session.query(Price_History).filter(Price_History.product_id == product_id).delete()
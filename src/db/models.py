@@ -1,7 +1,17 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, Unicode, create_engine
-from sqlalchemy.orm import Mapped, declarative_base, mapped_column
+from sqlalchemy import (
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Unicode,
+    create_engine,
+    text,
+)
+from sqlalchemy.ext.associationproxy import AssociationProxy, association_proxy
+from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
 
 from config import DB_DIR
 
@@ -22,16 +32,165 @@ class User(Base):
         )
 
 
+class Product(Base):
+    """
+    Current state of a watched url, shared by everyone watching it so each
+    check is a single row update
+    """
+
+    __tablename__ = "PRODUCT"
+    __table_args__ = (Index("ix_product_last_checked", "last_checked"),)
+    product_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    url: Mapped[str] = mapped_column(Unicode, nullable=False, unique=True)
+    name: Mapped[str] = mapped_column(Unicode, nullable=False)
+    stock_status: Mapped[int] = mapped_column(Integer, nullable=False)
+    price: Mapped[str] = mapped_column(Unicode, nullable=False)
+    # price in minor units, e.g. cents, which changes and alerts compare on
+    price_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    price_currency: Mapped[str | None] = mapped_column(Unicode(3), nullable=True)
+    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    fetch_tier: Mapped[str | None] = mapped_column(Unicode, nullable=True)
+    fetch_time: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"ID: {self.product_id} URL: {self.url} Name: {self.name} Status: {self.stock_status} Price: {self.price} Last Checked: {self.last_checked} Tier: {self.fetch_tier}"
+
+
+def _product_field(field: str) -> AssociationProxy:
+    # lets a watch be built and read as before, the first field set creates
+    # its Product
+    return association_proxy(
+        "product", field, creator=lambda value: Product(**{field: value})
+    )
+
+
 class User_Stock(Base):
+    """
+    A user watching a Product, along with the state they were last notified of
+    """
+
     __tablename__ = "USER_STOCK"
+    __table_args__ = (Index("ix_user_stock_product_id", "product_id"),)
     user_id: Mapped[int] = mapped_column(Unicode, primary_key=True)
-    stock_url: Mapped[str] = mapped_column(Unicode, primary_key=True)
-    stock_name: Mapped[str] = mapped_column(Unicode, nullable=False)
-    stock_status: Mapped[int] = mapped_column(Integer, nullable=False)
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("PRODUCT.product_id"), primary_key=True
+    )
     date_added: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     check_interval: Mapped[int] = mapped_column(Integer, default=300)  # Default 5 mins
-    price: Mapped[str] = mapped_column(Unicode, nullable=False)
+    notified_status: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    notified_price: Mapped[str | None] = mapped_column(Unicode, nullable=True)
+    notified_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    notified_currency: Mapped[str | None] = mapped_column(Unicode(3), nullable=True)
+    # the user's own name for the product, shown instead of Product.name
+    name: Mapped[str | None] = mapped_column(Unicode, nullable=True)
+    product: Mapped[Product] = relationship(lazy="joined")
+
+    stock_url = _product_field("url")
+    _product_name = _product_field("name")
+    stock_status = _product_field("stock_status")
+    price = _product_field("price")
+    last_checked = _product_field("last_checked")
+
+    @property
+    def stock_name(self) -> str:
+        return self.name or self._product_name
+
+    @stock_name.setter
+    def stock_name(self, value: str) -> None:
+        self.name = value
+        # a watch built before its product names the product as well
+        if self.product is None or self.product.name is None:
+            self._product_name = value
 
     def __repr__(self) -> str:
         return f"ID: {self.user_id} URL: {self.stock_url} Name: {self.stock_name} Status: {self.stock_status} Date Added: {self.date_added} Last Checked: {self.last_checked} Interval: {self.check_interval} Price: {self.price}"
+
+
+class Price_History(Base):
+    """
+    Append-only record of each change to a product's price or stock status.
+    Old rows are merged into hourly then daily buckets, keeping the lowest and
+    highest price seen in each
+    """
+
+    __tablename__ = "PRICE_HISTORY"
+    __table_args__ = (
+        Index("ix_price_history_product_recorded", "product_id", "recorded"),
+    )
+    history_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("PRODUCT.product_id"), nullable=False
+    )
+    recorded: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # minor units, e.g. cents, null when no price was found
+    amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    low_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    high_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    currency: Mapped[str | None] = mapped_column(Unicode(3), nullable=True)
+    stock_status: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Product: {self.product_id} Recorded: {self.recorded} Amount: {self.amount} {self.currency} Low: {self.low_amount} High: {self.high_amount} Status: {self.stock_status}"
+
+
+class Price_Alert(Base):
+    """
+    A user's target price or percent drop for a watched product, cleared once
+    it has triggered
+    """
+
+    __tablename__ = "PRICE_ALERT"
+    __table_args__ = (
+        Index(
+            "ix_price_alert_pending",
+            "product_id",
+            sqlite_where=text("triggered IS NULL"),
+        ),
+    )
+    alert_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Unicode, nullable=False)
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("PRODUCT.product_id"), nullable=False
+    )
+    # minor units, in currency
+    target_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    drop_percent: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    baseline_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    currency: Mapped[str | None] = mapped_column(Unicode(3), nullable=True)
+    created: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    triggered: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"ID: {self.alert_id} User: {self.user_id} Product: {self.product_id} Target: {self.target_amount} Drop: {self.drop_percent}% Baseline: {self.baseline_amount} {self.currency} Triggered: {self.triggered}"
+
+
+class Channel_Subscription(Base):
+    """
+    A guild channel announcing a watched product's stock changes, in one
+    message for everyone rather than a DM to each watcher in the guild
+    """
+
+    __tablename__ = "CHANNEL_SUBSCRIPTION"
+    __table_args__ = (Index("ix_channel_subscription_product_id", "product_id"),)
+    channel_id: Mapped[int] = mapped_column(Unicode, primary_key=True)
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("PRODUCT.product_id"), primary_key=True
+    )
+    guild_id: Mapped[int] = mapped_column(Unicode, nullable=False)
+    # mentioned in each announcement, if set
+    role_id: Mapped[int | None] = mapped_column(Unicode, nullable=True)
+    created: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Channel: {self.channel_id} Product: {self.product_id} Guild: {self.guild_id} Role: {self.role_id} Created: {self.created}"
+
+
+class Domain_Strategy(Base):
+    __tablename__ = "DOMAIN_STRATEGY"
+    domain: Mapped[str] = mapped_column(Unicode, primary_key=True)
+    strategy: Mapped[str] = mapped_column(Unicode, nullable=False)
+    selector: Mapped[str | None] = mapped_column(Unicode, nullable=True)
+    updated: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Domain: {self.domain} Strategy: {self.strategy} Selector: {self.selector} Updated: {self.updated}"
@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy.orm import Session as OrmSession
+
+from db.connect import Session
+from db.models import Channel_Subscription, Product
+
+logger = logging.getLogger(__name__)
+
+
+def subscribe_channel(
+    url: str, guild_id: int | str, channel_id: int | str, role_id: int | str | None
+) -> Product | None:
+    """
+    Subscribes the channel to the watched product at url, replacing the role
+    of an existing subscription. Returns the product, or None if nobody is
+    watching the url
+    """
+    with Session() as session:
+        product = session.query(Product).filter(Product.url == url).one_or_none()
+        if product is None:
+            return None
+        try:
+            session.merge(
+                Channel_Subscription(
+                    channel_id=str(channel_id),
+                    product_id=product.product_id,
+                    guild_id=str(guild_id),
+                    role_id=str(role_id) if role_id is not None else None,
+                    created=datetime.now(),
+                )
+            )
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error subscribing channel {channel_id}, rolling back: {e}")
+            session.rollback()
+            raise
+        return product
+
+
+def unsubscribe_channel(url: str, channel_id: int | str) -> bool:
+    """
+    Returns whether the channel was subscribed to the product at url
+    """
+    with Session() as session:
+        deleted = (
+            session.query(Channel_Subscription)
+            .filter(
+                Channel_Subscription.channel_id == str(channel_id),
+                Channel_Subscription.product_id.in_(
+                    session.query(Product.product_id).filter(Product.url == url)
+                ),
+            )
+            .delete(synchronize_session=False)
+        )
+        session.commit()
+        return deleted > 0
+
+
+def get_subscriptions(product_id: int) -> list[Channel_Subscription]:
+    with Session() as session:
+        return (
+            session.query(Channel_Subscription)
+            .filter(Channel_Subscription.product_id == product_id)
+            .all()
+        )
+
+
+def delete_subscriptions(session: OrmSession, product_id: int) -> None:
+    session.query(Channel_Subscription).filter(
+        Channel_Subscription.product_id == product_id
+    ).delete()
@@ -0,0 +1,114 @@
+import logging
+from collections import OrderedDict
+
+from config import WATCHLIST_CACHE_SIZE
+from db.connect import Session, run_db
+from db.models import Product, User_Stock
+
+logger = logging.getLogger(__name__)
+
+NOTIFIED_FIELDS = (
+    "notified_status",
+    "notified_price",
+    "notified_amount",
+    "notified_currency",
+)
+
+
+def _load_watchlist(user_id: str) -> list[User_Stock]:
+    with Session() as session:
+        return session.query(User_Stock).filter(User_Stock.user_id == user_id).all()
+
+
+class WatchlistCache:
+    """
+    Least recently used cache of whole watchlists, keyed by user, for up to
+    max_size users. Adds, removes and check results are written through to
+    the cached watches, so entries never go stale and don't expire
+    """
+
+    def __init__(self, max_size: int = WATCHLIST_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # each user's watches by product_id
+        self._watchlists: OrderedDict[str, dict[int, User_Stock]] = OrderedDict()
+        # the cached users watching each product, for writing check results through
+        self._watchers: dict[int, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._watchlists)
+
+    async def get(self, user_id: int | str) -> dict[int, User_Stock]:
+        """
+        The user's watches by product_id, loading the whole watchlist on a miss
+        """
+        key = str(user_id)
+        watchlist = self._watchlists.get(key)
+        if watchlist is not None:
+            self.hits += 1
+            self._watchlists.move_to_end(key)
+            return watchlist
+        self.misses += 1
+        stocks = await run_db(_load_watchlist, key)
+        watchlist = {stock.product_id: stock for stock in stocks}
+        self._store(key, watchlist)
+        return watchlist
+
+    def _store(self, key: str, watchlist: dict[int, User_Stock]) -> None:
+        self._forget(key)
+        self._watchlists[key] = watchlist
+        for product_id in watchlist:
+            self._watchers.setdefault(product_id, set()).add(key)
+        while len(self._watchlists) > self.max_size:
+            self._forget(next(iter(self._watchlists)))
+
+    def _forget(self, key: str) -> None:
+        for product_id in self._watchlists.pop(key, {}):
+            self._unwatch(key, product_id)
+
+    def _unwatch(self, key: str, product_id: int) -> None:
+        watchers = self._watchers.get(product_id)
+        if watchers is not None:
+            watchers.discard(key)
+            if not watchers:
+                del self._watchers[product_id]
+
+    def add(self, stock: User_Stock) -> None:
+        """
+        Adds a new watch to its user's cached watchlist, if there is one
+        """
+        key = str(stock.user_id)
+        watchlist = self._watchlists.get(key)
+        if watchlist is not None:
+            watchlist[stock.product_id] = stock
+            self._watchers.setdefault(stock.product_id, set()).add(key)
+
+    def remove(self, user_id: int | str, product_id: int) -> None:
+        key = str(user_id)
+        watchlist = self._watchlists.get(key)
+        if watchlist is not None and watchlist.pop(product_id, None) is not None:
+            self._unwatch(key, product_id)
+
+    def update_product(self, product: Product) -> None:
+        """
+        Copies a freshly checked product into every cached watch of it
+        """
+        for key in self._watchers.get(product.product_id, ()):
+            cached = self._watchlists[key][product.product_id].product
+            if cached is not product:
+                for column in Product.__table__.columns.keys():
+                    setattr(cached, column, getattr(product, column))
+
+    def update_notified(self, stock: User_Stock) -> None:
+        """
+        Copies the state the watch's user was just notified of into the cached
+        watch
+        """
+        cached = self._watchlists.get(str(stock.user_id), {}).get(stock.product_id)
+        if cached is not None and cached is not stock:
+            for field in NOTIFIED_FIELDS:
+                setattr(cached, field, getattr(stock, field))
+
+
+watchlist_cache = WatchlistCache()
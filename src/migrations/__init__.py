@@ -0,0 +1,3 @@
+from migrations import runner, versions
+
+__all__ = ("runner", "versions")
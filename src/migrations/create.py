@@ -1,37 +1,11 @@
-import sqlite3
+import sys
 from pathlib import Path
 
-script_dir = Path(__file__).parent.parent
-database_file = script_dir / "db/main.db"
+# run as a script, so make src importable
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-conn = sqlite3.connect(database_file)
+from db.connect import engine  # noqa: E402
+from migrations.runner import migrate  # noqa: E402
 
-cursor = conn.cursor()
-
-sql_tables = {
-    "USER": """CREATE TABLE User(
-        user_id CHAR(20) NOT NULL,
-        username CHAR(50) NOT NULL,
-        join_date TIMESTAMP NOT NULL
-    )""",
-    "USER_STOCK": """CREATE TABLE USER_STOCK(
-        user_id CHAR(20) NOT NULL,
-        stock_url VARCHAR(255) NOT NULL,
-        stock_name VARCHAR(50) NOT NULL,
-        stock_status INTEGER NOT NULL, /*Stock_Status enum, 0 oos, 1 in stock*/
-        date_added TIMESTAMP NOT NULL,
-        last_checked TIMESTAMP NOT NULL,
-        check_interval INTEGER NOT NULL, /*Seconds*/
-        price VARCHAR(50) NOT NULL
-    )""",
-}
-
-for key in sql_tables:
-    _ = cursor.execute(sql_tables[key])
-    print(f"Created table {key}")
-
-conn.commit()
-print("Changes committed")
-
-conn.close()
-print("Connection to db closed")
+version = migrate(engine)
+print(f"Database at {engine.url.database} is at version {version}")
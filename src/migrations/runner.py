@@ -0,0 +1,53 @@
+import logging
+import sqlite3
+
+from sqlalchemy import Engine
+
+from migrations.versions import MIGRATIONS, Migration
+
+logger = logging.getLogger(__name__)
+
+
+def current_version(connection: sqlite3.Connection) -> int:
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply(connection: sqlite3.Connection, migration: Migration) -> None:
+    """
+    Runs a migration and bumps user_version in the same transaction, so a
+    failure leaves the database at the previous version
+    """
+    script = ";\n".join(
+        (
+            "BEGIN",
+            *migration.statements,
+            f"PRAGMA user_version = {migration.version}",
+            "COMMIT",
+        )
+    )
+    try:
+        connection.executescript(script)
+    except sqlite3.Error as e:
+        connection.rollback()
+        logger.error(f"Migration {migration.version} failed, rolled back: {e}")
+        raise RuntimeError(f"Migration {migration.version} failed") from e
+
+
+def migrate(engine: Engine) -> int:
+    """
+    Applies every migration newer than the database's user_version, returning
+    the version the database ends up at
+    """
+    raw = engine.raw_connection()
+    try:
+        connection = raw.driver_connection
+        version = current_version(connection)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            _apply(connection, migration)
+            version = migration.version
+            logger.info(f"Applied migration {version}: {migration.description}")
+        return version
+    finally:
+        raw.close()
@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+def _rebuild(table: str, create: str, columns: str) -> tuple[str, ...]:
+    """
+    SQLite can't add a primary key to an existing table, so the table is copied
+    into a new one with the right shape, dropping any duplicate rows
+    """
+    return (
+        create.format(table=f"{table}_new"),
+        f"INSERT OR IGNORE INTO {table}_new ({columns}) SELECT {columns} FROM {table}",
+        f"DROP TABLE {table}",
+        f"ALTER TABLE {table}_new RENAME TO {table}",
+    )
+
+
+CREATE_USER = """CREATE TABLE IF NOT EXISTS {table}(
+    user_id INTEGER NOT NULL PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    join_date TIMESTAMP
+)"""
+
+CREATE_USER_STOCK = """CREATE TABLE IF NOT EXISTS {table}(
+    user_id VARCHAR(20) NOT NULL,
+    stock_url VARCHAR(255) NOT NULL,
+    stock_name VARCHAR(50) NOT NULL,
+    stock_status INTEGER NOT NULL, /*Stock_Status enum, 0 oos, 1 in stock*/
+    date_added TIMESTAMP NOT NULL,
+    last_checked TIMESTAMP NOT NULL,
+    check_interval INTEGER NOT NULL DEFAULT 300, /*Seconds*/
+    price VARCHAR(50) NOT NULL,
+    PRIMARY KEY (user_id, stock_url)
+)"""
+
+CREATE_DOMAIN_STRATEGY = """CREATE TABLE IF NOT EXISTS {table}(
+    domain VARCHAR(255) NOT NULL PRIMARY KEY,
+    strategy VARCHAR(50) NOT NULL, /*Price extraction strategy that last worked*/
+    selector VARCHAR(255),
+    updated TIMESTAMP NOT NULL
+)"""
+
+CREATE_PRODUCT = """CREATE TABLE IF NOT EXISTS {table}(
+    product_id INTEGER NOT NULL PRIMARY KEY,
+    url VARCHAR(255) NOT NULL UNIQUE,
+    name VARCHAR(50) NOT NULL,
+    stock_status INTEGER NOT NULL, /*Stock_Status enum, 0 oos, 1 in stock*/
+    price VARCHAR(50) NOT NULL,
+    last_checked TIMESTAMP NOT NULL,
+    fetch_tier VARCHAR(10), /*Fetch_Tier that last served the page*/
+    fetch_time FLOAT /*Seconds*/
+)"""
+
+CREATE_WATCH = """CREATE TABLE IF NOT EXISTS {table}(
+    user_id VARCHAR(20) NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES PRODUCT (product_id),
+    date_added TIMESTAMP NOT NULL,
+    check_interval INTEGER NOT NULL DEFAULT 300, /*Seconds*/
+    notified_status INTEGER, /*Last stock status the user was told about*/
+    notified_price VARCHAR(50),
+    name VARCHAR(50), /*The user's own name, when it differs from PRODUCT.name*/
+    PRIMARY KEY (user_id, product_id)
+)"""
+
+USER_COLUMNS = "user_id, username, join_date"
+USER_STOCK_COLUMNS = (
+    "user_id, stock_url, stock_name, stock_status, date_added, last_checked, "
+    "check_interval, price"
+)
+
+# Applied in order to bring a database forward from its PRAGMA user_version.
+# Released migrations must never be edited, add a new one instead
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        1,
+        "Create tables",
+        (
+            CREATE_USER.format(table="USER"),
+            CREATE_USER_STOCK.format(table="USER_STOCK"),
+            CREATE_DOMAIN_STRATEGY.format(table="DOMAIN_STRATEGY"),
+        ),
+    ),
+    Migration(
+        2,
+        "Add primary keys to tables made by the old create script",
+        (
+            *_rebuild("USER", CREATE_USER, USER_COLUMNS),
+            *_rebuild("USER_STOCK", CREATE_USER_STOCK, USER_STOCK_COLUMNS),
+        ),
+    ),
+    Migration(
+        3,
+        "Index watched stocks by url and next due time",
+        (
+            # user_id lookups are served by the (user_id, stock_url) primary key
+            "CREATE INDEX IF NOT EXISTS ix_user_stock_stock_url ON USER_STOCK (stock_url)",
+            "CREATE INDEX IF NOT EXISTS ix_user_stock_next_due ON USER_STOCK "
+            "(datetime(last_checked, '+' || check_interval || ' seconds'))",
+        ),
+    ),
+    Migration(
+        4,
+        "Split product state out of USER_STOCK into PRODUCT",
+        (
+            CREATE_PRODUCT.format(table="PRODUCT"),
+            # bare columns alongside MAX() come from the most recently checked
+            # row, so each product starts with the freshest state any user had
+            "INSERT INTO PRODUCT (url, name, stock_status, price, last_checked) "
+            "SELECT stock_url, stock_name, stock_status, price, MAX(last_checked) "
+            "FROM USER_STOCK GROUP BY stock_url",
+            CREATE_WATCH.format(table="USER_STOCK_new"),
+            # every watcher keeps the name they gave, where it isn't the one
+            # the product was given
+            "INSERT INTO USER_STOCK_new (user_id, product_id, date_added, "
+            "check_interval, notified_status, notified_price, name) "
+            "SELECT s.user_id, p.product_id, s.date_added, s.check_interval, "
+            "s.stock_status, s.price, NULLIF(s.stock_name, p.name) FROM USER_STOCK s "
+            "JOIN PRODUCT p ON p.url = s.stock_url",
+            "DROP TABLE USER_STOCK",
+            "ALTER TABLE USER_STOCK_new RENAME TO USER_STOCK",
+            "CREATE INDEX IF NOT EXISTS ix_user_stock_product_id ON USER_STOCK (product_id)",
+            # next due is last_checked + check_interval, which now spans both
+            # tables, so the closest index is on when each product was checked
+            "CREATE INDEX IF NOT EXISTS ix_product_last_checked ON PRODUCT (last_checked)",
+        ),
+    ),
+    Migration(
+        5,
+        "Add PRICE_HISTORY",
+        (
+            """CREATE TABLE IF NOT EXISTS PRICE_HISTORY(
+                history_id INTEGER NOT NULL PRIMARY KEY,
+                product_id INTEGER NOT NULL REFERENCES PRODUCT (product_id),
+                recorded TIMESTAMP NOT NULL,
+                amount INTEGER, /*Minor units, e.g. cents*/
+                low_amount INTEGER, /*Lowest amount merged into this row*/
+                high_amount INTEGER,
+                currency VARCHAR(3), /*ISO 4217 code*/
+                stock_status INTEGER NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_price_history_product_recorded "
+            "ON PRICE_HISTORY (product_id, recorded)",
+        ),
+    ),
+    Migration(
+        6,
+        "Store prices as minor units and add PRICE_ALERT",
+        (
+            # filled in by each product's next check
+            "ALTER TABLE PRODUCT ADD COLUMN price_amount INTEGER",
+            "ALTER TABLE PRODUCT ADD COLUMN price_currency VARCHAR(3)",
+            "ALTER TABLE USER_STOCK ADD COLUMN notified_amount INTEGER",
+            "ALTER TABLE USER_STOCK ADD COLUMN notified_currency VARCHAR(3)",
+            """CREATE TABLE IF NOT EXISTS PRICE_ALERT(
+                alert_id INTEGER NOT NULL PRIMARY KEY,
+                user_id VARCHAR(20) NOT NULL,
+                product_id INTEGER NOT NULL REFERENCES PRODUCT (product_id),
+                target_amount INTEGER, /*Minor units*/
+                drop_percent INTEGER,
+                baseline_amount INTEGER, /*Price the drop is measured from*/
+                currency VARCHAR(3),
+                created TIMESTAMP NOT NULL,
+                triggered TIMESTAMP
+            )""",
+            # only alerts still waiting to trigger are ever looked up
+            "CREATE INDEX IF NOT EXISTS ix_price_alert_pending "
+            "ON PRICE_ALERT (product_id) WHERE triggered IS NULL",
+        ),
+    ),
+    Migration(
+        7,
+        "Add CHANNEL_SUBSCRIPTION",
+        (
+            """CREATE TABLE IF NOT EXISTS CHANNEL_SUBSCRIPTION(
+                channel_id VARCHAR(20) NOT NULL,
+                product_id INTEGER NOT NULL REFERENCES PRODUCT (product_id),
+                guild_id VARCHAR(20) NOT NULL,
+                role_id VARCHAR(20), /*Mentioned in each announcement*/
+                created TIMESTAMP NOT NULL,
+                PRIMARY KEY (channel_id, product_id)
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_channel_subscription_product_id "
+            "ON CHANNEL_SUBSCRIPTION (product_id)",
+        ),
+    ),
+)
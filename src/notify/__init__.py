@@ -0,0 +1,3 @@
+from notify import digest, outbox, users
+
+__all__ = ("digest", "outbox", "users")
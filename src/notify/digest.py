@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import discord
+
+from config import DIGEST_WINDOW
+from notify.outbox import Outbox, outbox
+from notify.users import LazyUser
+
+logger = logging.getLogger(__name__)
+
+# Discord's limits on a single message
+MAX_EMBEDS = 10
+MAX_FIELDS = 25
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+# shared by every embed in the message
+MAX_EMBED_CHARS = 6000
+
+DIGEST_TITLE = "Watchlist updates"
+
+
+@dataclass
+class Notification:
+    """
+    Everything a single check found worth telling the user about one product
+    """
+
+    name: str
+    url: str
+    status: str | None = None  # new stock status, when it changed
+    old_price: str | None = None  # set along with new_price when it changed
+    new_price: str | None = None
+    urgent: bool = False  # sent straight away rather than digested
+
+    def text(self) -> str:
+        lines = []
+        if self.status is not None:
+            lines.append(f"{self.name} is now **{self.status}**!")
+        if self.new_price is not None:
+            lines.append(
+                f"[{self.name}](<{self.url}>) price change: {self.old_price} -> {self.new_price}"
+            )
+        return "\n".join(lines)
+
+    def field(self) -> tuple[str, str]:
+        lines = []
+        if self.status is not None:
+            lines.append(f"Now **{self.status}**")
+        if self.new_price is not None:
+            lines.append(f"Price **{self.old_price}** -> **{self.new_price}**")
+        lines.append(f"[View product](<{self.url}>)")
+        return self.name[:MAX_FIELD_NAME], "\n".join(lines)[:MAX_FIELD_VALUE]
+
+
+def build_digest(notifications: list[Notification]) -> list[list[discord.Embed]]:
+    """
+    Packs one field per notification into as few messages as Discord's embed
+    limits allow, returning the embeds for each message
+    """
+    messages: list[list[discord.Embed]] = []
+    embeds: list[discord.Embed] = []
+    size = 0
+    for notification in notifications:
+        name, value = notification.field()
+        field_size = len(name) + len(value)
+        if embeds and size + field_size > MAX_EMBED_CHARS:
+            messages.append(embeds)
+            embeds, size = [], 0
+        if not embeds or len(embeds[-1].fields) >= MAX_FIELDS:
+            if len(embeds) >= MAX_EMBEDS:
+                messages.append(embeds)
+                embeds, size = [], 0
+            title = DIGEST_TITLE if not messages and not embeds else None
+            embeds.append(discord.Embed(title=title))
+            size += len(title or "")
+        embeds[-1].add_field(name=name, value=value, inline=False)
+        size += field_size
+    if embeds:
+        messages.append(embeds)
+    return messages
+
+
+class DigestQueue:
+    """
+    Holds each user's notifications for window seconds after the first one
+    arrives, then sends them all as a single digest. Urgent notifications,
+    such as something coming back in stock, skip the wait. Messages are handed
+    to the outbox rather than sent directly
+    """
+
+    def __init__(self, window: float = DIGEST_WINDOW, outbox: Outbox = outbox):
+        self.window = window
+        self.outbox = outbox
+        self._pending: dict[int, list[Notification]] = {}
+        self._recipients: dict[int, LazyUser | discord.abc.User] = {}
+        self._timers: dict[int, asyncio.Task[None]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    async def notify(
+        self, user: LazyUser | discord.abc.User, notification: Notification
+    ) -> None:
+        if notification.urgent:
+            self.outbox.enqueue(user, notification.text())
+            return
+        self._pending.setdefault(user.id, []).append(notification)
+        self._recipients[user.id] = user
+        if user.id not in self._timers:
+            self._timers[user.id] = asyncio.create_task(self._flush_later(user.id))
+
+    async def _flush_later(self, user_id: int) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(user_id, None)
+        await self.flush(user_id)
+
+    async def flush(self, user_id: int) -> None:
+        notifications = self._pending.pop(user_id, [])
+        user = self._recipients.pop(user_id, None)
+        if not notifications or user is None:
+            return
+        for embeds in build_digest(notifications):
+            self.outbox.enqueue(user, embeds=embeds)
+
+    async def close(self) -> None:
+        """
+        Queues everything still waiting, without waiting out the window
+        """
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for user_id in list(self._pending):
+            await self.flush(user_id)
+
+
+digest_queue = DigestQueue()
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import discord
+
+from config import OUTBOX_MAX_RETRIES, OUTBOX_RETRY_DELAY
+from notify.users import LazyUser, UnknownUserError
+
+logger = logging.getLogger(__name__)
+
+# Discord allows 5 messages per 5 seconds in each channel. Each route is one
+# channel, either a user's DM channel or a subscribed guild channel
+ROUTE_CAPACITY = 5
+ROUTE_PER = 5.0  # seconds
+DEAD_LETTER_SIZE = 1000
+DRAIN_TIMEOUT = 10.0  # seconds
+
+
+@dataclass
+class OutboundMessage:
+    user: LazyUser | discord.abc.Messageable
+    content: str | None = None
+    embeds: list[discord.Embed] | None = None
+    attempts: int = 0
+
+    @property
+    def route(self) -> int:
+        return self.user.id
+
+
+class RouteBucket:
+    """
+    Token bucket for one route, refilling capacity tokens every per seconds
+    """
+
+    def __init__(self, capacity: int = ROUTE_CAPACITY, per: float = ROUTE_PER):
+        self.capacity = capacity
+        self.per = per
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.capacity / self.per,
+        )
+        self._updated = now
+
+    def delay(self) -> float:
+        """
+        Seconds until a message can go out on this route
+        """
+        self._refill(time.monotonic())
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) * self.per / self.capacity
+
+    def take(self) -> None:
+        self._refill(time.monotonic())
+        self._tokens -= 1
+
+
+class Outbox:
+    """
+    Queue of messages waiting to be sent, so checks never wait on Discord.
+    Messages are handed out to one sender task per route, so a route that
+    Discord rate limits, and discord.py sleeps on inside send, doesn't hold up
+    any other. Each route is held to its rate limit, failed sends are retried
+    with exponential backoff, and messages that can never be delivered are
+    dead-lettered along with anything else queued for that user
+    """
+
+    def __init__(
+        self,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+        retry_delay: float = OUTBOX_RETRY_DELAY,
+    ):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.dead_letters: deque[tuple[OutboundMessage, str]] = deque(
+            maxlen=DEAD_LETTER_SIZE
+        )
+        self._queue: asyncio.Queue[OutboundMessage] = asyncio.Queue()
+        self._buckets: dict[int, RouteBucket] = {}
+        self._undeliverable: set[int] = set()
+        # messages waiting out a rate limit or retry delay
+        self._waiting = 0
+        # messages handed out to each route, the first one is being sent
+        self._routes: dict[int, deque[OutboundMessage]] = {}
+        self._senders: dict[int, asyncio.Task[None]] = {}
+        # set whenever a message is sent or comes back from waiting
+        self._progress = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return self.depth
+
+    @property
+    def depth(self) -> int:
+        """
+        Messages not yet sent, including those waiting to be retried
+        """
+        routed = sum(len(messages) for messages in self._routes.values())
+        return self._queue.qsize() + self._waiting + routed
+
+    def enqueue(
+        self,
+        user: LazyUser | discord.abc.Messageable,
+        content: str | None = None,
+        embeds: list[discord.Embed] | None = None,
+    ) -> None:
+        message = OutboundMessage(user, content, embeds)
+        if message.route in self._undeliverable:
+            self._dead_letter(message, "user is undeliverable")
+            return
+        self._queue.put_nowait(message)
+
+    def _dead_letter(self, message: OutboundMessage, reason: str) -> None:
+        logger.error(f"Dropping message to {message.route}: {reason}")
+        self.dead_letters.append((message, reason))
+
+    def _later(self, message: OutboundMessage, delay: float) -> None:
+        self._waiting += 1
+
+        def requeue():
+            self._waiting -= 1
+            self._queue.put_nowait(message)
+            self._progress.set()
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    def _retry(self, message: OutboundMessage, reason: str) -> None:
+        message.attempts += 1
+        if message.attempts > self.max_retries:
+            self._dead_letter(
+                message, f"gave up after {self.max_retries} retries, {reason}"
+            )
+            return
+        delay = self.retry_delay * 2 ** (message.attempts - 1)
+        logger.info(f"Retrying message to {message.route} in {delay}s: {reason}")
+        self._later(message, delay)
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        if message.route in self._undeliverable:
+            self._dead_letter(message, "user is undeliverable")
+            return
+        bucket = self._buckets.setdefault(message.route, RouteBucket())
+        delay = bucket.delay()
+        if delay > 0:
+            self._later(message, delay)
+            return
+        bucket.take()
+        try:
+            if message.embeds:
+                await message.user.send(message.content, embeds=message.embeds)
+            else:
+                await message.user.send(message.content)
+        except (discord.Forbidden, discord.NotFound, UnknownUserError) as e:
+            # DMs closed or the user is gone, nothing queued for them will land
+            self._undeliverable.add(message.route)
+            self._dead_letter(message, str(e))
+        except discord.RateLimited as e:
+            self._later(message, e.retry_after)
+        except (discord.HTTPException, OSError, TimeoutError) as e:
+            self._retry(message, str(e))
+
+    def _dispatch(self, message: OutboundMessage) -> None:
+        self._routes.setdefault(message.route, deque()).append(message)
+        self._start_sender(message.route)
+
+    def _start_sender(self, route: int) -> None:
+        if route not in self._senders:
+            self._senders[route] = asyncio.create_task(self._send_route(route))
+
+    async def _send_route(self, route: int) -> None:
+        messages = self._routes[route]
+        try:
+            while messages:
+                message = messages[0]
+                try:
+                    await self._deliver(message)
+                except Exception as e:
+                    self._dead_letter(message, f"unexpected error: {e}")
+                messages.popleft()
+                self._progress.set()
+        finally:
+            del self._senders[route]
+            if not messages:
+                del self._routes[route]
+
+    async def drain(self) -> None:
+        """
+        Sends until nothing is queued or waiting
+        """
+        for route in self._routes:
+            self._start_sender(route)
+        while self.depth:
+            while not self._queue.empty():
+                self._dispatch(self._queue.get_nowait())
+            self._progress.clear()
+            if self.depth:
+                await self._progress.wait()
+
+    async def _send_forever(self) -> None:
+        while True:
+            self._dispatch(await self._queue.get())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._send_forever())
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """
+        Stops the sender, then gives what is still queued up to timeout seconds
+        to go out
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except TimeoutError:
+            for sender in self._senders.values():
+                sender.cancel()
+            logger.error(f"Closed with {self.depth} messages still unsent")
+
+
+outbox = Outbox()
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownUserError(RuntimeError):
+    pass
+
+
+class UserCache:
+    """
+    Least recently used cache of resolved discord users, each kept for ttl
+    seconds. A user only goes to the REST api when they aren't in the client's
+    own cache either, and concurrent lookups of the same user share one request.
+    Sending through a cached user reuses its DM channel once it has been opened
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users: OrderedDict[int, tuple[float, discord.User]] = OrderedDict()
+        self._fetching: dict[int, asyncio.Future[discord.User | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user_id: int) -> discord.User | None:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        expires, user = entry
+        if expires <= time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return user
+
+    def put(self, user_id: int, user: discord.User) -> None:
+        self._users[user_id] = (time.monotonic() + self.ttl, user)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+
+    async def _fetch(self, bot: commands.Bot, user_id: int) -> discord.User | None:
+        user = bot.get_user(user_id)
+        if user is None:
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                logger.error(f"User {user_id} no longer exists")
+                return None
+        self.put(user_id, user)
+        return user
+
+    async def resolve(
+        self, bot: commands.Bot, user_id: int | str
+    ) -> discord.User | None:
+        user_id = int(user_id)
+        user = self.get(user_id)
+        if user is not None:
+            return user
+        fetching = self._fetching.get(user_id)
+        if fetching is None:
+            fetching = asyncio.ensure_future(self._fetch(bot, user_id))
+            self._fetching[user_id] = fetching
+            fetching.add_done_callback(lambda _: self._fetching.pop(user_id, None))
+        return await asyncio.shield(fetching)
+
+
+class LazyUser:
+    """
+    Stands in for a user until a message actually has to be sent to them, so
+    checks that find nothing new never look the user up
+    """
+
+    def __init__(self, bot: commands.Bot, user_id: int | str, cache: UserCache):
+        self.bot = bot
+        self.id = int(user_id)
+        self._cache = cache
+
+    async def send(self, *args, **kwargs) -> discord.Message:
+        user = await self._cache.resolve(self.bot, self.id)
+        if user is None:
+            raise UnknownUserError(f"Could not find user {self.id}")
+        return await user.send(*args, **kwargs)
+
+
+user_cache = UserCache()
@@ -0,0 +1,21 @@
+from scraper import (
+    browser,
+    http,
+    money,
+    parser,
+    phrases,
+    strategies,
+    tiers,
+    validators,
+)
+
+__all__ = (
+    "browser",
+    "http",
+    "money",
+    "parser",
+    "phrases",
+    "strategies",
+    "tiers",
+    "validators",
+)
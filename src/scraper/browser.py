@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlparse
+
+from playwright.async_api import (
+    Browser,
+    Page,
+    Playwright,
+    Route,
+    async_playwright,
+)
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from config import BROWSER_POOL_SIZE, RENDER_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/115.0.0.0 Safari/537.36"
+)
+
+# nothing we extract needs these, and they make up most of a page's requests
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.com",
+    "segment.io",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "bat.bing.com",
+    "analytics.tiktok.com",
+    "nr-data.net",
+)
+
+# resolves once the price has been rendered in any of the places we look for it
+PRODUCT_MARKERS_SCRIPT = """() => {
+    if (document.querySelector(
+        "meta[itemprop='price'][content], meta[property='product:price:amount'][content]"
+    )) return true;
+    for (const script of document.querySelectorAll("script[type='application/ld+json']")) {
+        if (script.textContent.includes('"price"')) return true;
+    }
+    for (const element of document.querySelectorAll("[itemprop='price'], [class*='price' i]")) {
+        if (/\\d/.test(element.textContent)) return true;
+    }
+    return false;
+}"""
+
+
+def should_block(resource_type: str, url: str) -> bool:
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(url).hostname or ""
+    return any(
+        host == tracker or host.endswith(f".{tracker}") for tracker in TRACKER_HOSTS
+    )
+
+
+async def _block_unneeded(route: Route) -> None:
+    request = route.request
+    if should_block(request.resource_type, request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def load_product_page(page: Page, url: str, timeout: float) -> str:
+    """
+    Navigates to the given url and returns its html as soon as product markers
+    are present, only waiting for the network to go idle if they never show up.
+    timeout is in milliseconds, and applies to each step
+    """
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+    except Exception as e:
+        logger.error(f"Error navigating to webpage {url}: {e}")
+        return await page.content()
+
+    try:
+        await page.wait_for_function(
+            PRODUCT_MARKERS_SCRIPT, polling=250, timeout=timeout
+        )
+    except PlaywrightTimeoutError:
+        logger.info(f"No product markers found on {url}, waiting for network idle")
+        try:
+            await page.wait_for_load_state("networkidle", timeout=timeout)
+        except PlaywrightTimeoutError:
+            logger.info(f"{url} never went idle, using what has loaded")
+    return await page.content()
+
+
+class BrowserPool:
+    """
+    Long lived headless Chromium shared between page fetches. Every page is
+    handed out in its own browser context, with at most max_pages open at once
+    """
+
+    def __init__(self, max_pages: int = 4):
+        self.max_pages = max_pages
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self) -> None:
+        """
+        Launches the browser if it isn't already running
+        """
+        async with self._lock:
+            if self.is_running:
+                return
+            # browser may have crashed, clean up before relaunching
+            await self._shutdown()
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            logger.info(f"Browser pool started with {self.max_pages} pages")
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._shutdown()
+            logger.info("Browser pool closed")
+
+    async def _shutdown(self) -> None:
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.error(f"Error closing browser: {e}")
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.error(f"Error stopping playwright: {e}")
+            self._playwright = None
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """
+        Yields a fresh page in an isolated browser context, waiting for a free
+        slot if the pool is full. The context is closed on exit
+        """
+        async with self._semaphore:
+            if not self.is_running:
+                await self.start()
+            if self._browser is None:
+                raise RuntimeError("Browser pool failed to start")
+            context = await self._browser.new_context(user_agent=USER_AGENT)
+            await context.route("**/*", _block_unneeded)
+            try:
+                yield await context.new_page()
+            finally:
+                await context.close()
+
+    async def render(self, url: str, timeout: float = RENDER_TIMEOUT) -> str:
+        """
+        Renders the given url in a pooled page and returns the resulting html
+        """
+        async with self.page() as page:
+            return await load_product_page(page, url, timeout)
+
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE)
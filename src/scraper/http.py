@@ -0,0 +1,104 @@
+import logging
+from dataclasses import dataclass
+
+import aiohttp
+
+from config import HTTP_POOL_SIZE, HTTP_TIMEOUT
+from scraper.browser import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+@dataclass
+class StaticPage:
+    """
+    Result of a plain request, html is empty when the server answered 304
+    """
+
+    status: int
+    html: str
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class HttpPool:
+    """
+    Shared aiohttp session for fetching pages without rendering them, keeping
+    connections to shops alive between checks
+    """
+
+    def __init__(self, max_connections: int = 20, timeout: float = 15):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.max_connections, ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=HEADERS,
+        )
+        logger.info(f"HTTP pool started with {self.max_connections} connections")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            logger.info("HTTP pool closed")
+
+    async def get(
+        self, url: str, etag: str | None = None, last_modified: str | None = None
+    ) -> StaticPage | None:
+        """
+        Fetches the given url, as a conditional request when validators from a
+        previous load are given. Returns None if it couldn't be loaded
+        """
+        if not self.is_running:
+            await self.start()
+        if self._session is None:
+            raise RuntimeError("HTTP pool failed to start")
+
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            async with self._session.get(url, headers=headers) as response:
+                page = StaticPage(
+                    status=response.status,
+                    html="",
+                    etag=response.headers.get("ETag", etag),
+                    last_modified=response.headers.get("Last-Modified", last_modified),
+                )
+                if page.not_modified:
+                    return page
+                if response.status != 200:
+                    logger.info(f"Static fetch of {url} returned {response.status}")
+                    return None
+                page.html = await response.text(errors="replace")
+                return page
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.info(f"Static fetch of {url} failed: {e}")
+            return None
+
+
+http_pool = HttpPool(HTTP_POOL_SIZE, HTTP_TIMEOUT)
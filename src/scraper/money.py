@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from price_parser.parser import Price
+
+SYMBOL_INFO = {
+    # Symbols and their positioning
+    "$": "prefix",
+    "£": "prefix",
+    "¥": "prefix",
+    "₹": "prefix",
+    "€": "suffix",
+    "kr": "suffix",
+    "zł": "suffix",
+    "₩": "prefix",
+    "₺": "prefix",
+    "₪": "prefix",
+    "Ft": "suffix",
+    "Kč": "suffix",
+    "₽": "suffix",
+}
+
+ISO_TO_SYMBOL = {
+    # ISO codes to symbols
+    "USD": "$",
+    "AUD": "$",
+    "CAD": "$",
+    "GBP": "£",
+    "JPY": "¥",
+    "INR": "₹",
+    "EUR": "€",
+    "SEK": "kr",
+    "NOK": "kr",
+    "DKK": "kr",
+    "PLN": "zł",
+    "CZK": "Kč",
+    "HUF": "Ft",
+    "RUB": "₽",
+}
+
+
+# "$" and "kr" are shared by several currencies, the most common one is assumed
+SYMBOL_TO_ISO = {
+    "$": "USD",
+    "£": "GBP",
+    "¥": "JPY",
+    "₹": "INR",
+    "€": "EUR",
+    "kr": "SEK",
+    "zł": "PLN",
+    "₩": "KRW",
+    "₺": "TRY",
+    "₪": "ILS",
+    "Ft": "HUF",
+    "Kč": "CZK",
+    "₽": "RUB",
+}
+
+# digits after the decimal point, for currencies that don't use two
+MINOR_UNIT_DIGITS = {
+    "JPY": 0,
+    "KRW": 0,
+    "HUF": 0,
+}
+
+
+def currency_code(currency: str | None) -> str | None:
+    """
+    Resolves a currency symbol or ISO code to its three letter ISO code
+    """
+    if not currency:
+        return None
+    currency = currency.strip()
+    if currency in SYMBOL_TO_ISO:
+        return SYMBOL_TO_ISO[currency]
+    if len(currency) == 3 and currency.isalpha():
+        return currency.upper()
+    return None
+
+
+@dataclass(frozen=True)
+class Money:
+    """
+    An amount in the currency's minor units, e.g. cents, so prices can be
+    stored and compared as integers
+    """
+
+    amount: int
+    currency: str | None
+
+    @property
+    def digits(self) -> int:
+        return MINOR_UNIT_DIGITS.get(self.currency or "", 2)
+
+    @classmethod
+    def from_decimal(cls, amount: Decimal, currency: str | None) -> "Money":
+        code = currency_code(currency)
+        digits = MINOR_UNIT_DIGITS.get(code or "", 2)
+        return cls(int(amount.scaleb(digits).to_integral_value()), code)
+
+    @classmethod
+    def parse(cls, text: str | None, currency: str | None = None) -> "Money | None":
+        """
+        Parses a price such as "$5.50" or "5,50 €", with currency used when the
+        text doesn't name one. None if there is no amount
+        """
+        if not text:
+            return None
+        price = Price.fromstring(text)
+        if price.amount is None:
+            return None
+        try:
+            return cls.from_decimal(price.amount, price.currency or currency)
+        except InvalidOperation:
+            return None
+
+    @classmethod
+    def parse_in(cls, text: str | None, currency: str) -> "Money | None":
+        """
+        Parses the amount in text as the given currency, whatever symbol the
+        text has, as symbols like "$" and "kr" are shared by several currencies
+        """
+        if not text:
+            return None
+        price = Price.fromstring(text)
+        if price.amount is None:
+            return None
+        try:
+            return cls.from_decimal(price.amount, currency)
+        except InvalidOperation:
+            return None
+
+    def format(self) -> str:
+        amount = f"{Decimal(self.amount).scaleb(-self.digits):.{self.digits}f}"
+        if self.currency is None:
+            return amount
+        symbol = ISO_TO_SYMBOL.get(self.currency, self.currency)
+        position = SYMBOL_INFO.get(symbol, "prefix")
+        return f"{symbol}{amount}" if position == "prefix" else f"{amount}{symbol}"
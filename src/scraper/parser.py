@@ -0,0 +1,36 @@
+import logging
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from config import HTML_PARSER
+
+logger = logging.getLogger(__name__)
+
+# lxml is C backed and several times faster than the pure python html.parser
+PARSER_BACKENDS = ("lxml", "html.parser")
+
+
+def resolve_backend(name: str) -> str:
+    """
+    Returns the given parser backend if BeautifulSoup can use it, otherwise
+    falls back to html.parser
+    """
+    if name not in PARSER_BACKENDS:
+        logger.warning(f"Unknown HTML parser {name}, using html.parser")
+        return "html.parser"
+    try:
+        BeautifulSoup("", name)
+    except FeatureNotFound:
+        logger.warning(f"HTML parser {name} isn't installed, using html.parser")
+        return "html.parser"
+    return name
+
+
+backend = resolve_backend(HTML_PARSER)
+
+
+def make_soup(html: str, parser: str | None = None) -> BeautifulSoup:
+    """
+    Parses the given html with the configured backend, or the given parser
+    """
+    return BeautifulSoup(html, parser or backend)
@@ -0,0 +1,110 @@
+import json
+import logging
+from pathlib import Path
+from urllib.parse import urlparse
+
+from config import STOCK_PHRASES_PATH
+
+logger = logging.getLogger(__name__)
+
+# phrases that mean a product is out of stock, by locale
+OUT_OF_STOCK_PHRASES = {
+    "en": ["sold out", "out of stock", "not available"],
+    "de": [
+        "ausverkauft",
+        "nicht verfügbar",
+        "nicht auf lager",
+        "nicht vorrätig",
+        "derzeit nicht lieferbar",
+    ],
+    "pl": ["brak w magazynie", "brak towaru", "niedostępny", "wyprzedany"],
+    "cs": ["vyprodáno", "není skladem", "nedostupné"],
+    "ja": ["在庫切れ", "品切れ", "売り切れ", "完売"],
+}
+
+
+class PhraseMatcher:
+    """
+    A compiled set of phrases, searched for in page text with the first phrase
+    found deciding the result. The text is lowercased once and each phrase is
+    looked for with python's substring search, which on full product pages is
+    faster than a single pass regex or Aho-Corasick automaton
+    """
+
+    def __init__(self, phrases: list[str]):
+        self.phrases = tuple(
+            sorted(
+                {p.lower().strip() for p in phrases if p.strip()},
+                key=lambda p: (len(p), p),
+            )
+        )
+
+    def search(self, text: str) -> str | None:
+        """
+        Returns the first phrase found in the given text, or None
+        """
+        if not self.phrases:
+            return None
+        text = text.lower()
+        for phrase in self.phrases:
+            if phrase in text:
+                return phrase
+        return None
+
+
+class PhraseBook:
+    """
+    Per locale phrase dictionaries, with optional per domain overrides choosing
+    which locales apply and adding extra phrases. Matchers are compiled once
+    per domain
+    """
+
+    def __init__(
+        self,
+        locales: dict[str, list[str]],
+        domains: dict[str, dict] | None = None,
+    ):
+        self.locales = locales
+        self.domains = domains or {}
+        self._matchers: dict[str, PhraseMatcher] = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PhraseBook":
+        """
+        Loads the default phrases, merged with the json file if it exists, of the form
+        {"locales": {"de": [...]}, "domains": {"shop.de": {"locales": ["de"], "phrases": [...]}}}
+        """
+        locales = {locale: list(p) for locale, p in OUT_OF_STOCK_PHRASES.items()}
+        domains = {}
+        if path.is_file():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                for locale, phrases in data.get("locales", {}).items():
+                    locales.setdefault(locale, []).extend(phrases)
+                domains = data.get("domains", {})
+                logger.info(f"Loaded stock phrases from {path}")
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Error loading stock phrases from {path}: {e}")
+        return cls(locales, domains)
+
+    def matcher_for(self, url: str) -> PhraseMatcher:
+        domain = urlparse(url).hostname or url
+        # a domain rule can be keyed by the domain or a parent of it
+        key = next(
+            (
+                rule
+                for rule in self.domains
+                if domain == rule or domain.endswith(f".{rule}")
+            ),
+            "",
+        )
+        if key not in self._matchers:
+            rule = self.domains.get(key, {})
+            locales = rule.get("locales") or list(self.locales)
+            phrases = [p for locale in locales for p in self.locales.get(locale, [])]
+            phrases += rule.get("phrases", [])
+            self._matchers[key] = PhraseMatcher(phrases)
+        return self._matchers[key]
+
+
+out_of_stock_phrases = PhraseBook.from_file(STOCK_PHRASES_PATH)
@@ -0,0 +1,94 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import urlparse
+
+from db.connect import Session
+from db.models import Domain_Strategy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LearnedStrategy:
+    strategy: str
+    selector: str | None = None
+
+
+class StrategyCache:
+    """
+    Remembers which extraction strategy, and selector, found the price for each
+    domain so it can be tried first next time. Kept in memory and persisted to
+    the DOMAIN_STRATEGY table so it survives restarts
+    """
+
+    def __init__(self):
+        self._strategies: dict[str, LearnedStrategy] = {}
+        self._dirty: set[str] = set()
+        # extraction runs in worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._strategies)
+
+    @staticmethod
+    def domain(url: str) -> str:
+        return urlparse(url).hostname or url
+
+    def get(self, domain: str) -> LearnedStrategy | None:
+        return self._strategies.get(domain)
+
+    def record(self, domain: str, strategy: str, selector: str | None = None) -> None:
+        learned = LearnedStrategy(strategy, selector)
+        with self._lock:
+            if self._strategies.get(domain) == learned:
+                return
+            self._strategies[domain] = learned
+            self._dirty.add(domain)
+        logger.info(f"Learned {strategy} ({selector}) for {domain}")
+
+    def load(self) -> None:
+        """
+        Loads every persisted strategy, replacing what is in memory
+        """
+        with Session() as session:
+            rows = session.query(Domain_Strategy).all()
+        with self._lock:
+            self._strategies = {
+                row.domain: LearnedStrategy(row.strategy, row.selector) for row in rows
+            }
+            self._dirty.clear()
+        logger.info(f"Loaded {len(rows)} learned extraction strategies")
+
+    def save(self) -> None:
+        """
+        Persists the strategies learned or changed since the last save
+        """
+        with self._lock:
+            dirty = {domain: self._strategies[domain] for domain in self._dirty}
+            self._dirty.clear()
+        if not dirty:
+            return
+
+        with Session() as session:
+            try:
+                for domain, learned in dirty.items():
+                    session.merge(
+                        Domain_Strategy(
+                            domain=domain,
+                            strategy=learned.strategy,
+                            selector=learned.selector,
+                            updated=datetime.now(),
+                        )
+                    )
+                session.commit()
+                logger.info(f"Saved {len(dirty)} learned extraction strategies")
+            except Exception as e:
+                logger.error(f"Error saving extraction strategies, rolling back: {e}")
+                session.rollback()
+                with self._lock:
+                    self._dirty.update(dirty)
+
+
+strategy_cache = StrategyCache()
@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime, timedelta
+from enum import Enum
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class Fetch_Tier(Enum):
+    """
+    HTTP    = plain request, no javascript
+    BROWSER = full render in the headless browser
+    """
+
+    HTTP = "http"
+    BROWSER = "browser"
+
+
+class DomainTiers:
+    """
+    Remembers per domain whether a plain request was enough to extract a product,
+    so later checks can go straight to the tier that works. Domains that needed
+    the browser are retried with a plain request once recheck_after has passed
+    """
+
+    def __init__(self, recheck_after: timedelta = timedelta(days=1)):
+        self.recheck_after = recheck_after
+        self._tiers: dict[str, tuple[Fetch_Tier, datetime]] = {}
+
+    @staticmethod
+    def domain(url: str) -> str:
+        return urlparse(url).hostname or url
+
+    def needs_browser(self, url: str, now: datetime | None = None) -> bool:
+        entry = self._tiers.get(self.domain(url))
+        if entry is None:
+            return False
+        tier, recorded = entry
+        if tier is Fetch_Tier.HTTP:
+            return False
+        return (now or datetime.now()) - recorded < self.recheck_after
+
+    def record(self, url: str, tier: Fetch_Tier) -> None:
+        domain = self.domain(url)
+        previous = self._tiers.get(domain)
+        if previous is None or previous[0] is not tier:
+            logger.info(f"Fetching {domain} with {tier.value} from now on")
+        self._tiers[domain] = (tier, datetime.now())
+
+
+fetch_tiers = DomainTiers()
@@ -0,0 +1,74 @@
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+# markup that changes between loads without the product changing
+IRRELEVANT_MARKUP = re.compile(
+    r"<script(?![^>]*application/ld\+json)[^>]*>.*?</script>"
+    r"|<style[^>]*>.*?</style>"
+    r"|<noscript[^>]*>.*?</noscript>"
+    r"|<!--.*?-->",
+    re.IGNORECASE | re.DOTALL,
+)
+WHITESPACE_BETWEEN_TAGS = re.compile(r">\s+<")
+WHITESPACE = re.compile(r"\s+")
+
+
+def content_hash(html: str) -> str:
+    """
+    Hashes the parts of the given html that product details are extracted from,
+    ignoring scripts, styles, comments and whitespace
+    """
+    relevant = IRRELEVANT_MARKUP.sub("", html)
+    relevant = WHITESPACE.sub(" ", WHITESPACE_BETWEEN_TAGS.sub("><", relevant))
+    return hashlib.blake2b(relevant.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class PageValidators:
+    """
+    What we know about the last load of a page, to tell whether it has changed
+    """
+
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+
+
+@dataclass
+class CachedPage(Generic[T]):
+    validators: PageValidators
+    value: T
+
+
+class PageCache(Generic[T]):
+    """
+    Least recently used cache of the last result extracted from each url, along
+    with the validators of the page it was extracted from
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._pages: OrderedDict[str, CachedPage[T]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, url: str) -> CachedPage[T] | None:
+        page = self._pages.get(url)
+        if page is not None:
+            self._pages.move_to_end(url)
+        return page
+
+    def put(self, url: str, validators: PageValidators, value: T) -> None:
+        self._pages[url] = CachedPage(validators, value)
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+
+    def discard(self, url: str) -> None:
+        self._pages.pop(url, None)
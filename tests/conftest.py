@@ -1,6 +1,7 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from db.connect import Session as ProdSession
 from db.models import Base
@@ -9,7 +10,12 @@ from db.models import Base
 # Create fixture for in-memory db
 @pytest.fixture(scope="function")
 def test_db():
-    engine = create_engine("sqlite:///:memory:")
+    # queries run on the db worker thread, so share one connection across threads
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
     Base.metadata.create_all(engine)
     TestingSessionLocal = sessionmaker(bind=engine)
     session = TestingSessionLocal()
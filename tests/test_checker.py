@@ -0,0 +1,273 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from checker.pipeline import CheckPipeline
+from checker.scheduler import WatchScheduler
+from checker.writer import CheckWriter
+from db.models import Product, User_Stock
+
+
+def make_stock(user_id: int, url: str, last_checked: datetime, interval: int = 300):
+    return User_Stock(
+        user_id=user_id,
+        stock_url=url,
+        last_checked=last_checked,
+        check_interval=interval,
+    )
+
+
+async def _track_concurrency(pipeline: CheckPipeline, urls: list[str]):
+    in_flight: dict[str, int] = {}
+    peak_hosts: dict[str, int] = {}
+    total = 0
+    peak_total = 0
+
+    async def check(url: str):
+        nonlocal total, peak_total
+        host = url.split("/")[2]
+        in_flight[host] = in_flight.get(host, 0) + 1
+        total += 1
+        peak_hosts[host] = max(peak_hosts.get(host, 0), in_flight[host])
+        peak_total = max(peak_total, total)
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        total -= 1
+
+    await asyncio.gather(*(pipeline.submit(url, check) for url in urls))
+    return peak_total, peak_hosts
+
+
+@pytest.mark.asyncio
+async def test_pipeline_global_limit():
+    pipeline = CheckPipeline(max_concurrency=3, max_per_host=10)
+    urls = [f"https://shop{i}.com/product" for i in range(10)]
+    peak_total, _ = await _track_concurrency(pipeline, urls)
+    assert peak_total == 3
+
+
+@pytest.mark.asyncio
+async def test_pipeline_per_host_limit():
+    pipeline = CheckPipeline(max_concurrency=10, max_per_host=2)
+    urls = [f"https://shop.com/product/{i}" for i in range(6)]
+    urls += [f"https://other.com/product/{i}" for i in range(6)]
+    peak_total, peak_hosts = await _track_concurrency(pipeline, urls)
+    assert peak_hosts == {"shop.com": 2, "other.com": 2}
+    assert peak_total == 4
+
+
+@pytest.mark.asyncio
+async def test_pipeline_failed_check_does_not_stop_others():
+    pipeline = CheckPipeline()
+    checked = []
+
+    async def check(url: str):
+        if url.endswith("bad"):
+            raise ValueError("Failed to load")
+        checked.append(url)
+
+    await asyncio.gather(
+        *(
+            pipeline.submit(url, check)
+            for url in ("https://shop.com/bad", "https://shop.com/good")
+        )
+    )
+    assert checked == ["https://shop.com/good"]
+
+
+def test_scheduler_orders_by_due_time():
+    now = datetime(2025, 2, 4, 12, 0, 0)
+    scheduler = WatchScheduler()
+    late = make_stock(1, "https://late.com", now, interval=600)
+    early = make_stock(2, "https://early.com", now, interval=60)
+    scheduler.schedule(late)
+    scheduler.schedule(early)
+
+    assert scheduler.next_due() == now + timedelta(seconds=60)
+    assert scheduler.pop_due(now) == []
+    assert scheduler.pop_due(now + timedelta(seconds=60)) == [early]
+    assert scheduler.next_due() == now + timedelta(seconds=600)
+
+
+def test_scheduler_unschedule():
+    now = datetime(2025, 2, 4, 12, 0, 0)
+    scheduler = WatchScheduler()
+    stock = make_stock(1, "https://testing.com", now)
+    scheduler.schedule(stock)
+    scheduler.unschedule(1, "https://testing.com")
+
+    assert len(scheduler) == 0
+    assert scheduler.next_due() is None
+    assert scheduler.pop_due(now + timedelta(days=1)) == []
+
+
+def test_scheduler_reschedule_skips_removed():
+    now = datetime(2025, 2, 4, 12, 0, 0)
+    scheduler = WatchScheduler()
+    kept = make_stock(1, "https://kept.com", now - timedelta(hours=1))
+    removed = make_stock(2, "https://removed.com", now - timedelta(hours=1))
+    scheduler.schedule(kept)
+    scheduler.schedule(removed)
+
+    due = scheduler.pop_due(now)
+    assert len(due) == 2
+    # removed while its check was running
+    scheduler.unschedule(2, "https://removed.com")
+    for stock in due:
+        scheduler.reschedule(stock, now)
+
+    assert len(scheduler) == 1
+    assert scheduler.pop_due(now + timedelta(seconds=300)) == [kept]
+
+
+def test_scheduler_schedule_replaces_existing():
+    now = datetime(2025, 2, 4, 12, 0, 0)
+    scheduler = WatchScheduler()
+    stock = make_stock(1, "https://testing.com", now)
+    scheduler.schedule(stock)
+    scheduler.schedule(stock, now + timedelta(hours=1))
+
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == now + timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_wakes_on_new_stock():
+    scheduler = WatchScheduler()
+    waiter = asyncio.create_task(scheduler.wait_until_due())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    # already due, so the sleeping checker wakes straight away
+    scheduler.schedule(make_stock(1, "https://testing.com", datetime(2025, 2, 4)))
+    await asyncio.wait_for(waiter, 1)
+
+
+def _watched_row(user_id: int, product: Product) -> User_Stock:
+    return User_Stock(
+        user_id=user_id,
+        product=product,
+        date_added=datetime(2025, 2, 4),
+        check_interval=300,
+        notified_status=1,
+        notified_price="$5.50",
+    )
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_once_per_product(test_db):
+    product = Product(
+        url="https://testing.com",
+        name="Test Product",
+        stock_status=1,
+        price="$5.50",
+        last_checked=datetime(2025, 2, 4),
+    )
+    watches = [_watched_row(1, product), _watched_row(2, product)]
+    test_db.add_all(watches)
+    test_db.commit()
+    writer = CheckWriter(max_pending=10)
+    checked = datetime(2025, 2, 4, 12, 0, 0)
+
+    product.price = "$4.00"
+    await writer.record_product(product)
+    product.price = "$3.00"
+    product.stock_status = 0
+    product.last_checked = checked
+    for watch in watches:
+        await writer.record_product(watch.product)
+    watches[0].notified_price = "$3.00"
+    await writer.record_notified(watches[0])
+    assert len(writer) == 2
+
+    assert await writer.flush() == 2
+    assert len(writer) == 0
+    test_db.expire_all()
+    stored = test_db.query(Product).one()
+    assert stored.price == "$3.00"
+    assert stored.stock_status == 0
+    assert stored.last_checked == checked
+    notified = {row.user_id: row.notified_price for row in test_db.query(User_Stock)}
+    assert notified == {"1": "$3.00", "2": "$5.50"}
+
+
+@pytest.mark.asyncio
+async def test_writer_skips_deleted_rows(test_db):
+    writer = CheckWriter()
+    gone = Product(product_id=99, url="https://removed.com", name="Gone")
+    await writer.record_product(gone)
+
+    assert await writer.flush() == 1
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_when_full(mocker):
+    write_mock = mocker.patch("checker.writer._write_rows")
+    writer = CheckWriter(max_pending=2)
+
+    await writer.record_product(Product(product_id=1, url="https://one.com"))
+    write_mock.assert_not_called()
+    await writer.record_product(Product(product_id=2, url="https://two.com"))
+
+    write_mock.assert_called_once()
+    assert len(write_mock.call_args.args[0]) == 2
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_writer_keeps_results_when_write_fails(mocker):
+    mocker.patch("checker.writer._write_rows", side_effect=RuntimeError("locked"))
+    writer = CheckWriter()
+    await writer.record_product(Product(product_id=1, url="https://testing.com"))
+
+    assert await writer.flush() == 0
+    assert len(writer) == 1
+
+
+@pytest.mark.asyncio
+async def test_writer_hands_written_products_to_hook(mocker):
+    mocker.patch("checker.writer._write_rows")
+    writer = CheckWriter()
+    writer.on_flush = mocker.AsyncMock()
+    await writer.record_product(Product(product_id=1, url="https://one.com"))
+    await writer.record_product(Product(product_id=2, url="https://two.com"))
+    await writer.record_notified(
+        User_Stock(user_id=1, stock_url="https://one.com", notified_price="$1")
+    )
+
+    assert await writer.flush() == 3
+    writer.on_flush.assert_awaited_once_with([1, 2])
+    # nothing written, nothing handed on
+    assert await writer.flush() == 0
+    writer.on_flush.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_writer_hook_failure_keeps_results_written(mocker):
+    write_mock = mocker.patch("checker.writer._write_rows")
+    writer = CheckWriter()
+    writer.on_flush = mocker.AsyncMock(side_effect=RuntimeError("locked"))
+    await writer.record_product(Product(product_id=1, url="https://one.com"))
+
+    assert await writer.flush() == 1
+    assert len(writer) == 0
+    write_mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_writer_discard_and_close(mocker):
+    write_mock = mocker.patch("checker.writer._write_rows")
+    writer = CheckWriter(flush_interval=3600)
+    writer.start()
+    for user_id, url in ((1, "https://kept.com"), (2, "https://removed.com")):
+        await writer.record_notified(
+            User_Stock(user_id=user_id, stock_url=url, notified_price="$1")
+        )
+    writer.discard(2, "https://removed.com")
+
+    # closing writes what is still buffered, well before the interval
+    await writer.close()
+
+    notified = write_mock.call_args.args[1]
+    assert [row["user_id"] for row in notified] == [1]
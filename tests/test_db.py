@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock
 
 import discord
@@ -6,8 +6,26 @@ import pytest
 from sqlalchemy import exc
 
 from db.connect import Session
-from db.models import User, User_Stock
+from db.alerts import add_alert, trigger_alerts
+from db.history import (
+    append_history,
+    compact_history,
+    history_row,
+    last_change,
+    summarise_history,
+)
+from db.models import (
+    Channel_Subscription,
+    Domain_Strategy,
+    Price_History,
+    Product,
+    User,
+    User_Stock,
+)
+from db.subscriptions import get_subscriptions, subscribe_channel, unsubscribe_channel
 from db.utils import add_user, get_user
+from db.watchlists import WatchlistCache
+from scraper.strategies import LearnedStrategy, StrategyCache
 
 
 @pytest.fixture
@@ -32,8 +50,9 @@ def sample_user_stock(mock_discord_user):
     )
 
 
-def test_add_user(test_db, mock_discord_user):
-    db_user = add_user(mock_discord_user)
+@pytest.mark.asyncio
+async def test_add_user(test_db, mock_discord_user):
+    db_user = await add_user(mock_discord_user)
     assert db_user.user_id == mock_discord_user.id
     assert db_user.username == mock_discord_user.name
 
@@ -43,13 +62,15 @@ def test_add_user(test_db, mock_discord_user):
     assert result.username == mock_discord_user.name
 
 
-def test_add_duplicate_user(test_db, mock_discord_user):
-    add_user(mock_discord_user)
+@pytest.mark.asyncio
+async def test_add_duplicate_user(test_db, mock_discord_user):
+    await add_user(mock_discord_user)
     with pytest.raises(Exception):
-        add_user(mock_discord_user)
+        await add_user(mock_discord_user)
 
 
-def test_get_user(test_db, mock_discord_user):
+@pytest.mark.asyncio
+async def test_get_user(test_db, mock_discord_user):
     test_db.add(
         User(
             user_id=mock_discord_user.id,
@@ -58,7 +79,7 @@ def test_get_user(test_db, mock_discord_user):
         )
     )
     test_db.commit()
-    result = get_user(mock_discord_user)
+    result = await get_user(mock_discord_user)
     assert result is not None
     assert result.user_id == mock_discord_user.id
     assert result.username == mock_discord_user.name
@@ -66,8 +87,9 @@ def test_get_user(test_db, mock_discord_user):
 
 # test_db is necessary to be a parameter here
 # pyright: reportUnusedParameter = false
-def test_get_nonexitent_user(test_db, mock_discord_user):
-    result = get_user(mock_discord_user)
+@pytest.mark.asyncio
+async def test_get_nonexitent_user(test_db, mock_discord_user):
+    result = await get_user(mock_discord_user)
     assert result is None
 
 
@@ -138,3 +160,309 @@ def test_transaction_rollback(test_db, mock_discord_user):
         pass
     result = test_db.query(User).filter(User.user_id == mock_discord_user.id).first()
     assert result is None
+
+
+def test_strategy_cache_persists(test_db):
+    cache = StrategyCache()
+    cache.record("testing.com", "price-class", "product__price")
+    cache.record("other.com", "json-ld")
+    cache.save()
+
+    restarted = StrategyCache()
+    restarted.load()
+    assert len(restarted) == 2
+    assert restarted.get("testing.com") == LearnedStrategy(
+        "price-class", "product__price"
+    )
+
+    # only changed domains are written again
+    restarted.record("other.com", "schema.org")
+    restarted.save()
+    row = test_db.query(Domain_Strategy).filter_by(domain="other.com").one()
+    assert row.strategy == "schema.org"
+
+
+@pytest.mark.asyncio
+async def test_run_db_uses_worker_thread():
+    import threading
+
+    from db.connect import run_db
+
+    name = await run_db(lambda: threading.current_thread().name)
+    assert name.startswith("db")
+
+
+def _history_product(test_db) -> Product:
+    product = Product(
+        url="https://testing.com",
+        name="Test Product",
+        stock_status=1,
+        price="$5.50",
+        last_checked=datetime(2025, 2, 4),
+    )
+    test_db.add(product)
+    test_db.commit()
+    return product
+
+
+def test_history_appends_only_changes(test_db):
+    product = _history_product(test_db)
+    rows = []
+    for hour, price in enumerate(["$5.50", "$5.50", "$4.00", "$4.00", "$5.50"]):
+        product.price = price
+        product.last_checked = datetime(2025, 2, 4, hour)
+        rows.append(history_row(product))
+    for row in rows:
+        append_history(test_db, [row])
+    # the product has since been deleted
+    append_history(test_db, [{**rows[0], "product_id": 99}])
+    test_db.commit()
+
+    amounts = [
+        row.amount
+        for row in test_db.query(Price_History).order_by(Price_History.recorded)
+    ]
+    assert amounts == [550, 400, 550]
+
+
+def test_compact_history(test_db):
+    product = _history_product(test_db)
+    now = datetime(2025, 6, 1)
+
+    def add(recorded: datetime, amount: int):
+        test_db.add(
+            Price_History(
+                product_id=product.product_id,
+                recorded=recorded,
+                amount=amount,
+                low_amount=amount,
+                high_amount=amount,
+                currency="USD",
+                stock_status=1,
+            )
+        )
+
+    # recent rows are kept as they are
+    add(now - timedelta(days=1, minutes=30), 500)
+    add(now - timedelta(days=1, minutes=10), 510)
+    # within 90 days, merged per hour
+    hour = datetime(2025, 5, 1, 12)
+    for minute, amount in ((5, 600), (20, 450), (40, 700), (55, 650)):
+        add(hour + timedelta(minutes=minute), amount)
+    # older, merged per day
+    day = datetime(2025, 1, 10)
+    for hours, amount in ((1, 300), (13, 350)):
+        add(day + timedelta(hours=hours), amount)
+    test_db.commit()
+
+    assert compact_history(now) == 4
+    test_db.expire_all()
+    rows = test_db.query(Price_History).order_by(Price_History.recorded).all()
+    summary = [(r.recorded, r.amount, r.low_amount, r.high_amount) for r in rows]
+    assert summary == [
+        (day, 350, 300, 350),
+        (hour, 650, 450, 700),
+        (now - timedelta(days=1, minutes=30), 500, 500, 500),
+        (now - timedelta(days=1, minutes=10), 510, 510, 510),
+    ]
+    # already compacted buckets are left alone
+    assert compact_history(now) == 0
+
+
+def test_compact_history_bucket_straddling_cutoff(test_db):
+    product = _history_product(test_db)
+    now = datetime(2025, 6, 1, 12, 30)
+    raw_cutoff = now - timedelta(days=7)
+    for minute, amount in ((0, 500), (10, 450), (40, 600)):
+        test_db.add(
+            Price_History(
+                product_id=product.product_id,
+                recorded=raw_cutoff.replace(minute=minute),
+                amount=amount,
+                low_amount=amount,
+                high_amount=amount,
+                currency="USD",
+                stock_status=1,
+            )
+        )
+    test_db.commit()
+
+    # the 12:40 row is still inside the raw window, only 12:00 and 12:10 merge
+    assert compact_history(now) == 1
+    test_db.expire_all()
+    rows = test_db.query(Price_History).order_by(Price_History.recorded).all()
+    summary = [(r.recorded, r.amount, r.low_amount, r.high_amount) for r in rows]
+    assert summary == [
+        (raw_cutoff.replace(minute=0), 450, 450, 500),
+        (raw_cutoff.replace(minute=40), 600, 600, 600),
+    ]
+
+
+def test_summarise_history(test_db):
+    product = _history_product(test_db)
+    now = datetime(2025, 6, 1)
+    for days_ago, amount in ((200, 900), (40, 700), (3, 650)):
+        test_db.add(
+            Price_History(
+                product_id=product.product_id,
+                recorded=now - timedelta(days=days_ago),
+                amount=amount,
+                low_amount=amount,
+                high_amount=amount,
+                currency="USD",
+                stock_status=1,
+            )
+        )
+    test_db.commit()
+
+    windows = summarise_history(product.product_id, "USD", now, (7, 30))
+
+    # the price in effect when a window opened counts towards it
+    assert [(w.days, w.low_amount, w.high_amount) for w in windows] == [
+        (7, 650, 700),
+        (30, 650, 700),
+        (None, 650, 900),
+    ]
+    assert last_change(product.product_id) == now - timedelta(days=3)
+
+
+def test_trigger_alerts(test_db):
+    def product(url: str, amount: int, currency: str = "USD") -> Product:
+        return Product(
+            url=url,
+            name="Test Product",
+            stock_status=1,
+            price=f"${amount / 100:.2f}",
+            price_amount=amount,
+            price_currency=currency,
+            last_checked=datetime(2025, 2, 4),
+        )
+
+    cheap, pricey, euro = (
+        product("https://cheap.com", 400),
+        product("https://pricey.com", 950),
+        product("https://euro.com", 100, "EUR"),
+    )
+    test_db.add_all([cheap, pricey, euro])
+    test_db.commit()
+    for alert in (
+        # target reached
+        (cheap, 450, None, None),
+        # 20% drop from 500 is 400, reached
+        (cheap, None, 20, 500),
+        # neither reached
+        (pricey, 900, 10, 1000),
+        # priced in a different currency than the alert was set in
+        (euro, 500, None, None),
+    ):
+        item, target, drop, baseline = alert
+        add_alert(1, item.product_id, "USD", target, drop, baseline)
+
+    now = datetime(2025, 2, 5)
+    ids = [cheap.product_id, pricey.product_id, euro.product_id]
+    triggered = trigger_alerts(ids, now)
+
+    assert {(a.url, a.target_amount, a.drop_percent) for a in triggered} == {
+        ("https://cheap.com", None, 20),
+        ("https://cheap.com", 450, None),
+    }
+    # each alert only fires once
+    assert trigger_alerts(ids, now) == []
+    assert trigger_alerts([], now) == []
+
+
+def test_channel_subscriptions(test_db):
+    url = "https://testing.com"
+    assert subscribe_channel(url, 10, 20, None) is None
+
+    product = Product(
+        url=url,
+        name="Test Product",
+        stock_status=1,
+        price="$5.50",
+        last_checked=datetime(2025, 2, 4),
+    )
+    test_db.add(product)
+    test_db.commit()
+    assert subscribe_channel(url, 10, 20, None) is not None
+    # subscribing again replaces the role
+    subscribe_channel(url, 10, 20, 30)
+
+    (subscription,) = get_subscriptions(product.product_id)
+    assert (subscription.guild_id, subscription.channel_id) == ("10", "20")
+    assert subscription.role_id == "30"
+
+    assert unsubscribe_channel(url, 20)
+    assert not unsubscribe_channel(url, 20)
+    assert test_db.query(Channel_Subscription).count() == 0
+
+
+def _watch(test_db, user_id: str, url: str) -> User_Stock:
+    product = test_db.query(Product).filter(Product.url == url).one_or_none()
+    if product is None:
+        product = Product(
+            url=url,
+            name="Test Product",
+            stock_status=1,
+            price="$5.50",
+            last_checked=datetime(2025, 2, 4),
+        )
+    stock = User_Stock(
+        user_id=user_id, product=product, date_added=datetime(2025, 2, 4)
+    )
+    test_db.add(stock)
+    test_db.commit()
+    return stock
+
+
+@pytest.mark.asyncio
+async def test_watchlist_cache_hits_and_misses(test_db):
+    _watch(test_db, "1", "https://testing.com/1")
+    cache = WatchlistCache()
+
+    first = await cache.get(1)
+    second = await cache.get("1")
+
+    assert second is first
+    assert [stock.stock_url for stock in first.values()] == ["https://testing.com/1"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_watchlist_cache_writes_through(test_db):
+    _watch(test_db, "1", "https://testing.com/1")
+    _watch(test_db, "2", "https://testing.com/1")
+    cache = WatchlistCache()
+    watchlist = await cache.get(1)
+    other = await cache.get(2)
+
+    added = _watch(test_db, "1", "https://testing.com/2")
+    cache.add(added)
+    assert added.product_id in watchlist
+
+    # a check of the shared product reaches every cached watch of it
+    checked = test_db.get(Product, 1)
+    checked.price = "$4.00"
+    cache.update_product(checked)
+    assert watchlist[1].price == "$4.00"
+    assert other[1].price == "$4.00"
+
+    checked_stock = test_db.get(User_Stock, ("1", 1))
+    checked_stock.notified_price = "$4.00"
+    cache.update_notified(checked_stock)
+    assert watchlist[1].notified_price == "$4.00"
+
+    cache.remove(1, 1)
+    assert list(watchlist) == [added.product_id]
+    assert cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_watchlist_cache_evicts_least_recent(test_db):
+    cache = WatchlistCache(max_size=2)
+    for user_id in (1, 2, 3):
+        await cache.get(user_id)
+    assert len(cache) == 2
+
+    await cache.get(1)
+    assert cache.misses == 4
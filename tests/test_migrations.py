@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+
+from db.connect import _set_sqlite_pragmas
+from db.models import Base
+from migrations.runner import current_version, migrate
+from migrations.versions import MIGRATIONS, Migration
+
+LATEST = MIGRATIONS[-1].version
+
+# what src/migrations/create.py used to make, no primary keys or indexes
+OLD_SCHEMA = """
+CREATE TABLE User(
+    user_id CHAR(20) NOT NULL,
+    username CHAR(50) NOT NULL,
+    join_date TIMESTAMP NOT NULL
+);
+CREATE TABLE USER_STOCK(
+    user_id CHAR(20) NOT NULL,
+    stock_url VARCHAR(255) NOT NULL,
+    stock_name VARCHAR(50) NOT NULL,
+    stock_status INTEGER NOT NULL,
+    date_added TIMESTAMP NOT NULL,
+    last_checked TIMESTAMP NOT NULL,
+    check_interval INTEGER NOT NULL,
+    price VARCHAR(50) NOT NULL
+);
+"""
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return tmp_path / "main.db"
+
+
+def _engine(db_file):
+    return create_engine(f"sqlite:///{db_file}")
+
+
+def test_migrate_fresh_database_matches_models(db_file):
+    engine = _engine(db_file)
+    assert migrate(engine) == LATEST
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys())
+        primary_key = inspector.get_pk_constraint(table.name)["constrained_columns"]
+        assert set(primary_key) == {column.name for column in table.primary_key}
+
+
+def test_migrate_is_idempotent(db_file):
+    engine = _engine(db_file)
+    migrate(engine)
+    assert migrate(engine) == LATEST
+
+
+def test_migrate_upgrades_old_database(db_file):
+    with sqlite3.connect(db_file) as connection:
+        connection.executescript(OLD_SCHEMA)
+        url = "https://testing.com"
+        rows = [
+            ("1", url, "Test", 1, "2025-02-04", "2025-02-04 10:00", 300, "$5"),
+            # the old tables allowed duplicate watches
+            ("1", url, "Test", 1, "2025-02-04", "2025-02-04 10:00", 300, "$5"),
+            ("2", url, "Mine", 0, "2025-02-04", "2025-02-04 11:00", 600, "$4"),
+        ]
+        connection.executemany(
+            "INSERT INTO USER_STOCK VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    migrate(_engine(db_file))
+
+    with sqlite3.connect(db_file) as connection:
+        assert current_version(connection) == LATEST
+        # one product, holding the most recently checked state
+        products = connection.execute(
+            "SELECT url, stock_status, price FROM PRODUCT"
+        ).fetchall()
+        assert products == [(url, 0, "$4")]
+        watches = connection.execute(
+            "SELECT user_id, check_interval, notified_price, s.name, p.name "
+            "FROM USER_STOCK s JOIN PRODUCT p USING (product_id) ORDER BY user_id"
+        ).fetchall()
+        # each watcher keeps their own name where it differs from the product's
+        assert watches == [
+            ("1", 300, "$5", "Test", "Mine"),
+            ("2", 600, "$4", None, "Mine"),
+        ]
+        indexes = {
+            row[1]
+            for table in ("USER_STOCK", "PRODUCT")
+            for row in connection.execute(f"PRAGMA index_list({table})")
+        }
+        assert {"ix_user_stock_product_id", "ix_product_last_checked"} <= indexes
+
+
+def test_failed_migration_rolls_back(db_file, mocker):
+    broken = Migration(1, "Broken", ("CREATE TABLE A(x)", "NOT SQL"))
+    mocker.patch("migrations.runner.MIGRATIONS", (broken,))
+
+    with pytest.raises(RuntimeError):
+        migrate(_engine(db_file))
+
+    with sqlite3.connect(db_file) as connection:
+        assert current_version(connection) == 0
+        tables = connection.execute("SELECT name FROM sqlite_master").fetchall()
+        assert tables == []
+
+
+def test_engine_sets_pragmas(db_file):
+    engine = _engine(db_file)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+    with engine.connect() as connection:
+        pragma = connection.exec_driver_sql
+        assert pragma("PRAGMA journal_mode").scalar() == "wal"
+        assert pragma("PRAGMA synchronous").scalar() == 1  # NORMAL
@@ -0,0 +1,300 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import discord
+import pytest
+
+from notify.digest import (
+    DIGEST_TITLE,
+    MAX_EMBED_CHARS,
+    MAX_EMBEDS,
+    MAX_FIELD_NAME,
+    DigestQueue,
+    Notification,
+    build_digest,
+)
+from notify.outbox import Outbox, RouteBucket
+from notify.users import LazyUser, UserCache
+
+
+def make_bot(cached: dict | None = None):
+    bot = MagicMock()
+    bot.get_user.side_effect = lambda user_id: (cached or {}).get(user_id)
+    bot.fetch_user = AsyncMock(side_effect=lambda user_id: MagicMock(id=user_id))
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_user_cache_fetches_once():
+    bot = make_bot()
+    cache = UserCache()
+
+    first = await cache.resolve(bot, "123")
+    second = await cache.resolve(bot, 123)
+
+    assert first is second
+    bot.fetch_user.assert_awaited_once_with(123)
+
+
+@pytest.mark.asyncio
+async def test_user_cache_prefers_client_cache():
+    user = MagicMock(id=123)
+    bot = make_bot({123: user})
+
+    assert await UserCache().resolve(bot, 123) is user
+    bot.fetch_user.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_user_cache_shares_concurrent_fetches():
+    bot = make_bot()
+    release = asyncio.Event()
+
+    async def slow_fetch(user_id):
+        await release.wait()
+        return MagicMock(id=user_id)
+
+    bot.fetch_user = AsyncMock(side_effect=slow_fetch)
+    cache = UserCache()
+    lookups = [asyncio.create_task(cache.resolve(bot, 123)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    users = await asyncio.gather(*lookups)
+
+    assert users[0] is users[1] is users[2]
+    bot.fetch_user.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_user_cache_evicts_least_recent_and_expired(mocker):
+    clock = mocker.patch("notify.users.time.monotonic", return_value=0)
+    cache = UserCache(max_size=2, ttl=60)
+    for user_id in (1, 2):
+        cache.put(user_id, MagicMock(id=user_id))
+    cache.get(1)
+    cache.put(3, MagicMock(id=3))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+    clock.return_value = 61
+    assert cache.get(1) is None
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_cache_missing_user():
+    bot = make_bot()
+    bot.fetch_user.side_effect = discord.NotFound(MagicMock(status=404), "gone")
+    cache = UserCache()
+
+    assert await cache.resolve(bot, 123) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_lazy_user_resolves_only_on_send():
+    bot = make_bot()
+    lazy = LazyUser(bot, "123", UserCache())
+    bot.fetch_user.assert_not_awaited()
+
+    bot.fetch_user.side_effect = None
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    bot.fetch_user.return_value = user
+    await lazy.send("hello")
+
+    user.send.assert_awaited_once_with("hello")
+
+
+def make_notification(index: int, **overrides) -> Notification:
+    fields = {
+        "name": f"Product {index}",
+        "url": f"https://testing.com/{index}",
+        "old_price": "$5.50",
+        "new_price": "$4.00",
+    }
+    fields.update(overrides)
+    return Notification(**fields)
+
+
+def test_build_digest_single_message():
+    messages = build_digest([make_notification(i) for i in range(30)])
+
+    # 30 fields need two embeds, which still fit in one message
+    assert len(messages) == 1
+    assert [len(embed.fields) for embed in messages[0]] == [25, 5]
+    assert messages[0][0].title == DIGEST_TITLE
+
+
+def test_build_digest_splits_at_message_limits():
+    long_name = "x" * MAX_FIELD_NAME
+    notifications = [make_notification(i, name=long_name) for i in range(60)]
+
+    messages = build_digest(notifications)
+
+    assert len(messages) > 1
+    for embeds in messages:
+        assert len(embeds) <= MAX_EMBEDS
+        size = sum(
+            len(embed.title or "")
+            + sum(len(f.name) + len(f.value) for f in embed.fields)
+            for embed in embeds
+        )
+        assert size <= MAX_EMBED_CHARS
+    assert sum(len(e.fields) for embeds in messages for e in embeds) == 60
+
+
+@pytest.mark.asyncio
+async def test_digest_queue_coalesces_per_user():
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    outbox = Outbox()
+    queue = DigestQueue(window=0.01, outbox=outbox)
+
+    for index in range(3):
+        await queue.notify(user, make_notification(index))
+    assert len(queue) == 3
+    user.send.assert_not_called()
+    await asyncio.sleep(0.05)
+    await outbox.drain()
+
+    user.send.assert_awaited_once()
+    assert len(user.send.call_args.kwargs["embeds"][0].fields) == 3
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_digest_queue_urgent_and_close():
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    outbox = Outbox()
+    queue = DigestQueue(window=3600, outbox=outbox)
+
+    await queue.notify(user, make_notification(0, status="In stock", urgent=True))
+    await outbox.drain()
+    user.send.assert_awaited_once_with(
+        "Product 0 is now **In stock**!\n"
+        "[Product 0](<https://testing.com/0>) price change: $5.50 -> $4.00"
+    )
+
+    await queue.notify(user, make_notification(1))
+    await queue.close()
+    await outbox.drain()
+    assert "embeds" in user.send.call_args.kwargs
+    assert len(queue) == 0
+
+
+def make_http_error(cls, status: int):
+    return cls(MagicMock(status=status, reason="error"), "error")
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_with_backoff():
+    user = MagicMock(id=123)
+    user.send = AsyncMock(
+        side_effect=[make_http_error(discord.HTTPException, 500), None]
+    )
+    outbox = Outbox(max_retries=2, retry_delay=0.01)
+
+    outbox.enqueue(user, "hello")
+    assert outbox.depth == 1
+    await outbox.drain()
+
+    assert user.send.await_count == 2
+    assert outbox.depth == 0
+    assert not outbox.dead_letters
+
+
+@pytest.mark.asyncio
+async def test_outbox_dead_letters_after_retries():
+    user = MagicMock(id=123)
+    user.send = AsyncMock(side_effect=make_http_error(discord.HTTPException, 500))
+    outbox = Outbox(max_retries=1, retry_delay=0.01)
+
+    outbox.enqueue(user, "hello")
+    await outbox.drain()
+
+    assert user.send.await_count == 2
+    assert len(outbox.dead_letters) == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_drops_undeliverable_users():
+    user = MagicMock(id=123)
+    user.send = AsyncMock(side_effect=make_http_error(discord.Forbidden, 403))
+    outbox = Outbox(retry_delay=0.01)
+
+    outbox.enqueue(user, "first")
+    outbox.enqueue(user, "second")
+    await outbox.drain()
+    outbox.enqueue(user, "third")
+
+    # closed DMs are never retried, and nothing else is tried for that user
+    user.send.assert_awaited_once_with("first")
+    assert len(outbox.dead_letters) == 3
+    assert outbox.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_holds_routes_to_their_rate_limit():
+    limited, other = MagicMock(id=1), MagicMock(id=2)
+    limited.send, other.send = AsyncMock(), AsyncMock()
+    outbox = Outbox()
+    outbox._buckets[1] = RouteBucket(capacity=2, per=0.1)
+
+    for index in range(3):
+        outbox.enqueue(limited, f"message {index}")
+    outbox.enqueue(other, "hello")
+    for _ in range(4):
+        await outbox._deliver(await outbox._queue.get())
+
+    # the third message waits for the bucket without holding up other users
+    assert limited.send.await_count == 2
+    other.send.assert_awaited_once_with("hello")
+    assert outbox.depth == 1
+    await outbox.drain()
+    assert limited.send.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_outbox_rate_limited_route_does_not_block_others():
+    release = asyncio.Event()
+
+    async def rate_limited_send(*args, **kwargs):
+        # discord.py sleeps out a 429 inside send
+        await release.wait()
+
+    limited, other = MagicMock(id=1), MagicMock(id=2)
+    limited.send = AsyncMock(side_effect=rate_limited_send)
+    other.send = AsyncMock()
+    outbox = Outbox()
+    outbox.start()
+
+    outbox.enqueue(limited, "first")
+    outbox.enqueue(limited, "second")
+    outbox.enqueue(other, "hello")
+    await asyncio.sleep(0.01)
+
+    other.send.assert_awaited_once_with("hello")
+    limited.send.assert_awaited_once_with("first")
+    assert outbox.depth == 2
+    release.set()
+    await outbox.close()
+    assert limited.send.await_count == 2
+    assert outbox.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_sender_task():
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    outbox = Outbox()
+    outbox.start()
+
+    outbox.enqueue(user, "hello")
+    await asyncio.sleep(0.01)
+    user.send.assert_awaited_once_with("hello")
+
+    await outbox.close()
+    assert outbox.depth == 0
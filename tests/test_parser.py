@@ -0,0 +1,118 @@
+import pytest
+
+from cogs import stock
+from scraper.parser import PARSER_BACKENDS, make_soup, resolve_backend
+from scraper.strategies import StrategyCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_strategies(mocker):
+    # every page is on the same domain, don't let them learn from each other
+    mocker.patch("cogs.stock.strategy_cache", StrategyCache())
+
+
+# pages from the stock extraction tests, plus a few messier real world shapes
+PAGES = [
+    '<html><span id="availability" class="product_availability availability-item">Out of Stock</span></html>',
+    '<html><span id="availability" class="product_availability availability-item">In Stock</span></html>',
+    "<div>In Stock</div>",
+    "<div>Out of Stock</div>",
+    "<div>Sold Out</div>",
+    "<div>Available</div>",
+    "<div>Not Available</div>",
+    """
+<html>
+  <head>
+    <meta itemprop="price" content="49.99">
+    <meta itemprop="priceCurrency" content="USD">
+    <title>Test Product Page</title>
+  </head>
+  <body>
+    <h1>Test Product Title</h1>
+    <p>Test product description.</p>
+  </body>
+</html>
+    """,
+    """
+<html>
+  <head>
+    <meta property="product:price:amount" content="59.99">
+    <meta property="product:price:currency" content="USD">
+    <title>Product Page</title>
+  </head>
+  <body>
+    <h1>Product Title</h1>
+    <p>Product description.</p>
+  </body>
+</html>
+    """,
+    """
+<html>
+  <head>
+    <script type="application/ld+json">
+    {
+      "price": "99.99",
+      "currency": "USD"
+    }
+    </script>
+    <title>Product Page</title>
+  </head>
+  <body>
+    <h1>Product Title</h1>
+    <p>Product description.</p>
+  </body>
+</html>
+    """,
+    """
+<html>
+  <head>
+    <title>Product Page</title>
+  </head>
+  <body>
+    <p>Welcome to our store! Get this amazing product for only $29.99 while supplies last.</p>
+  </body>
+</html>
+    """,
+    """
+<html>
+  <head>
+    <title>Product Page</title>
+  </head>
+  <body>
+    <p>Limited time offer: Special price at £99 for our premium product!</p>
+  </body>
+</html>
+    """,
+    "<html><body>No price information</body></html>",
+    "<html><head><title>Unit Test Title — Shop</title></head><html>",
+    """
+<html><head><title>Widget - Test Shop</title></head>
+<body>
+  <div class="product__price"><span>2,00€</span></div>
+  <div style="display:none">Sold out</div>
+  <p>Unclosed paragraph
+  <div hidden>Out of stock</div>
+</body></html>
+    """,
+]
+
+
+def extract(html: str, parser: str):
+    soup = make_soup(html, parser)
+    name = stock._extract_stock_name(soup)
+    json_ld = stock._extract_price_from_json_ld(soup)
+    price = stock._extract_price(soup, "https://testing.com")
+    status = stock._extract_stock_status(soup, "https://testing.com")
+    return name, json_ld, price, status
+
+
+@pytest.mark.parametrize("html", PAGES)
+def test_parser_backends_extract_identically(html):
+    results = [extract(html, parser) for parser in PARSER_BACKENDS]
+    assert all(result == results[0] for result in results)
+
+
+def test_resolve_backend_falls_back():
+    assert resolve_backend("lxml") == "lxml"
+    assert resolve_backend("html.parser") == "html.parser"
+    assert resolve_backend("not-a-parser") == "html.parser"
@@ -0,0 +1,249 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from scraper import browser
+from scraper.browser import BrowserPool
+from scraper.money import Money
+from scraper.phrases import PhraseBook, PhraseMatcher
+from scraper.tiers import DomainTiers, Fetch_Tier
+from scraper.validators import PageCache, PageValidators, content_hash
+
+
+@pytest.fixture
+def fake_playwright(mocker):
+    chromium_browser = MagicMock()
+    chromium_browser.is_connected.return_value = True
+    chromium_browser.close = AsyncMock()
+    contexts = []
+
+    def new_context(**_):
+        context = MagicMock()
+        context.new_page = AsyncMock(return_value=MagicMock())
+        context.close = AsyncMock()
+        context.route = AsyncMock()
+        contexts.append(context)
+        return context
+
+    chromium_browser.new_context = AsyncMock(side_effect=new_context)
+
+    pw = MagicMock()
+    pw.chromium.launch = AsyncMock(return_value=chromium_browser)
+    pw.stop = AsyncMock()
+    pw.contexts = contexts
+
+    starter = MagicMock()
+    starter.start = AsyncMock(return_value=pw)
+    mocker.patch.object(browser, "async_playwright", return_value=starter)
+    return pw
+
+
+@pytest.mark.asyncio
+async def test_browser_pool_launches_once(fake_playwright):
+    pool = BrowserPool(max_pages=2)
+    await pool.start()
+    for _ in range(3):
+        async with pool.page():
+            pass
+    fake_playwright.chromium.launch.assert_called_once()
+    await pool.close()
+    fake_playwright.stop.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_browser_pool_closes_context(fake_playwright):
+    pool = BrowserPool(max_pages=1)
+    async with pool.page():
+        pass
+    async with pool.page():
+        pass
+    # each page gets its own context, closed when the page is released
+    assert len(fake_playwright.contexts) == 2
+    for context in fake_playwright.contexts:
+        context.route.assert_awaited_once_with("**/*", browser._block_unneeded)
+        context.close.assert_awaited_once()
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_browser_pool_limits_pages(fake_playwright):
+    pool = BrowserPool(max_pages=2)
+    open_pages = 0
+    peak = 0
+
+    async def use_page():
+        nonlocal open_pages, peak
+        async with pool.page():
+            open_pages += 1
+            peak = max(peak, open_pages)
+            await asyncio.sleep(0.01)
+            open_pages -= 1
+
+    await asyncio.gather(*(use_page() for _ in range(6)))
+    assert peak == 2
+    await pool.close()
+
+
+def test_domain_tiers_default_to_http():
+    tiers = DomainTiers()
+    assert not tiers.needs_browser("https://testing.com/product")
+
+
+def test_domain_tiers_remember_browser():
+    tiers = DomainTiers(recheck_after=timedelta(hours=1))
+    tiers.record("https://testing.com/product/1", Fetch_Tier.BROWSER)
+
+    assert tiers.needs_browser("https://testing.com/product/2")
+    assert not tiers.needs_browser("https://other.com/product")
+    # browser domains get another chance at a plain request later on
+    later = datetime.now() + timedelta(hours=2)
+    assert not tiers.needs_browser("https://testing.com/product/2", later)
+
+
+def test_content_hash_ignores_scripts_and_whitespace():
+    html = "<html><body><p>Price: $9.99</p></body></html>"
+    noisy = (
+        "<html><body>\n  <p>Price: $9.99</p>\n"
+        "<script>var session = 'abc123';</script><!-- rendered 12:00 --></body></html>"
+    )
+    assert content_hash(html) == content_hash(noisy)
+    assert content_hash(html) != content_hash(html.replace("9.99", "8.99"))
+
+
+def test_content_hash_keeps_json_ld():
+    html = '<script type="application/ld+json">{"price": "9.99"}</script>'
+    assert content_hash(html) != content_hash(html.replace("9.99", "8.99"))
+
+
+def test_page_cache_evicts_least_recent():
+    cache = PageCache(max_size=2)
+    cache.put("https://one.com", PageValidators(etag="1"), 1)
+    cache.put("https://two.com", PageValidators(etag="2"), 2)
+    cache.get("https://one.com")
+    cache.put("https://three.com", PageValidators(etag="3"), 3)
+
+    assert cache.get("https://two.com") is None
+    cached = cache.get("https://one.com")
+    assert cached is not None and cached.value == 1
+    assert len(cache) == 2
+
+
+@pytest.mark.parametrize(
+    "resource_type,url,expected",
+    [
+        ("document", "https://shop.com/product", False),
+        ("script", "https://shop.com/app.js", False),
+        ("xhr", "https://shop.com/api/price", False),
+        ("image", "https://shop.com/product.jpg", True),
+        ("font", "https://fonts.shop.com/font.woff2", True),
+        ("stylesheet", "https://shop.com/style.css", True),
+        ("script", "https://www.googletagmanager.com/gtm.js", True),
+        ("script", "https://connect.facebook.net/sdk.js", True),
+        ("script", "https://notdoubleclick.net/app.js", False),
+    ],
+)
+def test_should_block(resource_type, url, expected):
+    assert browser.should_block(resource_type, url) == expected
+
+
+@pytest.mark.asyncio
+async def test_load_product_page_returns_on_markers():
+    page = AsyncMock()
+    page.content.return_value = "<html></html>"
+
+    html = await browser.load_product_page(page, "https://shop.com", 1000)
+
+    assert html == "<html></html>"
+    assert page.goto.call_args.kwargs["wait_until"] == "domcontentloaded"
+    page.wait_for_function.assert_awaited_once()
+    page.wait_for_load_state.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_load_product_page_falls_back_to_network_idle():
+    page = AsyncMock()
+    page.content.return_value = "<html></html>"
+    page.wait_for_function.side_effect = browser.PlaywrightTimeoutError("timeout")
+
+    await browser.load_product_page(page, "https://shop.com", 1000)
+
+    page.wait_for_load_state.assert_awaited_once_with("networkidle", timeout=1000)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Widget - In stock, ships today", None),
+        ("Widget - SOLD OUT", "sold out"),
+        ("Dieser Artikel ist leider ausverkauft", "ausverkauft"),
+        ("Produkt niedostępny", "niedostępny"),
+        ("Zboží je vyprodáno", "vyprodáno"),
+        ("この商品は在庫切れです", "在庫切れ"),
+    ],
+)
+def test_default_phrases_cover_locales(text, expected):
+    matcher = PhraseBook.from_file(Path("does-not-exist.json")).matcher_for(
+        "https://shop.com/product"
+    )
+    assert matcher.search(text) == expected
+
+
+def test_phrase_book_domain_rules(tmp_path):
+    phrases_file = tmp_path / "phrases.json"
+    phrases_file.write_text(
+        json.dumps(
+            {
+                "locales": {"en": ["temporarily unavailable"]},
+                "domains": {"shop.de": {"locales": ["de"], "phrases": ["vergriffen"]}},
+            }
+        ),
+        encoding="utf-8",
+    )
+    book = PhraseBook.from_file(phrases_file)
+
+    german = book.matcher_for("https://www.shop.de/artikel")
+    assert german.search("Leider vergriffen") == "vergriffen"
+    assert german.search("Ausverkauft") == "ausverkauft"
+    # only the german dictionary applies to this domain
+    assert german.search("Sold out") is None
+
+    default = book.matcher_for("https://shop.com/product")
+    assert default.search("Temporarily unavailable") == "temporarily unavailable"
+    assert default.search("Leider vergriffen") is None
+    # matchers are compiled once per domain rule
+    assert book.matcher_for("https://shop.de/other") is german
+
+
+def test_phrase_matcher_empty():
+    assert PhraseMatcher([]).search("sold out") is None
+
+
+@pytest.mark.parametrize(
+    "text, amount, currency, formatted",
+    [
+        ("$5.50", 550, "USD", "$5.50"),
+        ("5,50 €", 550, "EUR", "5.50€"),
+        ("1.299,99 zł", 129999, "PLN", "1299.99zł"),
+        ("¥1200", 1200, "JPY", "¥1200"),
+        ("GBP 3", 300, "GBP", "£3.00"),
+    ],
+)
+def test_money_parse(text, amount, currency, formatted):
+    money = Money.parse(text)
+    assert money == Money(amount, currency)
+    assert money.format() == formatted
+
+
+def test_money_parse_without_amount():
+    assert Money.parse("Price not found") is None
+    assert Money.parse(None) is None
+
+
+def test_money_parse_in_known_currency():
+    assert Money.parse_in("$19.99", "AUD") == Money(1999, "AUD")
+    assert Money.parse_in("199,50 kr", "NOK") == Money(19950, "NOK")
+    assert Money.parse_in("Price not found", "AUD") is None
@@ -1,15 +1,46 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock
 
 import discord
 import pytest
-from bs4 import BeautifulSoup, Tag
+from bs4 import Tag
 from discord import Interaction, app_commands
 from discord.ext import commands
+from sqlalchemy import exc
 
+from checker.scheduler import WatchScheduler
+from checker.writer import CheckWriter
 from cogs import stock
-from cogs.stock import Remove, RemoveButton, Stock
-from db.models import User, User_Stock
+from cogs.stock import ProductSnapshot, RemoveView, Stock, WatchlistView
+from db.alerts import TriggeredAlert
+from db.connect import run_db
+from db.models import Price_Alert, Product, User, User_Stock
+from db.subscriptions import subscribe_channel
+from db.watchlists import WatchlistCache
+from notify.digest import DigestQueue
+from notify.outbox import Outbox
+from notify.users import UserCache
+from scraper.http import StaticPage
+from scraper.money import Money
+from scraper.strategies import StrategyCache
+from scraper.tiers import DomainTiers, Fetch_Tier
+from scraper.validators import PageCache, PageValidators
+
+
+@pytest.fixture(autouse=True)
+def no_static_fetch(mocker):
+    # keep tests off the network, every page comes from the patched browser fetch
+    mocker.patch("cogs.stock.fetch_static_contents", return_value=None)
+    mocker.patch("cogs.stock.fetch_tiers", DomainTiers())
+    mocker.patch("cogs.stock.page_cache", PageCache())
+    mocker.patch("cogs.stock.strategy_cache", StrategyCache())
+    mocker.patch("cogs.stock.check_writer", CheckWriter())
+    mocker.patch("cogs.stock.user_cache", UserCache())
+    mocker.patch("cogs.stock.watchlist_cache", WatchlistCache())
+    mocker.patch("cogs.stock._product_status", {})
+    outbox = mocker.patch("cogs.stock.outbox", Outbox())
+    mocker.patch("cogs.stock.digest_queue", DigestQueue(outbox=outbox))
 
 
 @pytest.fixture
@@ -20,6 +51,20 @@ def mock_discord_user():
     return user
 
 
+def make_snapshot(**overrides) -> ProductSnapshot:
+    fields = {
+        "url": "https://testing.com",
+        "name": "Test Product",
+        "price": "$5.50",
+        "stock_status": 1,
+        "strategy": "schema.org",
+        "fetched_at": datetime.now(),
+        "fetch_time": 0.1,
+    }
+    fields.update(overrides)
+    return ProductSnapshot(**fields)
+
+
 def test_parse_price_string_valid():
     text = "$11.22"
     result = stock._parse_price_string(text)
@@ -86,14 +131,14 @@ def test_parse_price_string_formats(price_text, expected):
 
 @pytest.mark.asyncio
 async def test_fetch_page_contents(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = "<html><head><title>Unit Test Title</title></head><html>"
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
 
-    soup = await stock.fetch_page_contents("https://testing.com")
-    title = soup.find("title")
+    html = await stock.fetch_page_contents("https://testing.com")
+    title = stock.make_soup(html).find("title")
     if isinstance(title, Tag):
         title = title.string
     assert title == "Unit Test Title"
@@ -101,9 +146,9 @@ async def test_fetch_page_contents(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_check_stock_out_of_stock(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = '<html><span id="availability" class="product_availability availability-item">Out of Stock</span></html>'
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
 
@@ -113,9 +158,9 @@ async def test_check_stock_out_of_stock(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_check_stock_in_stock(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = '<html><span id="availability" class="product_availability availability-item">In Stock</span></html>'
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
 
@@ -136,7 +181,7 @@ async def test_check_stock_in_stock(monkeypatch):
 )
 async def test_check_stock_variations(mocker, page_content, expected_status):
     async def fake_fetch(url: str):
-        return BeautifulSoup(page_content, "html.parser")
+        return page_content
 
     mocker.patch("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.fetch_stock_status("https://testing.com")
@@ -145,7 +190,7 @@ async def test_check_stock_variations(mocker, page_content, expected_status):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_schemaorg(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = """
 <html>
   <head>
@@ -159,7 +204,7 @@ async def test_get_stock_price_schemaorg(monkeypatch):
   </body>
 </html>
         """
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com/product_gsp1")
@@ -168,7 +213,7 @@ async def test_get_stock_price_schemaorg(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_opengraph(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = """
 <html>
   <head>
@@ -182,7 +227,7 @@ async def test_get_stock_price_opengraph(monkeypatch):
   </body>
 </html>
         """
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com/product_gsp2")
@@ -191,7 +236,7 @@ async def test_get_stock_price_opengraph(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_jsonld(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = """
 <html>
   <head>
@@ -209,7 +254,7 @@ async def test_get_stock_price_jsonld(monkeypatch):
   </body>
 </html>
         """
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com/product_gsp3")
@@ -218,7 +263,7 @@ async def test_get_stock_price_jsonld(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_fallback_entire_page(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = """
 <html>
   <head>
@@ -229,7 +274,7 @@ async def test_get_stock_price_fallback_entire_page(monkeypatch):
   </body>
 </html>
         """
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com/product_gsp4")
@@ -238,7 +283,7 @@ async def test_get_stock_price_fallback_entire_page(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_fallback_regex(monkeypatch):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = """
 <html>
   <head>
@@ -249,7 +294,7 @@ async def test_get_stock_price_fallback_regex(monkeypatch):
   </body>
 </html>
         """
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     monkeypatch.setattr("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com/product_gsp5")
@@ -258,9 +303,9 @@ async def test_get_stock_price_fallback_regex(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_get_stock_price_no_price(mocker):
-    async def fake_fetch(url: str) -> BeautifulSoup:
+    async def fake_fetch(url: str) -> str:
         html = "<html><body>No price information</body></html>"
-        return BeautifulSoup(html, "html.parser")
+        return html
 
     mocker.patch("cogs.stock.fetch_page_contents", fake_fetch)
     result = await stock.get_stock_price("https://testing.com")
@@ -285,13 +330,65 @@ async def test_add_user_watching(mocker, mock_discord_user):
 
     # patch other database funcs or external calls
     mocker.patch("cogs.stock.get_stock", return_value=None)
-    mocker.patch("cogs.stock.add_user_watching", return_value=AsyncMock())
-    mocker.patch(
-        "cogs.stock.get_stock_name", return_value=AsyncMock(return_value="Test Product")
-    )
+    pending = MagicMock(stock_name="Test Product", stock_status=-1)
+    mocker.patch("cogs.stock.add_user_watching", return_value=pending)
+    enrich_mock = mocker.patch("cogs.stock.enrich_watch")
+    fetch_mock = mocker.patch("cogs.stock.fetch_snapshot")
     bound_callback = stock_cog.add_watching.callback.__get__(stock_cog, type(stock_cog))
     await bound_callback(interaction, "http://testing.com", "Test Product")
-    interaction.response.defer.assert_called_once()
+    await asyncio.sleep(0)
+
+    # answered straight away, the page is loaded in the background
+    interaction.response.defer.assert_awaited_once_with(ephemeral=True, thinking=True)
+    assert (
+        "fetching its details"
+        in interaction.edit_original_response.call_args.kwargs["content"]
+    )
+    fetch_mock.assert_not_called()
+    enrich_mock.assert_called_once_with(interaction, pending, True)
+
+
+@pytest.mark.asyncio
+async def test_add_watching_enriches_when_reply_fails(mocker, mock_discord_user):
+    interaction = AsyncMock(spec=Interaction)
+    interaction.user = mock_discord_user
+    interaction.response = AsyncMock()
+    interaction.edit_original_response.side_effect = discord.NotFound(
+        MagicMock(status=404), "Unknown interaction"
+    )
+    mocker.patch("cogs.stock.db.get_user", return_value=mock_discord_user)
+    mocker.patch("cogs.stock.get_stock", return_value=None)
+    pending = MagicMock(stock_name="Test Product", stock_status=-1)
+    mocker.patch("cogs.stock.add_user_watching", return_value=pending)
+    enrich_mock = mocker.patch("cogs.stock.enrich_watch")
+    stock_cog = Stock(MagicMock())
+
+    bound_callback = stock_cog.add_watching.callback.__get__(stock_cog, type(stock_cog))
+    with pytest.raises(discord.NotFound):
+        await bound_callback(interaction, "http://testing.com")
+    await asyncio.sleep(0)
+
+    enrich_mock.assert_called_once_with(interaction, pending, False)
+
+
+@pytest.mark.asyncio
+async def test_add_watching_reuses_recent_snapshot(test_db, mocker, mock_discord_user):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    mocker.patch("cogs.stock.db.get_user", return_value=mock_discord_user)
+    fetch_mock = mocker.patch("cogs.stock.fetch_snapshot")
+    stock.page_cache.put("https://testing.com", PageValidators(), make_snapshot())
+    interaction = AsyncMock()
+    interaction.user = mock_discord_user
+    stock_cog = Stock(MagicMock())
+
+    bound_callback = stock_cog.add_watching.callback.__get__(stock_cog, type(stock_cog))
+    await bound_callback(interaction, "https://testing.com")
+
+    fetch_mock.assert_not_called()
+    interaction.edit_original_response.assert_called_once_with(
+        content="Added [Test Product](<https://testing.com>) to your watchlist! "
+        "It's **In stock** at **$5.50**"
+    )
 
 
 @pytest.mark.asyncio
@@ -317,31 +414,82 @@ async def test_add_user_watching_invalid_url(mocker, mock_discord_user):
 
 
 @pytest.mark.asyncio
-async def test_add_watching_invalid_name(mocker, mock_discord_user):
-    # HACK: v strange way to do this, but it works, maybe refactor?
-    bot = MagicMock()
+async def test_add_user_watching_keeps_each_watchers_name(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    first = await stock.add_user_watching(MagicMock(id=1), url, None, make_snapshot())
+    second = await stock.add_user_watching(MagicMock(id=2), url, "Foo", make_snapshot())
 
-    user = mock_discord_user
+    assert test_db.query(Product).count() == 1
+    assert first.stock_name == "Test Product"
+    assert second.stock_name == "Foo"
+    watched = await stock.get_stock(MagicMock(id=2), url)
+    assert watched is not None and watched.stock_name == "Foo"
 
-    interaction = AsyncMock(spec=Interaction)
-    interaction.user = user
-    interaction.response = AsyncMock()
-    interaction.edit_original_response = AsyncMock()
 
-    stock_cog = Stock(bot)
+@pytest.mark.asyncio
+async def test_add_user_watching_failure_is_not_cached(test_db, mocker):
+    scheduler = mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    mocker.patch(
+        "cogs.stock.append_history",
+        side_effect=exc.OperationalError("", {}, Exception()),
+    )
+    user = MagicMock(id=1)
 
-    mocker.patch("cogs.stock.get_stock", return_value=None)
-    mocker.patch("cogs.stock.get_stock_name", return_value=None)
-    mocker.patch("db.utils.get_user", return_value=user)
-    mocker.patch("db.utils.add_user", return_value=user)
+    with pytest.raises(exc.OperationalError):
+        await stock.add_user_watching(
+            user, "https://testing.com", None, make_snapshot()
+        )
 
-    bound_callback = stock_cog.add_watching.callback.__get__(stock_cog, type(stock_cog))
-    await bound_callback(interaction, "https://testing.com")
-    response = interaction.edit_original_response.call_args[1]["content"]
-    print(f"debug: {response}")
+    assert test_db.query(User_Stock).count() == 0
+    assert len(scheduler) == 0
+    assert await stock.get_stock(user, "https://testing.com") is None
 
-    invalid_string = "manually"
-    assert invalid_string in response.lower()
+
+@pytest.mark.asyncio
+async def test_enrich_watch_fills_pending_watch(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    pending = await stock.add_user_watching(MagicMock(id=1), url, None)
+    assert pending.stock_name == url
+    assert pending.stock_status == stock.Stock_Status.UNKNOWN.value
+    assert pending.notified_status is None
+
+    mocker.patch("cogs.stock.fetch_snapshot", return_value=make_snapshot())
+    interaction = AsyncMock()
+    await stock.enrich_watch(interaction, pending, named=False)
+    await stock.check_writer.flush()
+
+    interaction.edit_original_response.assert_called_once_with(
+        content=f"Added [Test Product](<{url}>) to your watchlist! "
+        "It's **In stock** at **$5.50**"
+    )
+    product = test_db.query(Product).one()
+    assert (product.name, product.stock_status, product.price_amount) == (
+        "Test Product",
+        1,
+        550,
+    )
+    assert test_db.query(User_Stock).one().notified_status == 1
+
+
+@pytest.mark.asyncio
+async def test_enrich_watch_keeps_given_name_and_dms_once_expired(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    pending = await stock.add_user_watching(MagicMock(id=1), url, "My Product")
+    mocker.patch(
+        "cogs.stock.fetch_snapshot", return_value=make_snapshot(name="Page Title")
+    )
+    interaction = AsyncMock()
+    interaction.edit_original_response.side_effect = discord.NotFound(
+        MagicMock(status=404, reason="Not Found"), "Unknown Webhook"
+    )
+
+    await stock.enrich_watch(interaction, pending, named=True)
+
+    assert pending.stock_name == "My Product"
+    assert stock.outbox.depth == 1
 
 
 @pytest.mark.asyncio
@@ -372,19 +520,22 @@ async def test_list_watching(mocker):
             price="$543.21",
         ),
     ]
-    response_string = f"""# Watched Items
-**1**: _[{user_stocks[0].stock_name}](<{user_stocks[0].stock_url}>)_: **{"In stock" if user_stocks[0].stock_status == 1 else "Out of stock"}** **{user_stocks[0].price}**
-**2**: _[{user_stocks[1].stock_name}](<{user_stocks[1].stock_url}>)_: **{"In stock" if user_stocks[1].stock_status == 1 else "Out of stock"}** **{user_stocks[1].price}**
-"""
+    response_string = f"""**1**: _[{user_stocks[0].stock_name}](<{user_stocks[0].stock_url}>)_: **In stock** **{user_stocks[0].price}**
+**2**: _[{user_stocks[1].stock_name}](<{user_stocks[1].stock_url}>)_: **Out of stock** **{user_stocks[1].price}**"""
 
-    mocker.patch("cogs.stock.get_users_watched", return_value=user_stocks)
+    mocker.patch(
+        "cogs.stock.get_watch_page",
+        return_value=stock.WatchPage(user_stocks, False, False),
+    )
     bound_callback = stock_cog.list_watching.callback.__get__(
         stock_cog, type(stock_cog)
     )
     await bound_callback(interaction)
-    interaction.response.send_message.assert_called_with(
-        response_string, ephemeral=True
-    )
+    kwargs = interaction.response.send_message.call_args.kwargs
+    assert kwargs["embed"].title == "Watched Items"
+    assert kwargs["embed"].description == response_string
+    assert isinstance(kwargs["view"], WatchlistView)
+    assert kwargs["ephemeral"] is True
 
 
 @pytest.mark.asyncio
@@ -393,7 +544,9 @@ async def test_list_watching_empty(mocker):
     interaction = AsyncMock()
     stock_cog = Stock(bot)
 
-    mocker.patch("cogs.stock.get_users_watched", return_value=[])
+    mocker.patch(
+        "cogs.stock.get_watch_page", return_value=stock.WatchPage([], False, False)
+    )
     bound_callback = stock_cog.list_watching.callback.__get__(
         stock_cog, type(stock_cog)
     )
@@ -403,6 +556,61 @@ async def test_list_watching_empty(mocker):
     )
 
 
+async def _watch_products(count: int, user_id: int = 1) -> list[str]:
+    urls = [f"https://testing.com/{index}" for index in range(count)]
+    for url in urls:
+        await stock.add_user_watching(
+            MagicMock(id=user_id), url, f"Product {url[-1]}", make_snapshot(url=url)
+        )
+    return urls
+
+
+@pytest.mark.asyncio
+async def test_get_watch_page_keyset(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    await _watch_products(5)
+    await _watch_products(2, user_id=2)
+    user = MagicMock(id=1)
+
+    first = await stock.get_watch_page(user, size=2)
+    assert [s.stock_name for s in first.stocks] == ["Product 0", "Product 1"]
+    assert (first.has_previous, first.has_next) == (False, True)
+
+    last = await stock.get_watch_page(user, after=first.stocks[-1].product_id, size=3)
+    assert [s.stock_name for s in last.stocks] == [
+        "Product 2",
+        "Product 3",
+        "Product 4",
+    ]
+    assert (last.has_previous, last.has_next) == (True, False)
+
+    back = await stock.get_watch_page(user, before=last.stocks[0].product_id, size=1)
+    assert [s.stock_name for s in back.stocks] == ["Product 1"]
+    assert (back.has_previous, back.has_next) == (True, True)
+
+
+@pytest.mark.asyncio
+async def test_watchlist_view_pages(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    mocker.patch("cogs.stock.WATCHLIST_PAGE_SIZE", 2)
+    await _watch_products(3)
+    user = MagicMock(id=1)
+    view = WatchlistView(user, await stock.get_watch_page(user, size=2))
+    assert view.previous_page.disabled and not view.next_page.disabled
+
+    interaction = AsyncMock()
+    last = view.page.stocks[-1].product_id
+    mocker.patch("cogs.stock.get_watch_page", wraps=stock.get_watch_page)
+    await view.next_page.callback(interaction)
+
+    embed = interaction.response.edit_message.call_args.kwargs["embed"]
+    assert embed.description.startswith("**3**: _[Product 2]")
+    assert embed.footer.text == "Page 2"
+    assert not view.previous_page.disabled and view.next_page.disabled
+    # only the next page is loaded, keyed on the last product shown
+    stock.get_watch_page.assert_awaited_once_with(user, after=last)
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "error,expected_message",
@@ -436,22 +644,28 @@ async def test_stock_price_update_notif(mocker):
         user_id=123,
         stock_name="Test Product",
         stock_url="https://testing.com",
-        price="$5.50",
-        stock_status=1,
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=1,
     )
 
-    mocker.patch("cogs.stock.get_stock_price", return_value="$2.00")
-    mocker.patch("cogs.stock.fetch_stock_status", return_value=1)
-    mocker.patch("cogs.stock.update_last_checked")
-    mocker.patch("cogs.stock.update_stock_status")
-    mocker.patch("cogs.stock.update_stock_price")
+    mocker.patch(
+        "cogs.stock.fetch_snapshot",
+        return_value=make_snapshot(price="$2.00", stock_status=1),
+    )
 
     bot.get_user.return_value = user
 
     await stock.check_stock(stock_item, user)
+    # price changes wait for the digest
+    user.send.assert_not_called()
+    await stock.digest_queue.close()
+    await stock.outbox.drain()
 
-    message = "[Test Product](<https://testing.com>) price change: $5.50 -> $2.00"
-    user.send.assert_called_with(message)
+    field = user.send.call_args.kwargs["embeds"][0].fields[0]
+    assert field.name == "Test Product"
+    assert field.value.startswith("Price **$5.50** -> **$2.00**")
 
 
 @pytest.mark.asyncio
@@ -464,22 +678,48 @@ async def test_stock_status_update_notif(mocker):
         user_id=123,
         stock_name="Test Product",
         stock_url="https://testing.com",
-        price="$5.50",
-        stock_status=1,
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=1,
     )
 
-    mocker.patch("cogs.stock.get_stock_price", return_value="$5.50")
-    mocker.patch("cogs.stock.fetch_stock_status", return_value=0)
-    mocker.patch("cogs.stock.update_last_checked")
-    mocker.patch("cogs.stock.update_stock_status")
-    mocker.patch("cogs.stock.update_stock_price")
+    mocker.patch(
+        "cogs.stock.fetch_snapshot",
+        return_value=make_snapshot(price="$5.50", stock_status=0),
+    )
 
     bot.get_user.return_value = user
 
     await stock.check_stock(stock_item, user)
+    await stock.digest_queue.close()
+    await stock.outbox.drain()
+
+    field = user.send.call_args.kwargs["embeds"][0].fields[0]
+    assert field.value.startswith("Now **Out of stock**")
+
+
+@pytest.mark.asyncio
+async def test_back_in_stock_sent_immediately():
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    stock_item = MagicMock(
+        stock_name="Test Product",
+        stock_url="https://testing.com",
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=0,
+    )
+
+    await stock.check_stock(stock_item, user, make_snapshot(stock_status=1))
 
-    message = "Test Product is now **Out of stock**!"
-    user.send.assert_called_with(message)
+    # handed straight to the outbox, checks never wait on the send itself
+    user.send.assert_not_called()
+    assert len(stock.digest_queue) == 0
+    assert stock.outbox.depth == 1
+    await stock.outbox.drain()
+    user.send.assert_awaited_once_with("Test Product is now **In stock**!")
 
 
 @pytest.mark.asyncio
@@ -492,6 +732,7 @@ async def test_remove_stock_with_stocks(mocker):
     stocks = [
         MagicMock(
             user_id=123,
+            product_id=1,
             stock_url="https://testing1.com",
             stock_name="Test Product 1",
             stock_status=1,
@@ -499,13 +740,16 @@ async def test_remove_stock_with_stocks(mocker):
         ),
         MagicMock(
             user_id=123,
+            product_id=2,
             stock_url="https://testing2.com",
             stock_name="Test Product 2",
             stock_status=0,
             price="$543.21",
         ),
     ]
-    mocker.patch("cogs.stock.get_users_watched", return_value=stocks)
+    mocker.patch(
+        "cogs.stock.get_watch_page", return_value=stock.WatchPage(stocks, False, False)
+    )
     stock_cog = Stock(bot)
     bound_callback = stock_cog.remove_watching.callback.__get__(
         stock_cog, type(stock_cog)
@@ -514,8 +758,8 @@ async def test_remove_stock_with_stocks(mocker):
 
     interaction.response.send_message.assert_called_once()
     call_args = interaction.response.send_message.call_args
-    assert "Click a button to delete a stock" in call_args[0][0]
-    assert isinstance(call_args[1]["view"], Remove)
+    assert "Pick a product to stop watching" in call_args[0][0]
+    assert isinstance(call_args[1]["view"], RemoveView)
     assert call_args[1]["ephemeral"] is True
 
 
@@ -526,7 +770,9 @@ async def test_remove_stock_with_no_stocks(mocker):
     interaction.response = AsyncMock()
     interaction.response.send_message = AsyncMock()
 
-    mocker.patch("cogs.stock.get_users_watched", return_value=[])
+    mocker.patch(
+        "cogs.stock.get_watch_page", return_value=stock.WatchPage([], False, False)
+    )
     stock_cog = Stock(bot)
     bound_callback = stock_cog.remove_watching.callback.__get__(
         stock_cog, type(stock_cog)
@@ -540,65 +786,851 @@ async def test_remove_stock_with_no_stocks(mocker):
 
 
 @pytest.mark.asyncio
-async def test_remove_button_callback(mocker):
+async def test_remove_select_updates_page_in_place(mocker):
     interaction = AsyncMock(spec=Interaction)
     interaction.user = MagicMock(id=12345)
     interaction.response.edit_message = AsyncMock()
 
-    initial_stock = MagicMock(
-        user_id=12345,
-        stock_url="https://testing.com",
-        stock_name="Test Product",
-        stock_status=1,
-        price="$11.11",
-    )
-    remaining_stock = [
+    stocks = [
         MagicMock(
             user_id=12345,
-            stock_url="https://testing.com/2",
-            stock_name="Test Product 2",
+            product_id=index,
+            stock_url=f"https://testing.com/{index}",
+            stock_name=f"Test Product {index}",
             stock_status=1,
-            price="$22.22",
+            price="$11.11",
         )
+        for index in (1, 2)
     ]
     remove_mock = mocker.patch("cogs.stock.remove_user_watching")
-    get_watched_mock = mocker.patch(
-        "cogs.stock.get_users_watched", return_value=remaining_stock
-    )
-
-    button = RemoveButton(0, initial_stock)
-    await button.callback(interaction)
+    get_page_mock = mocker.patch("cogs.stock.get_watch_page")
 
-    remove_mock.assert_called_once_with(interaction.user, initial_stock)
-    get_watched_mock.assert_called_once_with(interaction.user)
+    view = RemoveView(interaction.user, stock.WatchPage(list(stocks), False, False))
+    assert [option.value for option in view.remove_select.options] == ["1", "2"]
+    view.remove_select._values = ["1"]
+    await view.remove_select.callback(interaction)
 
-    interaction.response.edit_message.assert_called_once()
+    remove_mock.assert_called_once_with(interaction.user, stocks[0])
+    get_page_mock.assert_not_called()
     call_args = interaction.response.edit_message.call_args[1]
     assert "has been deleted" in call_args["content"]
-    assert isinstance(call_args["view"], Remove)
-    assert len(call_args["view"].children) == len(remaining_stock)
+    assert call_args["view"] is view
+    assert [option.value for option in view.remove_select.options] == ["2"]
+
+
+@pytest.mark.asyncio
+async def test_remove_select_last_item(mocker):
+    interaction = AsyncMock(spec=Interaction)
+    interaction.user = MagicMock(id=12345)
+    interaction.response.edit_message = AsyncMock()
+    stock_item = MagicMock(product_id=1, stock_name="Test Product")
+    mocker.patch("cogs.stock.remove_user_watching")
+
+    view = RemoveView(interaction.user, stock.WatchPage([stock_item], False, False))
+    view.remove_select._values = ["1"]
+    await view.remove_select.callback(interaction)
+
+    interaction.response.edit_message.assert_called_once_with(
+        content="**Test Product** has been deleted. You have nothing else watched",
+        embed=None,
+        view=None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_remove_view_empties_last_page(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    mocker.patch("cogs.stock.WATCHLIST_PAGE_SIZE", 10)
+    await _watch_products(12)
+    user = MagicMock(id=1)
+    interaction = AsyncMock(spec=Interaction)
+    interaction.user = user
+    interaction.response.edit_message = AsyncMock()
+
+    first = await stock.get_watch_page(user, size=10)
+    view = RemoveView(
+        user, await stock.get_watch_page(user, after=first.stocks[-1].product_id), 2
+    )
+    assert not view.previous_page.disabled and view.next_page.disabled
+    for item in list(view.page.stocks):
+        view.remove_select._values = [str(item.product_id)]
+        await view.remove_select.callback(interaction)
+
+    # back on page 1, which is now the last one
+    assert view.page_number == 1
+    assert len(view.remove_select.options) == 10
+    assert view.previous_page.disabled and view.next_page.disabled
+
+    interaction.response.edit_message.reset_mock()
+    await view.next_page.callback(interaction)
+    interaction.response.edit_message.assert_called_once_with(
+        content="There is nothing more on your watchlist", embed=None, view=None
+    )
+    assert view.is_finished()
+
+
+@pytest.mark.asyncio
+async def test_fetch_snapshot_loads_page_once(mocker):
+    html = """
+<html>
+  <head>
+    <meta itemprop="price" content="49.99">
+    <meta itemprop="priceCurrency" content="USD">
+    <title>Test Product - Test Shop</title>
+  </head>
+  <body><div>Sold Out</div></body>
+</html>
+    """
+
+    fetch_mock = mocker.patch(
+        "cogs.stock.fetch_page_contents",
+        AsyncMock(return_value=html),
+    )
+    snapshot = await stock.fetch_snapshot("https://testing.com")
+
+    fetch_mock.assert_awaited_once_with("https://testing.com")
+    assert snapshot.name == "Test Product"
+    assert snapshot.price == "$49.99"
+    assert snapshot.stock_status == 0
+    assert snapshot.strategy == "schema.org"
+
+
+def test_group_by_url():
+    stocks = [
+        User_Stock(user_id=1, stock_url="https://testing1.com"),
+        User_Stock(user_id=2, stock_url="https://testing1.com"),
+        User_Stock(user_id=3, stock_url="https://testing2.com"),
+    ]
+    grouped = stock._group_by_url(stocks)
+
+    assert list(grouped) == ["https://testing1.com", "https://testing2.com"]
+    assert [s.user_id for s in grouped["https://testing1.com"]] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_check_stock_uses_given_snapshot(mocker):
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    stock_item = MagicMock(
+        stock_name="Test Product",
+        stock_url="https://testing.com",
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=1,
+    )
+
+    fetch_mock = mocker.patch("cogs.stock.fetch_snapshot")
+
+    await stock.check_stock(stock_item, user, make_snapshot())
+
+    fetch_mock.assert_not_called()
+    user.send.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_remove_view_init():
+async def test_auto_check_stock_fetches_each_url_once(test_db, mocker):
+    bot = MagicMock()
+    last_checked = datetime(2025, 2, 4, 11, 0, 0)
     stocks = [
         User_Stock(
-            user_id=123,
-            stock_url="https://testing1.com",
-            stock_name="Test Product 1",
-            stock_status=1,
-            price="$123.45",
+            user_id=user_id,
+            stock_url="https://testing.com",
+            last_checked=last_checked,
+            check_interval=300,
+        )
+        for user_id in (1, 2, 3)
+    ]
+    snapshot = make_snapshot()
+
+    scheduler = WatchScheduler()
+    mocker.patch("cogs.stock.watch_scheduler", scheduler)
+    mocker.patch("cogs.stock.get_all_watched", return_value=stocks)
+    fetch_mock = mocker.patch("cogs.stock.fetch_snapshot", return_value=snapshot)
+    check_mock = mocker.patch("cogs.stock.check_stock")
+    waits = 0
+
+    async def wait_until_due():
+        nonlocal waits
+        waits += 1
+        if waits > 1:
+            # let the checks started by the first cycle finish, then stop
+            await asyncio.sleep(0.05)
+            raise asyncio.CancelledError
+
+    mocker.patch.object(scheduler, "wait_until_due", side_effect=wait_until_due)
+
+    with pytest.raises(asyncio.CancelledError):
+        await stock.auto_check_stock(bot)
+
+    fetch_mock.assert_awaited_once_with("https://testing.com")
+    assert check_mock.await_count == 3
+    for call in check_mock.await_args_list:
+        assert call.args[2] is snapshot
+    # checked stocks are re-armed for their next interval
+    assert len(scheduler) == 3
+    next_due = scheduler.next_due()
+    assert next_due is not None and next_due > datetime.now()
+    # alerts wait for the writer's own flush of the results
+    trigger_mock = mocker.patch("cogs.stock.trigger_alerts", return_value=[])
+    await stock.check_writer.record_product(
+        Product(product_id=7, url="https://testing.com")
+    )
+    await stock.check_writer.flush()
+    assert trigger_mock.call_args.args[0] == [7]
+
+
+@pytest.mark.asyncio
+async def test_auto_check_stock_does_not_wait_for_slow_urls(test_db, mocker):
+    bot = MagicMock()
+    # the slow url is due now, the fast one falls due while it loads
+    checked_at = datetime.now() - timedelta(seconds=300)
+    slow = User_Stock(
+        user_id=1,
+        stock_url="https://slow.com",
+        last_checked=checked_at,
+        check_interval=300,
+    )
+    fast = User_Stock(
+        user_id=2,
+        stock_url="https://fast.com",
+        last_checked=checked_at + timedelta(milliseconds=20),
+        check_interval=300,
+    )
+    scheduler = WatchScheduler()
+    mocker.patch("cogs.stock.watch_scheduler", scheduler)
+    mocker.patch("cogs.stock.get_all_watched", return_value=[slow, fast])
+    release = asyncio.Event()
+    checked: list[str] = []
+
+    async def fake_check_url(bot, url, stocks):
+        if url == "https://slow.com":
+            await release.wait()
+        checked.append(url)
+
+    mocker.patch("cogs.stock._check_url", side_effect=fake_check_url)
+    task = asyncio.create_task(stock.auto_check_stock(bot))
+    await asyncio.sleep(0.1)
+
+    # the fast url fell due and was checked while the slow one was still loading
+    assert checked[0] == "https://fast.com"
+    release.set()
+    await asyncio.sleep(0.01)
+    assert "https://slow.com" in checked
+    task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_fetch_snapshot_static_page_skips_browser(mocker):
+    html = '<html><meta itemprop="price" content="9.99"><meta itemprop="priceCurrency" content="USD"></html>'
+    mocker.patch(
+        "cogs.stock.fetch_static_contents",
+        return_value=StaticPage(status=200, html=html),
+    )
+    browser_mock = mocker.patch("cogs.stock.fetch_page_contents")
+
+    snapshot = await stock.fetch_snapshot("https://testing.com/product")
+
+    browser_mock.assert_not_called()
+    assert snapshot.price == "$9.99"
+    assert snapshot.tier == "http"
+
+
+@pytest.mark.asyncio
+async def test_fetch_snapshot_escalates_to_browser(mocker):
+    static_html = "<html><body>Loading...</body></html>"
+    rendered_html = '<html><meta itemprop="price" content="9.99"><meta itemprop="priceCurrency" content="USD"></html>'
+    static_mock = mocker.patch(
+        "cogs.stock.fetch_static_contents",
+        return_value=StaticPage(status=200, html=static_html),
+    )
+    browser_mock = mocker.patch(
+        "cogs.stock.fetch_page_contents",
+        return_value=rendered_html,
+    )
+
+    snapshot = await stock.fetch_snapshot("https://testing.com/product/1")
+    assert snapshot.price == "$9.99"
+    assert snapshot.tier == "browser"
+
+    # the domain is remembered as needing the browser
+    await stock.fetch_snapshot("https://testing.com/product/2")
+    static_mock.assert_called_once()
+    assert browser_mock.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_snapshot_not_modified_reuses_snapshot(mocker):
+    html = '<html><meta itemprop="price" content="9.99"><meta itemprop="priceCurrency" content="USD"></html>'
+    static_mock = mocker.patch(
+        "cogs.stock.fetch_static_contents",
+        side_effect=[
+            StaticPage(status=200, html=html, etag='"v1"'),
+            StaticPage(status=304, html="", etag='"v1"'),
+        ],
+    )
+    parse_spy = mocker.spy(stock, "make_soup")
+
+    first = await stock.fetch_snapshot("https://testing.com/product")
+    second = await stock.fetch_snapshot("https://testing.com/product")
+
+    # second request is conditional on the etag of the first
+    assert static_mock.call_args_list[1].args == (
+        "https://testing.com/product",
+        '"v1"',
+        None,
+    )
+    assert parse_spy.call_count == 1
+    assert second.unchanged and not first.unchanged
+    assert second.price == first.price == "$9.99"
+
+
+@pytest.mark.asyncio
+async def test_fetch_snapshot_unchanged_content_skips_parsing(mocker):
+    html = '<html><meta itemprop="price" content="9.99"><meta itemprop="priceCurrency" content="USD"><script>var t = {now}</script></html>'
+    mocker.patch(
+        "cogs.stock.fetch_static_contents",
+        side_effect=[
+            StaticPage(status=200, html=html.replace("{now}", "1")),
+            StaticPage(status=200, html=html.replace("{now}", "2")),
+            StaticPage(status=200, html=html.replace("9.99", "8.99")),
+        ],
+    )
+    parse_spy = mocker.spy(stock, "make_soup")
+
+    await stock.fetch_snapshot("https://testing.com/product")
+    unchanged = await stock.fetch_snapshot("https://testing.com/product")
+    changed = await stock.fetch_snapshot("https://testing.com/product")
+
+    assert unchanged.unchanged
+    assert not changed.unchanged
+    assert changed.price == "$8.99"
+    assert parse_spy.call_count == 2
+
+
+def test_extract_price_tries_learned_strategy_first(mocker):
+    html = """
+<html>
+  <head>
+    <meta property="product:price:amount" content="59.99">
+    <meta property="product:price:currency" content="USD">
+  </head>
+  <body><span class="sale-price">$49.99</span></body>
+</html>
+    """
+    stock.strategy_cache.record("testing.com", "price-class", "sale-price")
+    schema_spy = mocker.spy(stock, "_price_from_schema_org")
+
+    price, _, strategy = stock._extract_price(
+        stock.make_soup(html), "https://testing.com/product"
+    )
+
+    assert (price, strategy) == ("$49.99", "price-class")
+    schema_spy.assert_not_called()
+
+
+def test_extract_price_learns_on_miss():
+    html = """
+<html>
+  <head>
+    <meta property="product:price:amount" content="59.99">
+    <meta property="product:price:currency" content="USD">
+  </head>
+</html>
+    """
+    stock.strategy_cache.record("testing.com", "price-class", "sale-price")
+
+    price, _, strategy = stock._extract_price(
+        stock.make_soup(html), "https://testing.com/product"
+    )
+
+    assert (price, strategy) == ("$59.99", "opengraph")
+    learned = stock.strategy_cache.get("testing.com")
+    assert learned is not None and learned.strategy == "opengraph"
+
+
+def test_extract_price_learns_class_selector():
+    html = '<html><body><div class="product__price big">$12.50</div></body></html>'
+
+    stock._extract_price(stock.make_soup(html), "https://testing.com/product")
+
+    learned = stock.strategy_cache.get("testing.com")
+    assert learned is not None
+    assert (learned.strategy, learned.selector) == ("price-class", "product__price")
+
+
+def test_extract_price_does_not_learn_loose_strategies():
+    banner = "<html><body><p>Free shipping over $50</p></body></html>"
+    price, _, strategy = stock._extract_price(
+        stock.make_soup(banner), "https://shop.com/first"
+    )
+    assert strategy in ("page-text", "regex")
+    assert stock.strategy_cache.get("shop.com") is None
+
+    structured = (
+        '<html><head><meta itemprop="price" content="19.99">'
+        '<meta itemprop="priceCurrency" content="USD"></head>'
+        "<body><p>Free shipping over $50</p></body></html>"
+    )
+    price, _, strategy = stock._extract_price(
+        stock.make_soup(structured), "https://shop.com/second"
+    )
+    assert (price, strategy) == ("$19.99", "schema.org")
+
+
+def test_extract_price_ignores_learned_loose_strategy():
+    # learned and persisted before loose strategies stopped being learned
+    stock.strategy_cache.record("shop.com", "page-text")
+    html = (
+        '<html><head><meta itemprop="price" content="19.99">'
+        '<meta itemprop="priceCurrency" content="USD"></head>'
+        "<body><p>Free shipping over $50</p></body></html>"
+    )
+
+    price, _, strategy = stock._extract_price(
+        stock.make_soup(html), "https://shop.com/product"
+    )
+
+    assert (price, strategy) == ("$19.99", "schema.org")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "page_content,expected_status",
+    [
+        (
+            '<link itemprop="availability" href="https://schema.org/InStock"><div>Related: Sold Out</div>',
+            1,
         ),
-        User_Stock(
-            user_id=123,
-            stock_url="https://testing2.com",
-            stock_name="Test Product 2",
-            stock_status=0,
-            price="$543.21",
+        ('<meta itemprop="availability" content="https://schema.org/OutOfStock">', 0),
+        ('<meta property="product:availability" content="oos">', 0),
+        ('<meta property="product:availability" content="in stock">', 1),
+        (
+            '<script type="application/ld+json">{"@graph": [{"@type": "Product", "offers": [{"availability": "https://schema.org/PreOrder"}]}]}</script><div>Sold out</div>',
+            1,
+        ),
+        (
+            '<script type="application/ld+json">{"offers": {"availability": "http://schema.org/SoldOut"}}</script>',
+            0,
         ),
+        ('<button name="add-to-cart" disabled>Add to cart</button>', 0),
+        ('<button class="btn add-to-basket">Add to basket</button>', 1),
+    ],
+)
+async def test_check_stock_structured_availability(
+    mocker, page_content, expected_status
+):
+    async def fake_fetch(url: str):
+        return page_content
+
+    mocker.patch("cogs.stock.fetch_page_contents", fake_fetch)
+    result = await stock.fetch_stock_status("https://testing.com")
+    assert result == expected_status
+
+
+def test_structured_availability_skips_text_scan(mocker):
+    html = '<meta property="product:availability" content="instock"><div>Sold out</div>'
+    phrases_mock = mocker.patch("cogs.stock.out_of_stock_phrases")
+
+    status = stock._extract_stock_status(stock.make_soup(html), "https://testing.com")
+
+    assert status == 1
+    phrases_mock.matcher_for.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_check_stock_buffers_state(mocker):
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    stock_item = MagicMock(
+        stock_name="Test Product",
+        stock_url="https://testing.com",
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=1,
+    )
+    writer = CheckWriter()
+    mocker.patch("cogs.stock.check_writer", writer)
+
+    await stock.check_stock(
+        stock_item, user, make_snapshot(price="$2.00", stock_status=0)
+    )
+
+    # notifications compare against the state from before this check, and
+    # both changes share one digest entry
+    assert len(stock.digest_queue) == 1
+    assert stock_item.product.price == "$2.00"
+    assert stock_item.notified_price == "$2.00"
+    assert stock_item.notified_status == 0
+    # the product and what this watcher was told are both pending
+    assert len(writer) == 2
+
+
+@pytest.mark.asyncio
+async def test_watchers_share_one_product(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    users = [MagicMock(id=user_id) for user_id in (1, 2)]
+    for user in users:
+        await stock.add_user_watching(
+            user, "https://testing.com", "Test Product", make_snapshot()
+        )
+
+    assert test_db.query(Product).count() == 1
+    watched = await stock.get_stock(users[0], "https://testing.com")
+    assert watched is not None
+    assert watched.stock_name == "Test Product"
+    assert watched.notified_price == "$5.50"
+
+    # the product goes once its last watcher does
+    await stock.remove_user_watching(users[0], watched)
+    assert test_db.query(Product).count() == 1
+    await stock.remove_user_watching(
+        users[1], await stock.get_stock(users[1], "https://testing.com")
+    )
+    assert test_db.query(Product).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_remove_user_watching_failure_keeps_watch(test_db, mocker):
+    scheduler = mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    user = MagicMock(id=1)
+    url = "https://testing.com"
+    await stock.add_user_watching(user, url, "Test Product", make_snapshot())
+    watched = await stock.get_stock(user, url)
+    mocker.patch(
+        "cogs.stock.delete_history",
+        side_effect=exc.OperationalError("", {}, Exception()),
+    )
+
+    with pytest.raises(exc.OperationalError):
+        await stock.remove_user_watching(user, watched)
+
+    assert test_db.query(User_Stock).count() == 1
+    assert len(scheduler) == 1
+    assert await stock.get_stock(user, url) is watched
+
+    # the remove menu says so rather than claiming it was deleted
+    interaction = AsyncMock(spec=Interaction)
+    interaction.user = user
+    interaction.response.edit_message = AsyncMock()
+    view = RemoveView(user, await stock.get_watch_page(user))
+    view.remove_select._values = [str(watched.product_id)]
+    await view.remove_select.callback(interaction)
+
+    content = interaction.response.edit_message.call_args.kwargs["content"]
+    assert "error removing" in content
+    assert [option.value for option in view.remove_select.options] == [
+        str(watched.product_id)
     ]
-    view = Remove(stocks)
-    assert len(view.children) == len(stocks)
-    for index, child in enumerate(view.children):
-        assert isinstance(child, RemoveButton)
-        assert child.label == f"{index + 1}: {stocks[index].stock_name}"
+
+
+@pytest.mark.asyncio
+async def test_price_history_command(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    user = MagicMock(id=1)
+    url = "https://testing.com"
+    await stock.add_user_watching(
+        user, url, "Test Product", make_snapshot(fetched_at=datetime(2025, 2, 4))
+    )
+    watched = await stock.get_stock(user, url)
+    assert watched is not None
+    await stock.check_stock(
+        watched, AsyncMock(), make_snapshot(price="$4.00", stock_status=1)
+    )
+    await stock.check_writer.flush()
+
+    interaction = AsyncMock()
+    interaction.user = user
+    stock_cog = Stock(MagicMock())
+    bound_callback = stock_cog.price_history.callback.__get__(
+        stock_cog, type(stock_cog)
+    )
+    await bound_callback(interaction, url)
+
+    message = interaction.response.send_message.call_args.args[0]
+    assert "Now: **$4.00** **In stock**" in message
+    assert "All time: lowest **$4.00**, highest **$5.50**" in message
+
+
+@pytest.mark.asyncio
+async def test_price_history_not_watched(mocker):
+    mocker.patch("cogs.stock.get_stock", return_value=None)
+    interaction = AsyncMock()
+    stock_cog = Stock(MagicMock())
+    bound_callback = stock_cog.price_history.callback.__get__(
+        stock_cog, type(stock_cog)
+    )
+    await bound_callback(interaction, "https://testing.com")
+
+    interaction.response.send_message.assert_called_with(
+        "You're not watching that product!", ephemeral=True
+    )
+
+
+@pytest.mark.asyncio
+async def test_check_stock_compares_prices_numerically():
+    user = MagicMock(id=123)
+    user.send = AsyncMock()
+    stock_item = MagicMock(
+        stock_name="Test Product",
+        stock_url="https://testing.com",
+        notified_price="$5.50",
+        notified_status=1,
+        # notified before prices were stored as minor units
+        notified_amount=None,
+    )
+
+    await stock.check_stock(stock_item, user, make_snapshot(price="$5.5"))
+
+    user.send.assert_not_called()
+    assert stock_item.product.price_amount == 550
+    assert stock_item.product.price_currency == "USD"
+
+
+def _alert_callback():
+    stock_cog = Stock(MagicMock())
+    return stock_cog.price_alert.callback.__get__(stock_cog, type(stock_cog))
+
+
+@pytest.mark.asyncio
+async def test_price_alert_command(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    user = MagicMock(id=1)
+    url = "https://testing.com"
+    await stock.add_user_watching(user, url, "Test Product", make_snapshot())
+    interaction = AsyncMock()
+    interaction.user = user
+
+    await _alert_callback()(interaction, url, "4.99", 10)
+
+    interaction.response.send_message.assert_called_with(
+        f"I'll message you when [Test Product](<{url}>) is at or below **$4.99** "
+        "or down 10% from **$5.50**",
+        ephemeral=True,
+    )
+    alert = test_db.query(Price_Alert).one()
+    assert (alert.target_amount, alert.drop_percent, alert.baseline_amount) == (
+        499,
+        10,
+        550,
+    )
+    assert alert.currency == "USD"
+
+
+@pytest.mark.asyncio
+async def test_price_alert_rejects_other_currency(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    user = MagicMock(id=1)
+    url = "https://testing.com"
+    await stock.add_user_watching(user, url, "Test Product", make_snapshot())
+    interaction = AsyncMock()
+    interaction.user = user
+
+    await _alert_callback()(interaction, url, "4 EUR", None)
+
+    assert "Couldn't understand" in interaction.response.send_message.call_args.args[0]
+    assert test_db.query(Price_Alert).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_price_alert_keeps_extracted_currency(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    user = MagicMock(id=1)
+    url = "https://testing.com"
+    html = (
+        '<html><meta itemprop="price" content="19.99">'
+        '<meta itemprop="priceCurrency" content="AUD"></html>'
+    )
+    snapshot = stock._build_snapshot(url, html, datetime.now(), 0.1, Fetch_Tier.HTTP)
+    assert (snapshot.price, snapshot.money) == ("$19.99", Money(1999, "AUD"))
+    await stock.add_user_watching(user, url, "Test Product", snapshot)
+    interaction = AsyncMock()
+    interaction.user = user
+
+    # "$" is the product's own symbol, not a request for USD
+    await _alert_callback()(interaction, url, "$15", None)
+
+    alert = test_db.query(Price_Alert).one()
+    assert (alert.currency, alert.target_amount) == ("AUD", 1500)
+    assert test_db.query(Product).one().price_currency == "AUD"
+
+
+@pytest.mark.parametrize(
+    "text, currency",
+    [("$19.99", None), ("AUD 19.99", "AUD"), ("199 NOK", "NOK"), ("199 kr", None)],
+)
+def test_parse_price_keeps_iso_code(text, currency):
+    parsed = stock._parse_price(text)
+    assert parsed is not None and parsed.currency == currency
+
+
+@pytest.mark.asyncio
+async def test_send_alerts(mocker):
+    user = MagicMock()
+    user.send = AsyncMock()
+    bot = MagicMock()
+    bot.get_user.return_value = user
+    alert = TriggeredAlert(
+        alert_id=1,
+        user_id="123",
+        target_amount=None,
+        drop_percent=20,
+        baseline_amount=500,
+        url="https://testing.com",
+        name="Test Product",
+        price="$4.00",
+        price_amount=400,
+        price_currency="USD",
+    )
+
+    stock._send_alerts(bot, [alert])
+    await stock.outbox.drain()
+
+    bot.get_user.assert_called_with(123)
+    user.send.assert_called_with(
+        "[Test Product](<https://testing.com>) is now **$4.00**, down at least 20% "
+        "from **$5.00**!"
+    )
+
+
+@pytest.mark.asyncio
+async def test_check_url_skips_user_lookup_without_changes(mocker):
+    bot = MagicMock()
+    bot.fetch_user = AsyncMock()
+    stock_item = MagicMock(
+        user_id=123,
+        stock_name="Test Product",
+        stock_url="https://testing.com",
+        notified_price="$5.50",
+        notified_amount=550,
+        notified_currency="USD",
+        notified_status=1,
+        product=MagicMock(stock_status=1),
+    )
+    mocker.patch("cogs.stock.fetch_snapshot", return_value=make_snapshot())
+
+    await stock._check_url(bot, "https://testing.com", [stock_item])
+
+    bot.get_user.assert_not_called()
+    bot.fetch_user.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_check_url_announces_to_subscribed_channels(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    member, outsider = MagicMock(id=1), MagicMock(id=2)
+    for user in (member, outsider):
+        await stock.add_user_watching(
+            user, url, "Test Product", make_snapshot(stock_status=0)
+        )
+    product = await run_db(subscribe_channel, url, 10, 20, 30)
+    assert product is not None
+
+    channel = MagicMock(spec=discord.TextChannel, id=20)
+    channel.send = AsyncMock()
+    channel.guild.get_member.side_effect = lambda user_id: (
+        member if user_id == 1 else None
+    )
+    bot = MagicMock()
+    bot.get_channel.return_value = channel
+    outsider.send = AsyncMock()
+    bot.get_user.side_effect = lambda user_id: {1: member, 2: outsider}[user_id]
+    member.send = AsyncMock()
+    mocker.patch(
+        "cogs.stock.fetch_snapshot", return_value=make_snapshot(stock_status=1)
+    )
+
+    stocks = await stock.get_all_watched()
+    await stock._check_url(bot, url, stocks)
+    await stock.outbox.drain()
+
+    bot.get_channel.assert_called_with(20)
+    channel.send.assert_awaited_once_with(
+        f"<@&30> [Test Product](<{url}>) is now **In stock**! **$5.50**"
+    )
+    # the member sees the announcement, only the outsider is sent a DM
+    member.send.assert_not_called()
+    outsider.send.assert_awaited_once_with("Test Product is now **In stock**!")
+
+
+@pytest.mark.asyncio
+async def test_check_url_dms_members_who_cant_view_channel(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    viewer, hidden = MagicMock(id=1), MagicMock(id=2)
+    for user in (viewer, hidden):
+        user.send = AsyncMock()
+        await stock.add_user_watching(
+            user, url, "Test Product", make_snapshot(stock_status=0)
+        )
+    await run_db(subscribe_channel, url, 10, 20, None)
+
+    # both are members of the guild, only one can see the channel
+    channel = MagicMock(spec=discord.TextChannel, id=20)
+    channel.send = AsyncMock()
+    channel.guild.get_member.side_effect = {1: viewer, 2: hidden}.get
+    channel.permissions_for.side_effect = lambda member: MagicMock(
+        view_channel=member is viewer
+    )
+    bot = MagicMock()
+    bot.get_channel.return_value = channel
+    bot.get_user.side_effect = {1: viewer, 2: hidden}.get
+    mocker.patch(
+        "cogs.stock.fetch_snapshot", return_value=make_snapshot(stock_status=1)
+    )
+
+    await stock._check_url(bot, url, await stock.get_all_watched())
+    await stock.outbox.drain()
+
+    channel.send.assert_awaited_once()
+    viewer.send.assert_not_called()
+    hidden.send.assert_awaited_once_with("Test Product is now **In stock**!")
+
+
+@pytest.mark.asyncio
+async def test_check_url_announces_each_change_once(test_db, mocker):
+    mocker.patch("cogs.stock.watch_scheduler", WatchScheduler())
+    url = "https://testing.com"
+    for user_id in (1, 2):
+        await stock.add_user_watching(
+            MagicMock(id=user_id), url, None, make_snapshot(stock_status=0)
+        )
+    await run_db(subscribe_channel, url, 10, 20, None)
+    channel = MagicMock(spec=discord.TextChannel, id=20)
+    channel.send = AsyncMock()
+    channel.guild.get_member.return_value = None
+    bot = MagicMock()
+    bot.get_channel.return_value = channel
+    bot.get_user.return_value = MagicMock(send=AsyncMock())
+    mocker.patch(
+        "cogs.stock.fetch_snapshot", return_value=make_snapshot(stock_status=1)
+    )
+
+    # each watch was loaded with its own copy of the product, and falls due
+    # on its own
+    first = (await stock.get_all_watched())[0]
+    second = (await stock.get_all_watched())[1]
+    assert first.product is not second.product
+    await stock._check_url(bot, url, [first])
+    await stock._check_url(bot, url, [second])
+    await stock.outbox.drain()
+
+    channel.send.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_channel_requires_watched_product(test_db):
+    stock_cog = Stock(MagicMock())
+    callback = stock_cog.channel_subscribe.callback.__get__(stock_cog, Stock)
+    interaction = AsyncMock()
+    interaction.permissions.manage_channels = True
+    channel = MagicMock(spec=discord.TextChannel)
+
+    await callback(interaction, "https://testing.com", channel)
+
+    interaction.response.send_message.assert_called_with(
+        "Nobody is watching that product yet, add it with `/stock add` first",
+        ephemeral=True,
+    )